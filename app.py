@@ -1,13 +1,39 @@
 # app.py
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
-from flask_mysqldb import MySQL
-from werkzeug.security import generate_password_hash, check_password_hash
-from werkzeug.utils import secure_filename
+from startup import StartupTimer, bytecode_cache, precompile_templates
+startup = StartupTimer()
+
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, make_response, Response, \
+    stream_template, get_flashed_messages, g, send_file
+from markupsafe import Markup
+from db_pool import PooledMySQL
+from search_index import SearchIndex
+from rows import fetch_records, tuple_cursor
+from facets import FacetIndex, CATEGORICAL as FACET_FIELDS, RANGES as FACET_RANGES
+from pagination import decode_cursor, encode_cursor, keyset_where, page_size_arg, split_page
+from cache import VersionedLRUCache, make_version_store
+from query_batch import QueryBatch
+from metrics import Metrics
+from image_store import ImageStore, RELEASE_GRACE_SECONDS
+from jobs import JobQueue
+from export import FORMATS as EXPORT_FORMATS, stream_query
+from pet_import import ImportRejected, parse_rows, store_images
+from events import EventHub, make_broker
+from assets import AssetManifest
+from ratelimit import ConcurrencyGate, RateLimiter, make_bucket_store, parse_rules
+from hashing import PasswordHasher, HashPoolBusy, DEFAULT_METHOD
 from dotenv import load_dotenv
+from werkzeug.middleware.proxy_fix import ProxyFix
 import os
+import hashlib
+import math
+import mimetypes
+import threading
 import time
 import uuid
 from datetime import datetime
+from decimal import Decimal
+
+startup.mark('imports')
 
 load_dotenv()
 
@@ -20,6 +46,24 @@ app.config['MYSQL_USER'] = os.getenv('MYSQL_USER', 'root')
 app.config['MYSQL_PASSWORD'] = os.getenv('MYSQL_PASSWORD', '')
 app.config['MYSQL_DB'] = os.getenv('MYSQL_DB', 'hero')
 app.config['MYSQL_CURSORCLASS'] = 'DictCursor'
+# Run against an embedded SQLite stand-in instead of MySQL (see sqlite_standin.py)
+app.config['MYSQL_STANDIN'] = os.getenv('MYSQL_STANDIN')
+
+# Connection pool (see db_pool.py)
+app.config['MYSQL_POOL_SIZE'] = int(os.getenv('MYSQL_POOL_SIZE', 10))
+app.config['MYSQL_POOL_MIN'] = int(os.getenv('MYSQL_POOL_MIN', 2))
+app.config['MYSQL_POOL_RECYCLE'] = int(os.getenv('MYSQL_POOL_RECYCLE', 3600))
+app.config['MYSQL_POOL_TIMEOUT'] = float(os.getenv('MYSQL_POOL_TIMEOUT', 5))
+app.config['MYSQL_POOL_PREWARM'] = bool(int(os.getenv('MYSQL_POOL_PREWARM', 1)))
+
+# Read replicas (see db_pool.py): GET requests read from a replica. After a
+# write, the session's reads stay on the primary for REPLICA_PIN_SECONDS
+# ('pin'), or ('wait') use the replica once it has applied that write,
+# waiting up to REPLICA_WAIT_SECONDS for it (needs GTIDs).
+app.config['MYSQL_REPLICAS'] = os.getenv('MYSQL_REPLICAS', '')
+app.config['REPLICA_CONSISTENCY'] = os.getenv('REPLICA_CONSISTENCY', 'pin')
+app.config['REPLICA_PIN_SECONDS'] = float(os.getenv('REPLICA_PIN_SECONDS', 5))
+app.config['REPLICA_WAIT_SECONDS'] = float(os.getenv('REPLICA_WAIT_SECONDS', 0.05))
 
 # File upload configuration
 UPLOAD_FOLDER = os.path.join('templates', 'static', 'uploads', 'pets')
@@ -32,11 +76,495 @@ if not os.path.exists(UPLOAD_FOLDER):
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
 
-mysql = MySQL(app)
+# Bulk import (see pet_import.py): CSV + optional zip of images
+app.config['IMPORT_MAX_SIZE'] = int(os.getenv('IMPORT_MAX_SIZE', 200 * 1024 * 1024))
+app.config['IMPORT_MAX_ROWS'] = int(os.getenv('IMPORT_MAX_ROWS', 5000))
+app.config['IMPORT_BATCH_SIZE'] = int(os.getenv('IMPORT_BATCH_SIZE', 500))
+
+# Content-addressed uploads with thumbnails/WebP variants (see image_store.py)
+image_store = ImageStore(UPLOAD_FOLDER, '/static/uploads/pets')
+app.jinja_env.globals['image_variants'] = image_store.variants
+
+# Fingerprinted CSS/JS built by `python assets.py` (see assets.py)
+assets = AssetManifest(app.static_folder, app.static_url_path)
+app.jinja_env.globals['asset_url'] = assets.url
+
+# Listing page size (keyset pagination, see pagination.py)
+app.config['PAGE_SIZE'] = int(os.getenv('PAGE_SIZE', 24))
+
+# Password hashing pool (see hashing.py). Changing PASSWORD_HASH_METHOD
+# upgrades stored hashes on each user's next successful login.
+app.config['PASSWORD_HASH_METHOD'] = os.getenv('PASSWORD_HASH_METHOD', DEFAULT_METHOD)
+app.config['HASH_WORKERS'] = int(os.getenv('HASH_WORKERS', 2))
+app.config['HASH_MAX_QUEUE'] = int(os.getenv('HASH_MAX_QUEUE', 16))
+
+# Observability: statements slower than this are logged
+app.config['SLOW_QUERY_SECONDS'] = float(os.getenv('SLOW_QUERY_SECONDS', 0.5))
+# If set, /metrics requires "Authorization: Bearer <token>"
+app.config['METRICS_TOKEN'] = os.getenv('METRICS_TOKEN')
+
+# Listing cache: 'local' (single process) or 'sqlite' (shared by all workers)
+app.config['CACHE_BACKEND'] = os.getenv('CACHE_BACKEND', 'sqlite')
+app.config['LISTING_CACHE_SIZE'] = int(os.getenv('LISTING_CACHE_SIZE', 256))
+
+# Background jobs (see jobs.py). Worker threads run in every app process;
+# set JOB_WORKER_THREADS=0 and run worker.py to keep them out of web workers.
+app.config['JOB_WORKER_THREADS'] = int(os.getenv('JOB_WORKER_THREADS', 1))
+app.config['JOB_MAX_ATTEMPTS'] = int(os.getenv('JOB_MAX_ATTEMPTS', 5))
+# Owner dashboard counters are rebuilt from the base tables this often
+# (0 = only when an owner has no counters row yet)
+app.config['OWNER_STATS_RECONCILE_SECONDS'] = int(os.getenv('OWNER_STATS_RECONCILE_SECONDS', 86400))
+app.config['OWNER_RECENT_SALES'] = int(os.getenv('OWNER_RECENT_SALES', 12))
+
+# Admission control (see ratelimit.py): per-IP / per-session token buckets
+# for expensive endpoints, and a cap on requests in flight per process
+# (0 = no cap; serve.py sets it to its --threads). Buckets are shared
+# between workers like the listing cache.
+app.config['RATE_LIMITS'] = os.getenv('RATE_LIMITS', 'login:ip=20/60,login:session=10/60,'
+                                      'register:ip=10/60,owner_register:ip=10/60,'
+                                      'search:ip=120/60,search:session=60/60')
+app.config['RATE_LIMIT_BACKEND'] = os.getenv('RATE_LIMIT_BACKEND', app.config['CACHE_BACKEND'])
+app.config['MAX_IN_FLIGHT'] = int(os.getenv('MAX_IN_FLIGHT', 64))
+# Reverse proxies (nginx) in front of the app. Per-IP limits need the client
+# address from X-Forwarded-For, trusted for this many hops only (0 = direct).
+app.config['TRUSTED_PROXIES'] = int(os.getenv('TRUSTED_PROXIES', 0))
+if app.config['TRUSTED_PROXIES']:
+    hops = app.config['TRUSTED_PROXIES']
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops, x_host=hops)
+
+# Live owner inbox (see events.py): 'local' (single process) or 'sqlite'
+# (shared by all workers). Each open stream holds a server thread, so streams
+# are closed after EVENTS_STREAM_SECONDS and the browser reconnects, and at
+# most EVENTS_MAX_STREAMS are open per process (keep it well under the
+# worker's thread count; 0 = no cap).
+app.config['EVENTS_BACKEND'] = os.getenv('EVENTS_BACKEND', app.config['CACHE_BACKEND'])
+app.config['EVENTS_STREAM_SECONDS'] = int(os.getenv('EVENTS_STREAM_SECONDS', 300))
+app.config['EVENTS_HEARTBEAT_SECONDS'] = int(os.getenv('EVENTS_HEARTBEAT_SECONDS', 15))
+app.config['EVENTS_MAX_STREAMS'] = int(os.getenv('EVENTS_MAX_STREAMS', 2))
+
+# Cold start (see startup.py): templates load from a bytecode cache filled
+# by `python startup.py --precompile` at deploy time, and with WARM_STARTUP
+# every template and pooled connection is touched once before serving.
+app.config['TEMPLATE_CACHE_DIR'] = os.getenv('TEMPLATE_CACHE_DIR', os.path.join(app.instance_path, 'jinja-cache'))
+app.config['WARM_STARTUP'] = bool(int(os.getenv('WARM_STARTUP', 1)))
+app.jinja_env.bytecode_cache = bytecode_cache(app.config['TEMPLATE_CACHE_DIR'])
+startup.mark('config')
+
+mysql = PooledMySQL(app)
+startup.mark('db_pool')
+
+# ---------- Read-your-writes ----------
+def replica_consistent(conn):
+    """May this session read from replica `conn`? Only if it hasn't written
+    recently, or (in 'wait' mode) the replica has caught up with its write."""
+    written_at = session.get('db_written_at')
+    if not written_at or time.time() - written_at > app.config['REPLICA_PIN_SECONDS']:
+        return True
+    position = session.get('db_position')
+    if app.config['REPLICA_CONSISTENCY'] == 'wait' and position:
+        try:
+            return mysql.wait_for_position(conn, position, app.config['REPLICA_WAIT_SECONDS'])
+        except Exception as e:
+            app.logger.warning("Replica position check failed: %s", e)
+    return False
+
+mysql.replica_check = replica_consistent
+
+@app.after_request
+def remember_db_write(resp):
+    if mysql.wrote:
+        session['db_written_at'] = time.time()
+        if app.config['REPLICA_CONSISTENCY'] == 'wait':
+            try:
+                session['db_position'] = mysql.write_position()
+            except Exception as e:
+                print("Could not read the write position:", e)
+                session.pop('db_position', None)
+    return resp
+
+# Per-request SQL instrumentation (see metrics.py), exported on /metrics
+metrics = Metrics(slow_query_seconds=app.config['SLOW_QUERY_SECONDS'])
+metrics.init_app(app)
+mysql.wrap = metrics.wrap
+
+# ---------- Admission control (see ratelimit.py) ----------
+limiter = RateLimiter(make_bucket_store(app.config['RATE_LIMIT_BACKEND'],
+                                        os.path.join(app.instance_path, 'ratelimit.sqlite3')),
+                      parse_rules(app.config['RATE_LIMITS']))
+gate = ConcurrencyGate(app.config['MAX_IN_FLIGHT'])
+# Cheap or long-lived requests don't count against the in-flight cap
+GATE_EXEMPT = {'static', 'static_asset', 'metrics_endpoint', 'owner_requests_stream', 'healthz', 'readyz'}
+
+def client_idents():
+    # Session buckets only for logged-in accounts. Minting an id for anonymous
+    # clients would set a cookie on every hit, and dropping the cookie would
+    # get a fresh bucket anyway; the IP bucket covers them.
+    idents = {'ip': request.remote_addr}
+    if session.get('user_type'):
+        idents['session'] = f"{session['user_type']}:{session.get('user_id')}"
+    return idents
+
+def limit_charged():
+    # Forms (login, register) are charged per submission, not per page view
+    return request.method not in ('GET', 'HEAD') or 'POST' not in request.url_rule.methods
+
+def reject_request(status, retry_after, message):
+    if request.path.startswith('/api/'):
+        resp = make_response(*api_error(message, status))
+    else:
+        resp = make_response(message, status, {'Content-Type': 'text/plain; charset=utf-8'})
+    resp.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return resp
+
+@app.before_request
+def admit_request():
+    if request.endpoint in GATE_EXEMPT:
+        return None
+    if request.endpoint in limiter.rules and limit_charged():
+        wait = limiter.check(request.endpoint, client_idents())
+        if wait:
+            return reject_request(429, wait, 'Too many requests, please slow down.')
+    if not gate.enter():
+        return reject_request(503, 1, 'The server is busy right now, please try again in a moment.')
+    g._admitted = True
+
+@app.teardown_request
+def release_admission(exception):
+    if g.pop('_admitted', False):
+        gate.leave()
+
+# In-memory search index over available pets (see search_index.py)
+SEARCH_RESULT_LIMIT = int(os.getenv('SEARCH_RESULT_LIMIT', 500))
+search_index = SearchIndex()
+# Columnar snapshot for faceted browsing on index() (see facets.py)
+facet_index = FacetIndex()
+CATALOGUE_INDEX_COLUMNS = "PetID, Name, Type, Breed, Gender, Age, Price, Description, Status, CreatedAt"
+# Index version the in-memory indexes reflect (see sync_catalogue_indexes)
+indexed_version = None
+# Catching up on more changed pets than this is done with a full rebuild
+INDEX_SYNC_MAX_PETS = 500
+
+def rebuild_search_index():
+    global indexed_version
+    version = index_version()
+    # From the primary: the indexes are marked current as of `version`
+    cur = mysql.primary.cursor()
+    try:
+        cur.execute(f"SELECT {CATALOGUE_INDEX_COLUMNS} FROM Pets WHERE Status='available'")
+        rows = cur.fetchall()
+    finally:
+        cur.close()
+    search_index.rebuild(rows)
+    facet_index.rebuild(rows)
+    indexed_version = version
+
+def index_pet(row):
+    search_index.upsert(row)
+    facet_index.upsert(row)
+
+def unindex_pet(pet_id):
+    search_index.remove(pet_id)
+    facet_index.remove(pet_id)
+
+def reindex_pet(pet_id):
+    """Refresh one pet in the in-memory indexes from its current row."""
+    cur = mysql.connection.cursor()
+    try:
+        cur.execute(f"SELECT {CATALOGUE_INDEX_COLUMNS} FROM Pets WHERE PetID=%s", (pet_id,))
+        row = cur.fetchone()
+    finally:
+        cur.close()
+    if row:
+        index_pet(row)
+    else:
+        unindex_pet(pet_id)
+
+def sync_catalogue_indexes():
+    """Catch the in-memory indexes up with other processes' writes.
+
+    Writes in this process update the indexes directly; for index versions
+    we didn't make (another worker, worker.py) the change log names the
+    pets to reload. Only a gap in the log means a full rebuild.
+    """
+    global indexed_version
+    current = index_version()
+    if indexed_version == current:
+        return
+    try:
+        changed = None
+        if indexed_version is not None and indexed_version < current:
+            changed = versions.changes('catalogue_index', indexed_version, current)
+        if changed is None or len(changed) > INDEX_SYNC_MAX_PETS:
+            rebuild_search_index()
+            return
+        # From the primary, like the rebuild: we mark them current as of `current`
+        placeholders = ', '.join(['%s'] * len(changed))
+        cur = mysql.primary.cursor()
+        try:
+            cur.execute(f"SELECT {CATALOGUE_INDEX_COLUMNS} FROM Pets WHERE PetID IN ({placeholders})", changed)
+            rows = cur.fetchall()
+        finally:
+            cur.close()
+        for row in rows:
+            index_pet(row)
+        for pet_id in set(changed) - {row['PetID'] for row in rows}:
+            unindex_pet(pet_id)
+        indexed_version = current
+    except Exception as e:
+        print("Catalogue index sync failed:", e)
+
+# Catalogue version: bumped by every write that changes what the listings show
+versions = make_version_store(app.config['CACHE_BACKEND'], os.path.join(app.instance_path, 'versions.sqlite3'))
+listing_cache = VersionedLRUCache(app.config['LISTING_CACHE_SIZE'])
+
+def catalogue_version():
+    return versions.get('catalogue')
+
+# Separate from the catalogue version, which also changes for cache-only
+# reasons: bumped (with the pets changed) only when indexed data changed
+def index_version():
+    return versions.get('catalogue_index')
+
+def bump_catalogue(pet_id=None, reindex=True, added=()):
+    """Invalidate cached listings and `pet_id`'s own pages.
+
+    With `reindex`, also log `pet_id` and the `added` pets as changed for
+    the other processes' in-memory indexes (no pets: a full rebuild). The
+    caller applies the change to this process's indexes itself.
+    """
+    global indexed_version
+    versions.bump('catalogue')
+    if pet_id is not None:
+        versions.bump(f'pet:{pet_id}')
+    if reindex:
+        pet_ids = ([pet_id] if pet_id is not None else []) + list(added)
+        version = versions.bump_logged('catalogue_index', pet_ids)
+        # Only our own write happened since the indexes were last in sync
+        if indexed_version is not None and version == indexed_version + 1:
+            indexed_version = version
+
+with app.app_context():
+    try:
+        rebuild_search_index()
+    except Exception as e:
+        # /search falls back to the LIKE query until the index is built
+        print("Search index build failed:", e)
+startup.mark('catalogue_indexes')
+
+# ---------- Conditional GET ----------
+UPLOAD_CACHE_SECONDS = 365 * 24 * 3600
+ASSET_CACHE_SECONDS = 365 * 24 * 3600
+
+def release_id():
+    """Identifies the deployed build: APP_RELEASE (if set), the asset
+    fingerprints, and the app and template sources. The version counters
+    survive deploys, so without it a client would keep revalidating HTML
+    that links templates and /static/dist files of an older release."""
+    digest = hashlib.sha1(f"{os.getenv('APP_RELEASE', '')}:{assets.digest}".encode())
+    with open(__file__, 'rb') as f:
+        digest.update(f.read())
+    for name in sorted(app.jinja_env.list_templates(extensions=('html', 'txt', 'xml'))):
+        digest.update(app.jinja_env.loader.get_source(app.jinja_env, name)[0].encode())
+    return digest.hexdigest()[:12]
+
+RELEASE_ID = release_id()
+
+def page_etag(*parts):
+    """Strong ETag for a page built from the given versions/keys.
+
+    Pages render differently per account type (nav bar, Adopt button),
+    so that is part of the tag as well, as is the release.
+    """
+    raw = ':'.join(str(p) for p in (RELEASE_ID, versions.epoch) + parts + (session.get('user_type'),))
+    return hashlib.sha1(raw.encode()).hexdigest()[:24]
+
+def not_modified(etag):
+    """Return a 304 if the client already has `etag`, else None."""
+    # Pending flash messages must be rendered, not swallowed by a 304
+    if session.get('_flashes') or not request.if_none_match.contains(etag):
+        return None
+    resp = app.response_class(status=304)
+    resp.set_etag(etag)
+    resp.headers['Cache-Control'] = 'no-cache'
+    return resp
+
+def with_etag(body, etag):
+    resp = make_response(body)
+    resp.set_etag(etag)
+    resp.headers['Cache-Control'] = 'no-cache'
+    return resp
+
+@app.after_request
+def cache_uploaded_images(resp):
+    # Uploaded file names are never reused, so they can be cached forever
+    if request.path.startswith('/static/uploads/pets/') and resp.status_code in (200, 304):
+        resp.headers['Cache-Control'] = f'public, max-age={UPLOAD_CACHE_SECONDS}, immutable'
+    return resp
+
+@app.route('/static/dist/<path:filename>')
+def static_asset(filename):
+    """Built assets, precompressed at build time and cached for good."""
+    path, encoding = assets.resolve(filename, lambda enc: request.accept_encodings[enc] > 0)
+    if path is None:
+        return 'Not found', 404
+    resp = send_file(path, mimetype=mimetypes.guess_type(filename)[0], conditional=True,
+                     max_age=ASSET_CACHE_SECONDS)
+    resp.headers['Cache-Control'] = f'public, max-age={ASSET_CACHE_SECONDS}, immutable'
+    resp.headers['Vary'] = 'Accept-Encoding'
+    if encoding:
+        resp.headers['Content-Encoding'] = encoding
+    return resp
+
+# ---------- Streamed pages ----------
+# Listing pages are sent with stream_template: head, CSS and nav go out
+# while the listing is still being queried. Jinja yields many tiny pieces,
+# so they are coalesced into STREAM_CHUNK_SIZE writes, except at the
+# stream_flush() marker in base.html, which is sent as soon as it is reached.
+STREAM_CHUNK_SIZE = 16 * 1024
+STREAM_FLUSH = '<!--stream-flush-->'
+
+@app.template_global()
+def stream_flush():
+    return Markup(STREAM_FLUSH) if g.get('streaming') else ''
+
+def stream_page(template, **context):
+    # The session is saved before the body is sent, so flashes must be
+    # popped now; the template then reads them from the request's cache.
+    get_flashed_messages()
+    g.streaming = True
+    chunks = stream_template(template, **context)
+
+    def coalesce():
+        buf, size = [], 0
+        try:
+            for chunk in chunks:
+                if STREAM_FLUSH in chunk:
+                    head, _, tail = chunk.partition(STREAM_FLUSH)
+                    buf.append(head)
+                    yield ''.join(buf)
+                    buf, size = [tail], len(tail)
+                    continue
+                buf.append(chunk)
+                size += len(chunk)
+                if size >= STREAM_CHUNK_SIZE:
+                    yield ''.join(buf)
+                    buf, size = [], 0
+            if buf:
+                yield ''.join(buf)
+        finally:
+            # Ends the streamed request context here, not whenever it is collected
+            chunks.close()
+    return coalesce()
+
+def first_page_redirect():
+    """Redirect a request with a garbled ?after= cursor to the first page."""
+    args = request.args.to_dict(flat=False)
+    args.pop('after', None)
+    return redirect(url_for(request.endpoint, **request.view_args, **args))
+
+def available_pets_page(cursor, page_size):
+    """One page of available pets as (pets, next_cursor), cached per catalogue version."""
+    version = catalogue_version()
+    key = ('available', cursor, page_size)
+    page = listing_cache.get(version, key)
+    if page is None:
+        after, after_params = keyset_where('p.CreatedAt', 'p.PetID', cursor)
+        cur = tuple_cursor(mysql.connection)
+        try:
+            cur.execute(f"""
+                SELECT p.*, o.Name AS OwnerName, o.Email AS OwnerEmail
+                FROM Pets p
+                JOIN Owners o ON p.OwnerID = o.OwnerID
+                WHERE p.Status = 'available' AND {after}
+                ORDER BY p.CreatedAt DESC, p.PetID DESC
+                LIMIT %s
+            """, after_params + (page_size + 1,))
+            page = listing_cache.put(version, key, split_page(fetch_records(cur), page_size))
+        finally:
+            cur.close()
+    return page
+
+hasher = PasswordHasher(workers=app.config['HASH_WORKERS'],
+                        max_queue=app.config['HASH_MAX_QUEUE'],
+                        method=app.config['PASSWORD_HASH_METHOD'])
+
+def server_busy(template):
+    flash('The server is busy right now, please try again in a moment', 'warning')
+    return render_template(template), 503, {'Retry-After': '2'}
+
+def query_batch():
+    """QueryBatch for the current request, with its queries instrumented."""
+    endpoint = request.endpoint
+    return QueryBatch(mysql.read_pool(), mysql.connection, wrap=lambda conn: metrics.wrap(conn, endpoint))
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def save_pet_image(file):
+    # Only the original is written here; variants come from a job (see below)
+    return image_store.save(file, file.filename.rsplit('.', 1)[1], variants=False)
+
+def release_image(url):
+    """Delete an uploaded image once no pet references it any more.
+
+    Identical uploads share one file, so a pet's image may still be in use,
+    or about to be by an upload that hasn't committed yet: image_store.release()
+    holds off on recently saved files, and the job comes back for them later.
+    """
+    if not url:
+        return
+
+    def in_use(url):
+        cur = mysql.primary.cursor()
+        try:
+            cur.execute("SELECT 1 FROM Pets WHERE ImageURL=%s LIMIT 1", (url,))
+            return cur.fetchone() is not None
+        finally:
+            cur.close()
+
+    if not image_store.release(url, in_use):
+        job_queue.enqueue('release_image', delay=RELEASE_GRACE_SECONDS, url=url)
+
+# ---------- Background jobs ----------
+job_queue = JobQueue(os.path.join(app.instance_path, 'jobs.sqlite3'),
+                     max_attempts=app.config['JOB_MAX_ATTEMPTS'])
+
+@job_queue.task('image_variants')
+def image_variants_job(url, pet_id=None):
+    try:
+        made = image_store.make_variants(url.rsplit('/', 1)[-1])
+    except Exception:
+        # Raised on so the queue retries it (backoff, then JOB_MAX_ATTEMPTS)
+        app.logger.warning("Image variant generation failed for %s", url, exc_info=True)
+        raise
+    if made and pet_id is not None:
+        # Cached listings were rendered with the original; re-render with
+        # srcset. The indexed fields didn't change.
+        bump_catalogue(pet_id, reindex=False)
+
+@job_queue.task('release_image')
+def release_image_job(url):
+    with app.app_context():
+        release_image(url)
+
+if app.config['JOB_WORKER_THREADS']:
+    job_queue.start_threads(app.config['JOB_WORKER_THREADS'])
+
+# ---------- Live owner inbox (see events.py) ----------
+events = EventHub(make_broker(app.config['EVENTS_BACKEND'], os.path.join(app.instance_path, 'events.sqlite3')))
+# Streams are exempt from the in-flight cap but have a cap of their own
+stream_gate = ConcurrencyGate(app.config['EVENTS_MAX_STREAMS'])
+# Idle streams check for shutdown (draining) this often
+STREAM_POLL_SECONDS = 1.0
+
+def publish_inbox(owner_id, type_, **data):
+    """Push a change to an owner's open inbox pages. Call after commit; a
+    broker failure only costs the live update, never the request."""
+    try:
+        events.publish(f'owner:{owner_id}', type_, data)
+    except Exception as e:
+        print("Error publishing inbox event:", e)
+
 # ---------- Helper: login_required decorators ----------
 from functools import wraps
 def login_required(role='user'):
@@ -57,16 +585,112 @@ def login_required(role='user'):
     return decorator
 
 # ---------- Home & listing ----------
+# ---------- Faceted browse (see facets.py) ----------
+FACET_BREED_LIMIT = 15
+
+def facet_filters(args):
+    """Active facet filters from the query string: {facet: key or bucket}."""
+    filters = {}
+    for field in FACET_FIELDS:
+        value = (args.get(field.lower()) or '').strip().lower()
+        if value:
+            filters[field] = value
+    for field, buckets in FACET_RANGES.items():
+        value = args.get(field.lower(), '')
+        if value.isdigit() and int(value) < len(buckets):
+            filters[field] = int(value)
+    return filters
+
+def facet_panel(counts, filters):
+    """Facet values with counts and toggle links, for _facets.html."""
+    params = {f.lower(): v for f, v in filters.items()}
+    if request.args.get('per_page'):
+        params['per_page'] = request.args['per_page']
+    panel = []
+    for field in FACET_FIELDS + tuple(FACET_RANGES):
+        param = field.lower()
+        values = counts[field]
+        if field == 'Breed':
+            values = values[:FACET_BREED_LIMIT]
+        options = []
+        for value, label, n in values:
+            active = filters.get(field) == value
+            if not n and not active:
+                continue
+            # Picking the active value again clears it
+            link = dict(params)
+            if active:
+                link.pop(param)
+            else:
+                link[param] = value
+            options.append({'label': label, 'count': n, 'active': active, 'url': url_for('index', **link)})
+        panel.append({'name': field, 'options': options})
+    return panel
+
+def pets_by_ids(pet_ids):
+    """Available pets with owner details, in the order of `pet_ids`."""
+    if not pet_ids:
+        return []
+    cur = tuple_cursor(mysql.connection)
+    try:
+        cur.execute(f"""
+            SELECT p.*, o.Name AS OwnerName, o.Email AS OwnerEmail
+            FROM Pets p
+            JOIN Owners o ON p.OwnerID = o.OwnerID
+            WHERE p.PetID IN ({','.join(['%s'] * len(pet_ids))}) AND p.Status = 'available'
+        """, tuple(pet_ids))
+        rows = {row.PetID: row for row in fetch_records(cur)}
+    finally:
+        cur.close()
+    return [rows[pid] for pid in pet_ids if pid in rows]
+
 @app.route('/')
 def index():
-    cur = mysql.connection.cursor()
-    cur.execute("SELECT p.*, o.Name AS OwnerName FROM Pets p JOIN Owners o ON p.OwnerID = o.OwnerID WHERE p.Status='available'")
-    pets = cur.fetchall()
-    cur.close()
-    return render_template('index.html', pets=pets)
+    page_size = page_size_arg(request.args.get('per_page'), app.config['PAGE_SIZE'])
+    cursor = decode_cursor(request.args.get('after'))
+    if request.args.get('after') and cursor is None:
+        # Before the cache: the grid would be stored with the garbled link
+        return first_page_redirect()
+    filters = facet_filters(request.args)
+    sync_catalogue_indexes()
+    version = catalogue_version()
+    etag = page_etag('index', version, request.args.get('after'), page_size, sorted(filters.items()))
+    resp = not_modified(etag)
+    if resp is not None:
+        return resp
+
+    # Matches + counts for this filter set, shared by every page of it
+    facet_key = ('facets', tuple(sorted(filters.items())))
+    facets = listing_cache.get(version, facet_key)
+    if facets is None:
+        facets = listing_cache.put(version, facet_key, facet_index.query(filters))
+    matches, counts = facets
+
+    # The grid differs only by whether the Adopt button is shown
+    key = ('index_html', cursor, page_size, session.get('user_type') == 'user', facet_key)
+    pet_grid = listing_cache.get(version, key)
+    if pet_grid is None:
+        # Rendered from inside the streamed template, after the page head is out
+        def pet_grid():
+            if filters:
+                pet_ids, has_more = matches.page(cursor, page_size)
+                pets = pets_by_ids(pet_ids)
+                next_cursor = encode_cursor(pets[-1]['CreatedAt'], pets[-1]['PetID']) if has_more and pets else None
+            else:
+                pets, next_cursor = available_pets_page(cursor, page_size)
+            page_args = {f.lower(): v for f, v in filters.items()}
+            return listing_cache.put(version, key, Markup(
+                render_template('_pet_grid.html', pets=pets, next_cursor=next_cursor, page_args=page_args)))
+    return with_etag(stream_page('index.html', pet_grid=pet_grid, facets=facet_panel(counts, filters),
+                                 filters=filters, match_count=len(matches)), etag)
 
 @app.route('/pet/<int:pet_id>')
 def pet_detail(pet_id):
+    etag = page_etag('pet', pet_id, versions.get(f'pet:{pet_id}'))
+    resp = not_modified(etag)
+    if resp is not None:
+        return resp
+
     cur = mysql.connection.cursor()
     cur.execute("SELECT p.*, o.Name AS OwnerName, o.OwnerID FROM Pets p JOIN Owners o ON p.OwnerID = o.OwnerID WHERE p.PetID=%s", (pet_id,))
     pet = cur.fetchone()
@@ -74,7 +698,7 @@ def pet_detail(pet_id):
     if not pet:
         flash('Pet not found', 'warning')
         return redirect(url_for('index'))
-    return render_template('pet_detail.html', pet=pet)
+    return with_etag(render_template('pet_detail.html', pet=pet), etag)
 
 # ---------- User registration/login ----------
 @app.route('/register', methods=['GET','POST'])
@@ -85,7 +709,10 @@ def register():
         phone = request.form.get('phone')
         address = request.form.get('address')
         password = request.form.get('password')
-        hashed = generate_password_hash(password)
+        try:
+            hashed = hasher.hash(password)
+        except HashPoolBusy:
+            return server_busy('register.html')
         cur = mysql.connection.cursor()
         try:
             cur.execute("INSERT INTO Users (Name, Email, Phone, Address, Password) VALUES (%s,%s,%s,%s,%s)",
@@ -115,8 +742,27 @@ def login():
         
         user = cur.fetchone()
         cur.close()
-        
-        if user and check_password_hash(user.get('Password'), password):
+
+        valid = False
+        if user:
+            try:
+                valid, new_hash = hasher.verify(user.get('Password'), password)
+            except HashPoolBusy:
+                return server_busy('login.html')
+            if valid and new_hash:
+                table, id_col = ('Users', 'UserID') if acc_type == 'user' else ('Owners', 'OwnerID')
+                cur = mysql.connection.cursor()
+                try:
+                    cur.execute(f"UPDATE {table} SET Password=%s WHERE {id_col}=%s", (new_hash, user.get(id_col)))
+                    mysql.connection.commit()
+                except Exception as e:
+                    # Login still succeeds; the upgrade is retried next time
+                    mysql.connection.rollback()
+                    print("Password rehash failed:", e)
+                finally:
+                    cur.close()
+
+        if valid:
             session['user_type'] = acc_type
             session['user_id'] = user.get('UserID') if acc_type == 'user' else user.get('OwnerID')
             session['owner_id'] = user.get('OwnerID') if acc_type == 'owner' else None
@@ -143,7 +789,10 @@ def owner_register():
         phone = request.form.get('phone')
         address = request.form.get('address')
         password = request.form.get('password')
-        hashed = generate_password_hash(password)
+        try:
+            hashed = hasher.hash(password)
+        except HashPoolBusy:
+            return server_busy('owner_register.html')
         cur = mysql.connection.cursor()
         try:
             cur.execute("INSERT INTO Owners (Name, Email, Phone, Address, Password) VALUES (%s,%s,%s,%s,%s)",
@@ -158,22 +807,120 @@ def owner_register():
             cur.close()
     return render_template('owner_register.html')
 
+# ---------- Owner dashboard counters (migrations/0004) ----------
+# OwnerStats holds one row of running totals per owner. Every write that
+# changes what they summarise applies its deltas with bump_owner_stats() in
+# the same transaction, as its last statement: the counters row is locked
+# after the Pets/AdoptionRequests rows (never before), and only until commit.
+OWNER_STATS_SELECT = """
+    SELECT o.OwnerID,
+        (SELECT COUNT(*) FROM Pets p WHERE p.OwnerID = o.OwnerID AND p.Status = 'available'),
+        (SELECT COUNT(*) FROM AdoptionRequests ar JOIN Pets p ON p.PetID = ar.PetID
+          WHERE p.OwnerID = o.OwnerID AND ar.Status = 'Pending'),
+        (SELECT COUNT(*) FROM AdoptionHistory ah JOIN Pets p ON p.PetID = ah.PetID WHERE p.OwnerID = o.OwnerID),
+        (SELECT COALESCE(SUM(p.Price), 0) FROM AdoptionHistory ah JOIN Pets p ON p.PetID = ah.PetID
+          WHERE p.OwnerID = o.OwnerID),
+        (SELECT COALESCE(SUM(TIMESTAMPDIFF(SECOND, p.CreatedAt, ah.Date)), 0)
+          FROM AdoptionHistory ah JOIN Pets p ON p.PetID = ah.PetID WHERE p.OwnerID = o.OwnerID)
+    FROM Owners o WHERE o.OwnerID = %s
+"""
+
+def adoption_seconds(listed_at, adopted_at):
+    """Listing-to-adoption time, truncated like TIMESTAMPDIFF(SECOND, ...)."""
+    if not listed_at or not adopted_at:
+        return 0
+    return int((adopted_at - listed_at).total_seconds())
+
+def bump_owner_stats(cur, owner_id, available=0, pending=0, sold=0, revenue=0, seconds=0):
+    """Apply deltas to an owner's counters inside the caller's transaction."""
+    cur.execute("""
+        INSERT INTO OwnerStats (OwnerID, AvailablePets, PendingRequests, SoldPets, Revenue, AdoptionSeconds, UpdatedAt)
+        VALUES (%s, %s, %s, %s, %s, %s, NOW())
+        ON DUPLICATE KEY UPDATE
+            AvailablePets = AvailablePets + VALUES(AvailablePets),
+            PendingRequests = PendingRequests + VALUES(PendingRequests),
+            SoldPets = SoldPets + VALUES(SoldPets),
+            Revenue = Revenue + VALUES(Revenue),
+            AdoptionSeconds = AdoptionSeconds + VALUES(AdoptionSeconds),
+            UpdatedAt = VALUES(UpdatedAt)
+    """, (owner_id, available, pending, sold, revenue or 0, seconds))
+
+def rebuild_owner_stats(conn, owner_id):
+    """Recompute one owner's counters from the base tables and commit."""
+    cur = conn.cursor()
+    try:
+        cur.execute(f"""
+            REPLACE INTO OwnerStats (OwnerID, AvailablePets, PendingRequests, SoldPets, Revenue, AdoptionSeconds)
+            {OWNER_STATS_SELECT}
+        """, (owner_id,))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+@job_queue.task('reconcile_owner_stats')
+def reconcile_owner_stats_job(owner_id=None):
+    """Rebuild counters for one owner, or all of them one short transaction
+    at a time; repairs drift from writes made outside the app."""
+    with app.app_context():
+        conn = mysql.primary
+        if owner_id is not None:
+            rebuild_owner_stats(conn, owner_id)
+            return
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT OwnerID FROM Owners")
+            owner_ids = [row['OwnerID'] for row in cur.fetchall()]
+            conn.commit()
+        finally:
+            cur.close()
+        for oid in owner_ids:
+            rebuild_owner_stats(conn, oid)
+    interval = app.config['OWNER_STATS_RECONCILE_SECONDS']
+    if interval:
+        job_queue.enqueue_unique('reconcile_owner_stats', delay=interval)
+
+if app.config['OWNER_STATS_RECONCILE_SECONDS']:
+    job_queue.enqueue_unique('reconcile_owner_stats', delay=app.config['OWNER_STATS_RECONCILE_SECONDS'])
+
 # ---------- Owner dashboard + Pet CRUD ----------
 @app.route('/owner/dashboard')
 @login_required(role='owner')
 def owner_dashboard():
     user_id = session.get('user_id')
-    cur = mysql.connection.cursor()
+    batch = query_batch()
+
+    # Running totals: one row, however long the history
+    batch.add('stats', "SELECT * FROM OwnerStats WHERE OwnerID = %s", (user_id,))
 
     # Fetch available pets
-    cur.execute("SELECT * FROM Pets WHERE OwnerID = %s AND Status = 'available'", (user_id,))
-    available_pets = cur.fetchall()
+    batch.add('available', "SELECT * FROM Pets WHERE OwnerID = %s AND Status = 'available'", (user_id,))
 
-    # Fetch sold pets
-    cur.execute("SELECT p.* FROM Pets p JOIN AdoptionHistory ah ON p.PetID = ah.PetID WHERE p.OwnerID = %s", (user_id,))
-    sold_pets = cur.fetchall()
+    # Most recent sales (idx_history_owner_date); the totals cover the rest
+    batch.add('sold', """
+        SELECT p.*, ah.Date AS AdoptedAt FROM AdoptionHistory ah JOIN Pets p ON p.PetID = ah.PetID
+        WHERE ah.OwnerID = %s ORDER BY ah.Date DESC LIMIT %s
+    """, (user_id, app.config['OWNER_RECENT_SALES']))
 
-    return render_template('owner_dashboard.html', available_pets=available_pets, sold_pets=sold_pets)
+    results = batch.run()
+    stats = results['stats'][0] if results['stats'] else None
+    if stats is None:
+        # First visit since the table was added: derive once, then it's maintained
+        rebuild_owner_stats(mysql.primary, user_id)
+        cur = mysql.primary.cursor()
+        try:
+            cur.execute("SELECT * FROM OwnerStats WHERE OwnerID = %s", (user_id,))
+            stats = cur.fetchone()
+        finally:
+            cur.close()
+    stats = stats or {'AvailablePets': 0, 'PendingRequests': 0, 'SoldPets': 0, 'Revenue': 0, 'AdoptionSeconds': 0}
+    avg_adoption_days = None
+    if stats['SoldPets'] > 0:
+        avg_adoption_days = round(stats['AdoptionSeconds'] / stats['SoldPets'] / 86400, 1)
+    return render_template('owner_dashboard.html', stats=stats, avg_adoption_days=avg_adoption_days,
+                           available_pets=results['available'], sold_pets=results['sold'])
 
 @app.route('/owner/pet/add', methods=['GET','POST'])
 @login_required(role='owner')
@@ -205,11 +952,7 @@ def owner_add_pet():
             file = request.files['image']
             if file and file.filename and allowed_file(file.filename):
                 try:
-                    # Generate safe filename with timestamp
-                    filename = secure_filename(f"{owner_id}_{int(time.time())}_{file.filename}")
-                    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                    file.save(filepath)
-                    image_url = f"/static/uploads/pets/{filename}"
+                    image_url = save_pet_image(file)
                 except Exception as e:
                     flash(f'Error uploading image: {str(e)}', 'danger')
                     return render_template('owner_add_pet.html')
@@ -217,18 +960,31 @@ def owner_add_pet():
                 flash('Invalid file format. Use PNG, JPG, JPEG, GIF, or WebP', 'danger')
                 return render_template('owner_add_pet.html')
         
+        cur = mysql.connection.cursor()
         try:
-            cur = mysql.connection.cursor()
             cur.execute("""
                 INSERT INTO Pets (Name, Type, Breed, Age, Gender, Description, Price, OwnerID, ImageURL, Status)
                 VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, 'available')
             """, (name, pet_type, breed, age, gender, description, price, owner_id, image_url))
+            pet_id = cur.lastrowid
+            bump_owner_stats(cur, owner_id, available=1)
             mysql.connection.commit()
-            cur.close()
-            flash('Pet added successfully!', 'success')
-            return redirect(url_for('owner_dashboard'))
         except Exception as e:
+            mysql.connection.rollback()
+            # The saved upload belongs to no pet now (unless a duplicate shares it)
+            if image_url:
+                job_queue.enqueue('release_image', url=image_url)
             flash(f'Error adding pet: {str(e)}', 'danger')
+            return render_template('owner_add_pet.html')
+        finally:
+            cur.close()
+
+        bump_catalogue(pet_id)
+        if image_url:
+            job_queue.enqueue('image_variants', url=image_url, pet_id=pet_id)
+        reindex_pet(pet_id)
+        flash('Pet added successfully!', 'success')
+        return redirect(url_for('owner_dashboard'))
     
     return render_template('owner_add_pet.html')
 
@@ -269,16 +1025,7 @@ def owner_edit_pet(pet_id):
             file = request.files['image']
             if file and file.filename and allowed_file(file.filename):
                 try:
-                    # Delete old image if it exists
-                    if pet['ImageURL']:
-                        old_file = os.path.join('templates', pet['ImageURL'].lstrip('/'))
-                        if os.path.exists(old_file):
-                            os.remove(old_file)
-                    
-                    filename = secure_filename(f"{owner_id}_{int(time.time())}_{file.filename}")
-                    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                    file.save(filepath)
-                    image_url = f"/static/uploads/pets/{filename}"
+                    image_url = save_pet_image(file)
                 except Exception as e:
                     flash(f'Error uploading image: {str(e)}', 'danger')
         
@@ -290,7 +1037,14 @@ def owner_edit_pet(pet_id):
                 WHERE PetID=%s AND OwnerID=%s
             """, (name, pet_type, breed, age, gender, description, price, image_url, pet_id, owner_id))
             mysql.connection.commit()
+            bump_catalogue(pet_id)
             cur.close()
+            reindex_pet(pet_id)
+            if image_url != pet['ImageURL']:
+                job_queue.enqueue('image_variants', url=image_url, pet_id=pet_id)
+                # Old image goes only after the row points at the new one
+                if pet['ImageURL']:
+                    job_queue.enqueue('release_image', url=pet['ImageURL'])
             flash('Pet updated successfully!', 'success')
             return redirect(url_for('owner_dashboard'))
         except Exception as e:
@@ -303,71 +1057,219 @@ def owner_edit_pet(pet_id):
 def owner_delete_pet(pet_id):
     owner_id = session.get('owner_id')
     cur = mysql.connection.cursor()
-    cur.execute("SELECT ImageURL FROM Pets WHERE PetID=%s AND OwnerID=%s", (pet_id, owner_id))
+    cur.execute("SELECT ImageURL, Status, Price, CreatedAt FROM Pets WHERE PetID=%s AND OwnerID=%s FOR UPDATE",
+                (pet_id, owner_id))
     pet = cur.fetchone()
     
     if not pet:
+        mysql.connection.rollback()
+        cur.close()
         flash('Pet not found', 'warning')
         return redirect(url_for('owner_dashboard'))
     
     try:
-        # Delete image file if exists
-        if pet.get('ImageURL'):
-            image_file = os.path.join('templates', pet['ImageURL'].lstrip('/'))
-            if os.path.exists(image_file):
-                os.remove(image_file)
-        
+        # Requests and history go with the pet (ON DELETE CASCADE); so do
+        # their shares of the owner's counters
+        cur.execute("SELECT COUNT(*) AS Pending FROM AdoptionRequests WHERE PetID=%s AND Status='Pending' FOR UPDATE",
+                    (pet_id,))
+        pending = cur.fetchone()['Pending']
+        cur.execute("SELECT Date FROM AdoptionHistory WHERE PetID=%s FOR UPDATE", (pet_id,))
+        sales = cur.fetchall()
         cur.execute("DELETE FROM Pets WHERE PetID=%s AND OwnerID=%s", (pet_id, owner_id))
+        bump_owner_stats(cur, owner_id,
+                         available=-1 if pet['Status'].lower() == 'available' else 0,
+                         pending=-pending, sold=-len(sales), revenue=-(pet['Price'] or 0) * len(sales),
+                         seconds=-sum(adoption_seconds(pet['CreatedAt'], sale['Date']) for sale in sales))
         mysql.connection.commit()
+        bump_catalogue(pet_id)
+        unindex_pet(pet_id)
+        # Delete image file once the row no longer references it
+        if pet.get('ImageURL'):
+            job_queue.enqueue('release_image', url=pet['ImageURL'])
         flash('Pet deleted successfully!', 'success')
     except Exception as e:
+        mysql.connection.rollback()
         flash(f'Error deleting pet: {str(e)}', 'danger')
     finally:
         cur.close()
     
     return redirect(url_for('owner_dashboard'))
 
+@app.route('/owner/pets/import', methods=['GET', 'POST'])
+@login_required(role='owner')
+def owner_import_pets():
+    if request.method == 'GET':
+        return render_template('owner_import.html')
+
+    # The request-wide 5MB cap is for single photos; imports carry a zip
+    request.max_content_length = app.config['IMPORT_MAX_SIZE']
+    owner_id = session.get('owner_id')
+    csv_file = request.files.get('csv')
+    archive = request.files.get('images')
+    if not csv_file or not csv_file.filename:
+        flash('Choose a CSV file to import', 'danger')
+        return render_template('owner_import.html')
+
+    try:
+        rows, errors = parse_rows(csv_file.stream, app.config['IMPORT_MAX_ROWS'])
+        names = {row['image'] for row in rows if row['image']}
+        urls, failures = {}, {}
+        if names:
+            if not archive or not archive.filename:
+                raise ImportRejected('The CSV references images but no zip file was uploaded')
+            urls, failures = store_images(archive.stream, names, image_store, ALLOWED_EXTENSIONS, MAX_FILE_SIZE)
+    except ImportRejected as e:
+        flash(str(e), 'danger')
+        return render_template('owner_import.html')
+
+    if failures:
+        errors += [(row['line'], failures[row['image']]) for row in rows if row['image'] in failures]
+        rows = [row for row in rows if row['image'] not in failures]
+    errors.sort()
+
+    imported = []
+    if rows:
+        batch_size = app.config['IMPORT_BATCH_SIZE']
+        cur = mysql.connection.cursor()
+        try:
+            # New rows are found afterwards by id, so note where they start
+            cur.execute("SELECT COALESCE(MAX(PetID), 0) AS LastID FROM Pets WHERE OwnerID=%s", (owner_id,))
+            last_id = cur.fetchone()['LastID']
+            # One transaction, one round trip per batch
+            for start in range(0, len(rows), batch_size):
+                cur.executemany("""
+                    INSERT INTO Pets (Name, Type, Breed, Age, Gender, Description, Price, OwnerID, ImageURL, Status)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, 'available')
+                """, [(r['name'], r['type'], r['breed'], r['age'], r['gender'], r['description'], r['price'],
+                       owner_id, urls.get(r['image'])) for r in rows[start:start + batch_size]])
+            bump_owner_stats(cur, owner_id, available=len(rows))
+            mysql.connection.commit()
+            cur.execute(f"""
+                SELECT {CATALOGUE_INDEX_COLUMNS}, ImageURL
+                FROM Pets WHERE OwnerID=%s AND PetID > %s
+            """, (owner_id, last_id))
+            imported = cur.fetchall()
+        except Exception as e:
+            mysql.connection.rollback()
+            print("Bulk import failed:", e)
+            for url in set(urls.values()):
+                job_queue.enqueue('release_image', url=url)
+            flash(f'Import failed, nothing was added: {str(e)}', 'danger')
+            return render_template('owner_import.html', errors=errors)
+        finally:
+            cur.close()
+
+        bump_catalogue(added=[pet['PetID'] for pet in imported])
+        for pet in imported:
+            index_pet(pet)
+        # One variants job per distinct image, not per pet
+        for url, pet_id in {pet['ImageURL']: pet['PetID'] for pet in imported if pet['ImageURL']}.items():
+            job_queue.enqueue('image_variants', url=url, pet_id=pet_id)
+
+    flash(f'Imported {len(rows)} pet(s); {len(errors)} row(s) skipped.',
+          'success' if not errors else 'warning')
+    return render_template('owner_import.html', errors=errors, imported=len(rows))
+
 # ---------- Adoption requests ----------
+def is_duplicate_key(e):
+    """True for MySQL ER_DUP_ENTRY (1062), whichever driver raised it."""
+    return bool(getattr(e, 'args', None)) and e.args[0] == 1062
+
+def complete_adoption(cur, req_id, user_id, pet_id, owner_id, idem_key=''):
+    """Pay for an approved request in one short transaction.
+
+    The Pets row is locked (FOR UPDATE) and re-checked, so of two buyers
+    racing for one pet exactly one wins. With an idempotency key a replayed
+    POST hits the IdempotencyKeys primary key and does nothing. Returns the
+    new AdoptionID, or None when there was nothing (left) to do.
+    """
+    conn = mysql.connection
+    try:
+        if idem_key:
+            cur.execute("INSERT INTO IdempotencyKeys (IdemKey, UserID, Scope) VALUES (%s, %s, 'payment')",
+                        (idem_key, user_id))
+        cur.execute("SELECT OwnerID, Status, Price, CreatedAt FROM Pets WHERE PetID=%s FOR UPDATE", (pet_id,))
+        pet = cur.fetchone()
+        if not pet or pet['Status'].lower() != 'available':
+            conn.rollback()
+            return None
+        # Locking read: an owner deciding one of these right now waits for us
+        cur.execute("SELECT COUNT(*) AS Pending FROM AdoptionRequests WHERE PetID=%s AND Status='Pending' FOR UPDATE",
+                    (pet_id,))
+        pending = cur.fetchone()['Pending']
+        cur.execute("DELETE FROM AdoptionRequests WHERE ReqID=%s AND UserID=%s", (req_id, user_id))
+        if cur.rowcount != 1:
+            conn.rollback()
+            return None
+
+        # Whole seconds, as a DATETIME column stores it
+        adopted_at = datetime.utcnow().replace(microsecond=0)
+
+        cur.execute("""
+            INSERT INTO AdoptionHistory (UserID, PetID, OwnerID, PaymentID, Date)
+            VALUES (%s, %s, %s, %s, %s)
+        """, (user_id, pet_id, owner_id, None, adopted_at))
+        adoption_id = cur.lastrowid
+        cur.execute("UPDATE Pets SET Status='adopted' WHERE PetID=%s", (pet_id,))
+        # Other buyers' requests for this pet are settled in the same transaction
+        cur.execute("UPDATE AdoptionRequests SET Status='Rejected' WHERE PetID=%s AND Status IN ('Pending','Approved')",
+                    (pet_id,))
+        bump_owner_stats(cur, pet['OwnerID'], available=-1, pending=-pending, sold=1, revenue=pet['Price'],
+                         seconds=adoption_seconds(pet['CreatedAt'], adopted_at))
+        if idem_key:
+            cur.execute("UPDATE IdempotencyKeys SET ResultID=%s WHERE IdemKey=%s", (adoption_id, idem_key))
+        conn.commit()
+        return adoption_id
+    except Exception as e:
+        conn.rollback()
+        if is_duplicate_key(e):
+            return None
+        raise
+
 @app.route('/adopt/<int:pet_id>', methods=['POST'])
 @login_required(role='user')
 def adopt(pet_id):
     """User requests adoption for a pet (creates AdoptionRequests row)."""
     user_id = session.get('user_id')
+    message = request.form.get('message', '')
     cur = mysql.connection.cursor()
     try:
-        # Check pet exists and is available
-        cur.execute("SELECT PetID, Status, OwnerID FROM Pets WHERE PetID = %s", (pet_id,))
+        # Shared lock: a concurrent payment for this pet (FOR UPDATE) waits
+        # for us, so a request can't be created for a pet just sold.
+        cur.execute("SELECT PetID, Name, Status, OwnerID FROM Pets WHERE PetID = %s LOCK IN SHARE MODE", (pet_id,))
         pet = cur.fetchone()
         if not pet:
+            mysql.connection.rollback()
             flash('Pet not found', 'danger')
             return redirect(url_for('user_dashboard'))
         if pet['Status'].lower() != 'available':
+            mysql.connection.rollback()
             flash('Pet is no longer available', 'warning')
             return redirect(url_for('user_dashboard'))
 
-        # Prevent duplicate pending requests by same user for same pet
-        cur.execute("""
-            SELECT ReqID FROM AdoptionRequests
-            WHERE PetID=%s AND UserID=%s AND Status IN ('Pending','pending')
-        """, (pet_id, user_id))
-        existing = cur.fetchone()
-        if existing:
-            flash('You already have a pending request for this pet', 'info')
-            return redirect(url_for('user_dashboard'))
-
-        # Create request (Message optional)
-        message = request.form.get('message', '')
+        # Duplicate pending requests are rejected by uq_requests_pending
+        # (migrations/0003), not by a racy check-then-insert.
         cur.execute("""
             INSERT INTO AdoptionRequests (UserID, PetID, Message, Status)
             VALUES (%s, %s, %s, %s)
         """, (user_id, pet_id, message, 'Pending'))
+        req_id = cur.lastrowid
+        bump_owner_stats(cur, pet['OwnerID'], pending=1)
         mysql.connection.commit()
 
+        cur.execute("SELECT Name, Email, Phone FROM Users WHERE UserID = %s", (user_id,))
+        user = cur.fetchone() or {}
+        publish_inbox(pet['OwnerID'], 'request.created', ReqID=req_id, PetID=pet_id, PetName=pet['Name'],
+                      UserName=user.get('Name'), Email=user.get('Email'), Phone=user.get('Phone'),
+                      Message=message, Status='Pending', CreatedAt=datetime.utcnow())
         flash('Adoption request sent. Owner will be notified.', 'success')
     except Exception as e:
         mysql.connection.rollback()
-        print("Error creating adoption request:", e)
-        flash('Could not send request', 'danger')
+        if is_duplicate_key(e):
+            flash('You already have a pending request for this pet', 'info')
+        else:
+            print("Error creating adoption request:", e)
+            flash('Could not send request', 'danger')
     finally:
         cur.close()
 
@@ -394,17 +1296,129 @@ def my_requests():
 @login_required(role='owner')
 def owner_requests():
     owner_id = session.get('owner_id')
+    page_size = page_size_arg(request.args.get('per_page'), app.config['PAGE_SIZE'])
+    after, after_params = keyset_where('ar.CreatedAt', 'ar.ReqID', decode_cursor(request.args.get('after')))
+    # Taken before the query: the live stream replays from here, so nothing
+    # published while the page loads is missed (the page applies repeats idempotently)
+    try:
+        stream_from = events.broker.last_id()
+    except Exception as e:
+        print("Error reading inbox position:", e)
+        stream_from = None
     cur = mysql.connection.cursor()
-    cur.execute("""
+    cur.execute(f"""
         SELECT ar.*, p.Name as PetName, u.Name as UserName, u.Email, u.Phone
         FROM AdoptionRequests ar
         JOIN Pets p ON ar.PetID = p.PetID
         JOIN Users u ON ar.UserID = u.UserID
-        WHERE p.OwnerID=%s
-    """, (owner_id,))
-    requests = cur.fetchall()
+        WHERE p.OwnerID=%s AND {after}
+        ORDER BY ar.CreatedAt DESC, ar.ReqID DESC
+        LIMIT %s
+    """, (owner_id,) + after_params + (page_size + 1,))
+    requests, next_cursor = split_page(cur.fetchall(), page_size, id_key='ReqID')
     cur.close()
-    return render_template('owner_requests.html', requests=requests)
+    return render_template('owner_requests.html', requests=requests, next_cursor=next_cursor,
+                           stream_from=stream_from)
+
+@app.route('/owner/requests/stream')
+@login_required(role='owner')
+def owner_requests_stream():
+    """Server-sent events: inbox deltas for the logged-in owner.
+
+    No database work here; the page is loaded once by owner_requests() and
+    then patched from events published by adopt(), owner_decide_request()
+    and user_payment().
+    """
+    headers = {'Cache-Control': 'no-store', 'X-Accel-Buffering': 'no'}
+    if draining.is_set() or not stream_gate.enter():
+        # EventSource gives up on an error status; an empty stream with a
+        # long retry makes it come back later (to another worker, maybe)
+        return Response("retry: 30000\n\n", content_type='text/event-stream; charset=utf-8', headers=headers)
+
+    last_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_id = int(last_id) if last_id else None
+    except ValueError:
+        last_id = None
+    try:
+        sub = events.subscribe(f"owner:{session.get('owner_id')}", last_id)
+    except Exception:
+        stream_gate.leave()
+        raise
+    lifetime = app.config['EVENTS_STREAM_SECONDS']
+    heartbeat = app.config['EVENTS_HEARTBEAT_SECONDS']
+
+    def stream():
+        now = time.monotonic()
+        deadline = now + lifetime
+        next_keepalive = now + heartbeat
+        try:
+            if last_id is None:
+                # Gives the browser an id to resume from even before the first event
+                yield f"retry: 3000\nid: {sub.last_id}\nevent: ready\ndata: {{}}\n\n"
+            else:
+                yield "retry: 3000\n\n"
+            # On shutdown/reload the stream ends and the browser reconnects elsewhere
+            while not draining.is_set():
+                now = time.monotonic()
+                if now >= deadline:
+                    break
+                event = sub.get(timeout=min(STREAM_POLL_SECONDS, deadline - now))
+                if event is None:
+                    if sub.overflowed:
+                        break    # fell behind; the reconnect replays from our last id
+                    if time.monotonic() >= next_keepalive:
+                        next_keepalive = time.monotonic() + heartbeat
+                        yield ": keepalive\n\n"
+                    continue
+                yield f"id: {event.id}\nevent: {event.type}\ndata: {event.data}\n\n"
+        finally:
+            sub.close()
+
+    resp = Response(stream(), content_type='text/event-stream; charset=utf-8', headers=headers)
+    # Runs even if the body is never iterated (client gone before the first byte)
+    resp.call_on_close(stream_gate.leave)
+    return resp
+
+# ---------- Exports (streamed, see export.py) ----------
+def export_response(sql, params, basename):
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return 'Unsupported format (use csv or ndjson)', 400
+    endpoint = request.endpoint
+    body = stream_query(mysql.read_pool(), sql, params, fmt, wrap=lambda conn: metrics.wrap(conn, endpoint))
+    # No Content-Length: the server sends it chunked as rows arrive
+    return Response(body, content_type=EXPORT_FORMATS[fmt], headers={
+        'Content-Disposition': f'attachment; filename="{basename}.{fmt}"',
+        'Cache-Control': 'no-store',
+        'X-Accel-Buffering': 'no',
+    })
+
+@app.route('/owner/requests/export')
+@login_required(role='owner')
+def owner_requests_export():
+    return export_response("""
+        SELECT ar.ReqID, ar.PetID, p.Name AS PetName, ar.UserID, u.Name AS UserName, u.Email, u.Phone,
+               ar.Status, ar.Message, ar.CreatedAt
+        FROM AdoptionRequests ar
+        JOIN Pets p ON ar.PetID = p.PetID
+        JOIN Users u ON ar.UserID = u.UserID
+        WHERE p.OwnerID=%s
+        ORDER BY ar.CreatedAt DESC, ar.ReqID DESC
+    """, (session.get('owner_id'),), 'adoption-requests')
+
+@app.route('/owner/history/export')
+@login_required(role='owner')
+def owner_history_export():
+    return export_response("""
+        SELECT ah.AdoptionID, ah.PetID, p.Name AS PetName, p.Type, p.Breed, p.Price,
+               ah.UserID, u.Name AS UserName, u.Email, ah.PaymentID, ah.Date
+        FROM AdoptionHistory ah
+        JOIN Pets p ON ah.PetID = p.PetID
+        JOIN Users u ON ah.UserID = u.UserID
+        WHERE ah.OwnerID=%s
+        ORDER BY ah.Date DESC, ah.AdoptionID DESC
+    """, (session.get('owner_id'),), 'adoption-history')
 
 @app.route('/owner/request/decide/<int:req_id>', methods=['POST'])
 @login_required(role='owner')
@@ -425,49 +1439,36 @@ def owner_decide_request(req_id):
         return redirect(url_for('owner_requests'))
     
     try:
+        # Re-read under a row lock: a payment may have settled it meanwhile
+        cur.execute("SELECT Status FROM AdoptionRequests WHERE ReqID=%s FOR UPDATE", (req_id,))
+        current = cur.fetchone()
+        if not current:
+            mysql.connection.rollback()
+            flash('Request not found', 'warning')
+            return redirect(url_for('owner_requests'))
         cur.execute("UPDATE AdoptionRequests SET Status=%s WHERE ReqID=%s", (decision, req_id))
+        was_pending = (current['Status'] or '').lower() == 'pending'
+        is_pending = (decision or '').lower() == 'pending'
+        if was_pending != is_pending:
+            bump_owner_stats(cur, owner_id, pending=1 if is_pending else -1)
         mysql.connection.commit()
+        publish_inbox(owner_id, 'request.updated', ReqID=req_id, PetID=adoption_req['PetID'], Status=decision)
         flash(f'Request {decision}!', 'success')
     except Exception as e:
+        mysql.connection.rollback()
         flash('Error updating request', 'danger')
     finally:
         cur.close()
     
     return redirect(url_for('owner_requests'))
 
-# ---------- Payments (simple) ----------
+# ---------- Payments (legacy URL) ----------
 @app.route('/payment/<int:req_id>', methods=['GET','POST'])
 @login_required(role='user')
 def make_payment(req_id):
-    if request.method == 'POST':
-        user_id = session.get('user_id')
-        amount = request.form.get('amount')
-        
-        try:
-            amount = float(amount)
-        except:
-            flash('Invalid amount', 'danger')
-            return redirect(url_for('my_requests'))
-        
-        cur = mysql.connection.cursor()
-        try:
-            cur.execute("""
-                INSERT INTO AdoptionHistory (ReqID, UserID, Amount, PaymentDate)
-                VALUES (%s, %s, %s, NOW())
-            """, (req_id, user_id, amount))
-            
-            # Use an existing enum value (e.g. 'Approved') so DB doesn't reject it
-            cur.execute("UPDATE AdoptionRequests SET Status=%s WHERE ReqID=%s", ('Approved', req_id))
-            cur.execute("UPDATE Pets SET Status='adopted' WHERE PetID=%s", (req_id,))
-            mysql.connection.commit()
-            flash('Payment successful!', 'success')
-            return redirect(url_for('my_history'))
-        except Exception as e:
-            flash('Payment error', 'danger')
-        finally:
-            cur.close()
-    
-    return render_template('payment.html', req_id=req_id)
+    # Old links and bookmarks; paying goes through user_payment() and
+    # complete_adoption() so it is idempotent and keeps the history/stats right.
+    return redirect(url_for('user_payment', req_id=req_id))
 
 @app.route('/my_history')
 @login_required(role='user')
@@ -490,91 +1491,109 @@ def my_history():
 @app.route('/search')
 def search():
     query = request.args.get('q', '')
-    cur = mysql.connection.cursor()
-    cur.execute("""
-        SELECT p.*, o.Name AS OwnerName FROM Pets p 
-        JOIN Owners o ON p.OwnerID = o.OwnerID 
-        WHERE (p.Name LIKE %s OR p.Type LIKE %s OR p.Breed LIKE %s) AND p.Status='available'
-    """, (f'%{query}%', f'%{query}%', f'%{query}%'))
-    pets = cur.fetchall()
-    cur.close()
-    return render_template('index.html', pets=pets, search_query=query)
+    sync_catalogue_indexes()
+
+    def pet_grid():
+        cur = tuple_cursor(mysql.connection)
+        try:
+            if search_index.built_at is None or not query.strip():
+                # Empty query lists everything; also used until the index is built
+                cur.execute("""
+                    SELECT p.*, o.Name AS OwnerName FROM Pets p
+                    JOIN Owners o ON p.OwnerID = o.OwnerID
+                    WHERE (p.Name LIKE %s OR p.Type LIKE %s OR p.Breed LIKE %s) AND p.Status='available'
+                """, (f'%{query}%', f'%{query}%', f'%{query}%'))
+                pets = fetch_records(cur)
+            else:
+                pet_ids = search_index.search(query, limit=SEARCH_RESULT_LIMIT)
+                pets = []
+                if pet_ids:
+                    placeholders = ','.join(['%s'] * len(pet_ids))
+                    cur.execute(f"""
+                        SELECT p.*, o.Name AS OwnerName FROM Pets p
+                        JOIN Owners o ON p.OwnerID = o.OwnerID
+                        WHERE p.PetID IN ({placeholders}) AND p.Status='available'
+                    """, tuple(pet_ids))
+                    # Keep the index's relevance order
+                    rank = {pid: i for i, pid in enumerate(pet_ids)}
+                    pets = sorted(fetch_records(cur), key=lambda p: rank[p.PetID])
+        finally:
+            cur.close()
+        return Markup(render_template('_pet_grid.html', pets=pets))
+
+    return stream_page('index.html', pet_grid=pet_grid, search_query=query)
 
 # add the new user dashboard route
 @app.route('/user/dashboard')
 @login_required(role='user')
 def user_dashboard():
     user_id = session.get('user_id')
-    pets = []
-    pending = []
-    history = []
-    pending_payments = 0
+    page_size = page_size_arg(request.args.get('per_page'), app.config['PAGE_SIZE'])
+    cursor = decode_cursor(request.args.get('after'))
+    if request.args.get('after') and cursor is None:
+        return first_page_redirect()
 
-    cur = mysql.connection.cursor()
-    try:
-        # available pets
-        cur.execute("""
-            SELECT 
-                p.PetID, p.Name, p.Type, p.Breed, p.Age, p.Gender, p.Price,
-                p.ImageURL, p.Description, p.Status, p.CreatedAt, p.OwnerID,
-                o.Name as OwnerName, o.Email as OwnerEmail
-            FROM Pets p
-            LEFT JOIN Owners o ON p.OwnerID = o.OwnerID
-            WHERE p.Status = 'available'
-            ORDER BY p.CreatedAt DESC
-        """)
-        pets = cur.fetchall()
-
-        # pending adoption requests (user side)
-        cur.execute("""
-            SELECT 
-                ar.ReqID, ar.PetID, ar.UserID, ar.Status, ar.CreatedAt,
-                p.Name as PetName, p.ImageURL, p.Price, p.Breed, p.Type, p.Age, p.Gender,
-                o.Name as OwnerName, o.Email as OwnerEmail
-            FROM AdoptionRequests ar
-            JOIN Pets p ON ar.PetID = p.PetID
-            LEFT JOIN Owners o ON p.OwnerID = o.OwnerID
-            WHERE ar.UserID = %s AND ar.Status IN ('Pending','pending')
-            ORDER BY ar.CreatedAt DESC
-        """, (user_id,))
-        pending = cur.fetchall()
+    # The three per-user reads are independent: start them on their own
+    # pooled connections now, and let the template collect them (plus the
+    # pets page, on our connection) once the page head has been sent.
+    batch = query_batch()
 
-        # purchase history (completed adoptions) — read from AdoptionHistory
-        cur.execute("""
-            SELECT 
-                ah.AdoptionID, ah.UserID, ah.PetID, ah.OwnerID, ah.PaymentID, ah.Date as PaymentDate,
-                p.Name as PetName, p.ImageURL, p.Price, p.Breed, p.Type, p.Age, p.Gender,
-                o.Name as OwnerName, o.Email as OwnerEmail
-            FROM AdoptionHistory ah
-            JOIN Pets p ON ah.PetID = p.PetID
-            LEFT JOIN Owners o ON p.OwnerID = o.OwnerID
-            WHERE ah.UserID = %s
-            ORDER BY ah.Date DESC
-        """, (user_id,))
-        history = cur.fetchall()
+    # pending adoption requests (user side)
+    batch.add('pending', """
+        SELECT 
+            ar.ReqID, ar.PetID, ar.UserID, ar.Status, ar.CreatedAt,
+            p.Name as PetName, p.ImageURL, p.Price, p.Breed, p.Type, p.Age, p.Gender,
+            o.Name as OwnerName, o.Email as OwnerEmail
+        FROM AdoptionRequests ar
+        JOIN Pets p ON ar.PetID = p.PetID
+        LEFT JOIN Owners o ON p.OwnerID = o.OwnerID
+        WHERE ar.UserID = %s AND ar.Status IN ('Pending','pending')
+        ORDER BY ar.CreatedAt DESC
+    """, (user_id,))
 
-        # count of approvals from owners (requests approved and awaiting user "payment")
-        cur.execute("""
-            SELECT COUNT(*) as cnt
-            FROM AdoptionRequests
-            WHERE UserID = %s AND Status IN ('Approved','approved')
-        """, (user_id,))
-        row = cur.fetchone()
-        pending_payments = int(row['cnt']) if row and 'cnt' in row else 0
+    # purchase history (completed adoptions) — read from AdoptionHistory
+    batch.add('history', """
+        SELECT 
+            ah.AdoptionID, ah.UserID, ah.PetID, ah.OwnerID, ah.PaymentID, ah.Date as PaymentDate,
+            p.Name as PetName, p.ImageURL, p.Price, p.Breed, p.Type, p.Age, p.Gender,
+            o.Name as OwnerName, o.Email as OwnerEmail
+        FROM AdoptionHistory ah
+        JOIN Pets p ON ah.PetID = p.PetID
+        LEFT JOIN Owners o ON p.OwnerID = o.OwnerID
+        WHERE ah.UserID = %s
+        ORDER BY ah.Date DESC
+    """, (user_id,))
 
+    # count of approvals from owners (requests approved and awaiting user "payment")
+    batch.add('approved', """
+        SELECT COUNT(*) as cnt
+        FROM AdoptionRequests
+        WHERE UserID = %s AND Status IN ('Approved','approved')
+    """, (user_id,), one=True)
+    try:
+        batch.start()
     except Exception as e:
         print("Dashboard Error:", e)
-        import traceback; traceback.print_exc()
-        flash('Error loading dashboard', 'danger')
-        pets, pending, history, pending_payments = [], [], [], 0
-    finally:
-        cur.close()
 
-    return render_template('user_dashboard.html',
-                           pets=pets or [],
-                           pending=pending or [],
-                           history=history or [],
-                           pending_payments=pending_payments)
+    def load_dashboard():
+        """(pets, pending, history, pending_payments, available_count, next_cursor, load_error)"""
+        try:
+            # available pets (one page, shared with the homepage cache)
+            pets, next_cursor = available_pets_page(cursor, page_size)
+            results = batch.results()
+        except Exception as e:
+            # Too late to flash: the page is already on its way
+            print("Dashboard Error:", e)
+            import traceback; traceback.print_exc()
+            return [], [], [], 0, 0, None, True
+        row = results['approved']
+        pending_payments = int(row['cnt']) if row and 'cnt' in row else 0
+        # The page only holds PAGE_SIZE pets; the index knows the full count
+        available_count = len(search_index) if search_index.built_at is not None else len(pets)
+        return (pets or [], results['pending'] or [], results['history'] or [], pending_payments,
+                available_count, next_cursor, False)
+
+    return stream_page('user_dashboard.html', load_dashboard=load_dashboard)
 
 # --- payments pages ---
 @app.route('/user/payments')
@@ -604,8 +1623,18 @@ def user_payments():
 @login_required(role='user')
 def user_payment(req_id):
     user_id = session.get('user_id')
+    idem_key = (request.form.get('idempotency_key') or request.headers.get('Idempotency-Key') or '')[:64]
     cur = mysql.connection.cursor()
     try:
+        if request.method == 'POST' and idem_key:
+            # Replay of a payment that already went through: the request row
+            # is gone by now, so answer from the recorded key.
+            cur.execute("SELECT ResultID FROM IdempotencyKeys WHERE IdemKey=%s AND UserID=%s",
+                        (idem_key, user_id))
+            if cur.fetchone():
+                flash('Payment successful — adoption completed!', 'success')
+                return redirect(url_for('user_dashboard'))
+
         cur.execute("""
             SELECT ar.ReqID, ar.PetID, ar.Status, ar.CreatedAt,
                    p.Name AS PetName, p.Price, p.ImageURL, p.OwnerID
@@ -625,8 +1654,6 @@ def user_payment(req_id):
             cols = [d[0] for d in cur.description]
             req = dict(zip(cols, row))
 
-        print("DEBUG: user_payment req:", req)
-
         owner_id = req.get('OwnerID')
         if not owner_id:
             cur.execute("SELECT OwnerID FROM Pets WHERE PetID = %s", (req['PetID'],))
@@ -640,40 +1667,279 @@ def user_payment(req_id):
                 owner_id = r[0]
 
         if request.method == 'POST':
-            now = datetime.utcnow()
-            payment_ref = f"MOCK-{uuid.uuid4().hex[:8]}"
-            
-            print("DEBUG: Payment processed - inserting AdoptionHistory")
-            
-            # Insert into AdoptionHistory (payment recorded)
-            cur.execute("""
-                INSERT INTO AdoptionHistory (UserID, PetID, OwnerID, PaymentID, Date)
-                VALUES (%s, %s, %s, %s, %s)
-            """, (user_id, req['PetID'], owner_id, None, now))
-
-            # Mark pet as adopted (no longer available on site)
-            cur.execute("UPDATE Pets SET Status=%s WHERE PetID=%s", ('adopted', req['PetID']))
+            adoption_id = complete_adoption(cur, req_id, user_id, req['PetID'], owner_id, idem_key)
+            if adoption_id is None:
+                # Already processed (retry / double submit) or lost the race
+                flash('This adoption has already been completed or is no longer available.', 'info')
+                return redirect(url_for('user_dashboard'))
 
-            # DELETE the AdoptionRequest so it no longer shows as pending
-            cur.execute("DELETE FROM AdoptionRequests WHERE ReqID=%s", (req_id,))
-
-            mysql.connection.commit()
-            
-            print("DEBUG: Payment successful - redirecting to dashboard")
+            bump_catalogue(req['PetID'])
+            unindex_pet(req['PetID'])
+            # The paid request is gone and the pet's other requests were rejected
+            publish_inbox(owner_id, 'pet.adopted', ReqID=req_id, PetID=req['PetID'])
             flash('Payment successful — adoption completed!', 'success')
             return redirect(url_for('user_dashboard'))
 
-        return render_template('user_payment.html', req=req)
+        return render_template('user_payment.html', req=req, idempotency_key=uuid.uuid4().hex)
 
-    except Exception as e:
+    except Exception:
         mysql.connection.rollback()
-        import traceback
-        traceback.print_exc()
-        print("DEBUG: user_payment error:", str(e))
+        app.logger.exception("Payment for request %s failed", req_id)
         flash('Could not complete payment', 'danger')
         return redirect(url_for('user_payments'))
     finally:
         cur.close()
 
+# ---------- JSON API v1 ----------
+# Public field name -> SQL expression. `fields=` picks from these and only
+# the chosen columns are selected.
+API_PET_FIELDS = {
+    'id': 'p.PetID',
+    'name': 'p.Name',
+    'type': 'p.Type',
+    'breed': 'p.Breed',
+    'age': 'p.Age',
+    'gender': 'p.Gender',
+    'color': 'p.Color',
+    'size': 'p.Size',
+    'description': 'p.Description',
+    'price': 'p.Price',
+    'status': 'p.Status',
+    'image_url': 'p.ImageURL',
+    'created_at': 'p.CreatedAt',
+    'owner_id': 'p.OwnerID',
+    'owner_name': 'o.Name',
+}
+API_DEFAULT_FIELDS = ('id', 'name', 'type', 'breed', 'age', 'gender', 'price', 'image_url', 'created_at')
+# Exact-match and range filters on the listing
+API_PET_FILTERS = {'type': 'p.Type', 'breed': 'p.Breed', 'gender': 'p.Gender', 'size': 'p.Size'}
+API_PET_RANGES = {'price': ('p.Price', float), 'age': ('p.Age', int)}
+
+app.json.compact = True
+
+def api_error(message, status):
+    return jsonify({'error': message}), status
+
+def api_fields():
+    """Requested field names, or raise ValueError naming the unknown ones."""
+    raw = request.args.get('fields')
+    if not raw:
+        return API_DEFAULT_FIELDS
+    fields = tuple(dict.fromkeys(f.strip() for f in raw.split(',') if f.strip()))
+    unknown = [f for f in fields if f not in API_PET_FIELDS]
+    if unknown or not fields:
+        raise ValueError(f"unknown field(s): {', '.join(unknown) or '(none)'}")
+    return fields
+
+def api_select(fields):
+    """SELECT list for `fields`; always carries the keyset columns."""
+    cols = [f"{API_PET_FIELDS[f]} AS {f}" for f in fields]
+    cols += ['p.CreatedAt AS _created', 'p.PetID AS _id']
+    join = 'JOIN Owners o ON p.OwnerID = o.OwnerID' if 'owner_name' in fields else ''
+    return ', '.join(cols), join
+
+def api_value(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+def api_pet(row, fields):
+    return {f: api_value(row[f]) for f in fields}
+
+@app.route('/api/v1/pets')
+def api_pets():
+    try:
+        fields = api_fields()
+    except ValueError as e:
+        return api_error(str(e), 400)
+    page_size = page_size_arg(request.args.get('limit'), app.config['PAGE_SIZE'])
+    cursor = decode_cursor(request.args.get('after'))
+    if request.args.get('after') and cursor is None:
+        return api_error('invalid cursor', 400)
+
+    where, params = ["p.Status = 'available'"], []
+    for name, col in API_PET_FILTERS.items():
+        if request.args.get(name):
+            where.append(f"{col} = %s")
+            params.append(request.args[name])
+    for name, (col, cast) in API_PET_RANGES.items():
+        for bound, op in (('min', '>='), ('max', '<=')):
+            value = request.args.get(f"{bound}_{name}")
+            if value is None:
+                continue
+            try:
+                params.append(cast(value))
+            except ValueError:
+                return api_error(f"{bound}_{name} must be a number", 400)
+            where.append(f"{col} {op} %s")
+    after, after_params = keyset_where('p.CreatedAt', 'p.PetID', cursor)
+    where.append(after)
+
+    # Everything that shapes the response is part of the cache key and ETag
+    version = catalogue_version()
+    key = ('api_pets', fields, tuple(params), cursor, page_size)
+    etag = page_etag('api_pets', version, repr(key))
+    resp = not_modified(etag)
+    if resp is not None:
+        return resp
+
+    body = listing_cache.get(version, key)
+    if body is None:
+        select, join = api_select(fields)
+        cur = mysql.connection.cursor()
+        try:
+            cur.execute(f"""
+                SELECT {select}
+                FROM Pets p {join}
+                WHERE {' AND '.join(where)}
+                ORDER BY p.CreatedAt DESC, p.PetID DESC
+                LIMIT %s
+            """, tuple(params) + after_params + (page_size + 1,))
+            rows, next_cursor = split_page(cur.fetchall(), page_size, created_key='_created', id_key='_id')
+        finally:
+            cur.close()
+        body = listing_cache.put(version, key, {
+            'data': [api_pet(row, fields) for row in rows],
+            'next_cursor': next_cursor,
+        })
+    return with_etag(jsonify(body), etag)
+
+@app.route('/api/v1/pets/<int:pet_id>')
+def api_pet_detail(pet_id):
+    try:
+        fields = api_fields()
+    except ValueError as e:
+        return api_error(str(e), 400)
+    etag = page_etag('api_pet', pet_id, versions.get(f'pet:{pet_id}'), fields)
+    resp = not_modified(etag)
+    if resp is not None:
+        return resp
+
+    select, join = api_select(fields)
+    cur = mysql.connection.cursor()
+    try:
+        cur.execute(f"SELECT {select} FROM Pets p {join} WHERE p.PetID = %s", (pet_id,))
+        row = cur.fetchone()
+    finally:
+        cur.close()
+    if not row:
+        return api_error('pet not found', 404)
+    return with_etag(jsonify({'data': api_pet(row, fields)}), etag)
+
+# ---------- Metrics ----------
+for _name, _key, _help in (
+    ('petselling_db_pool_size', 'size', 'Open MySQL connections.'),
+    ('petselling_db_pool_in_use', 'in_use', 'MySQL connections currently borrowed.'),
+    ('petselling_db_pool_wait_seconds_total', 'wait_seconds_total', 'Time spent waiting for a connection.'),
+    ('petselling_db_pool_wait_seconds_max', 'wait_seconds_max', 'Longest wait for a connection.'),
+    ('petselling_db_pool_timeouts_total', 'timeouts', 'Borrow attempts that found the pool exhausted.'),
+):
+    metrics.gauge(_name, _help, lambda key=_key: mysql.pool.stats()[key])
+metrics.gauge('petselling_db_replica_pool_in_use', 'Replica connections currently borrowed (all replicas).',
+              lambda: sum(pool.stats()['in_use'] for pool in mysql.replicas))
+metrics.gauge('petselling_db_replica_pool_timeouts_total', 'Replica borrow attempts that found the pool exhausted.',
+              lambda: sum(pool.stats()['timeouts'] for pool in mysql.replicas))
+metrics.gauge('petselling_rate_limited_total', 'Requests rejected with 429 by the rate limits.',
+              lambda: limiter.rejected)
+metrics.gauge('petselling_overload_rejected_total', 'Requests shed with 503 at the in-flight cap.',
+              lambda: gate.rejected)
+metrics.gauge('petselling_requests_in_flight', 'Requests currently admitted in this process.',
+              lambda: gate.in_flight)
+metrics.gauge('petselling_listing_cache_hits_total', 'Listing cache hits.', lambda: listing_cache.hits)
+metrics.gauge('petselling_listing_cache_misses_total', 'Listing cache misses.', lambda: listing_cache.misses)
+metrics.gauge('petselling_password_hash_rejected_total', 'Hash requests shed by the pool.', lambda: hasher.rejected)
+metrics.gauge('petselling_search_index_pets', 'Pets in the search index.', lambda: len(search_index))
+for _name, _key, _help in (
+    ('petselling_jobs_queued', 'queued', 'Background jobs waiting to run.'),
+    ('petselling_jobs_running', 'running', 'Background jobs currently running.'),
+    ('petselling_jobs_failed', 'failed', 'Background jobs that exhausted their retries.'),
+    ('petselling_jobs_oldest_queued_age_seconds', 'oldest_queued_age_seconds', 'Age of the oldest waiting job.'),
+    ('petselling_jobs_wait_seconds_avg', 'wait_seconds_avg', 'Average enqueue-to-start latency (last 5 min).'),
+    ('petselling_jobs_wait_seconds_max', 'wait_seconds_max', 'Longest enqueue-to-start latency (last 5 min).'),
+    ('petselling_jobs_run_seconds_avg', 'run_seconds_avg', 'Average job run time (last 5 min).'),
+):
+    metrics.gauge(_name, _help, lambda key=_key: job_queue.stats()[key])
+metrics.gauge('petselling_inbox_subscribers', 'Open owner inbox streams in this process.', lambda: events.subscribers)
+metrics.gauge('petselling_inbox_streams_refused_total', 'Inbox streams turned away at EVENTS_MAX_STREAMS.',
+              lambda: stream_gate.rejected)
+metrics.gauge('petselling_inbox_events_published_total', 'Inbox events published by this process.', lambda: events.published)
+metrics.gauge('petselling_inbox_events_delivered_total', 'Inbox events queued to streams in this process.', lambda: events.delivered)
+metrics.gauge('petselling_inbox_events_dropped_total', 'Inbox events dropped for slow streams (replayed on reconnect).', lambda: events.dropped)
+
+@app.route('/metrics')
+def metrics_endpoint():
+    token = app.config['METRICS_TOKEN']
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return 'Unauthorized', 401
+    return metrics.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+# ---------- Health ----------
+# Set by serve.py when this worker stops taking new requests
+draining = threading.Event()
+
+@app.route('/healthz')
+def healthz():
+    """Liveness: the process is up and serving requests."""
+    return 'ok', 200, {'Content-Type': 'text/plain', 'Cache-Control': 'no-store'}
+
+@app.route('/readyz')
+def readyz():
+    """Readiness: warmed up, not draining, and the database answers."""
+    headers = {'Content-Type': 'text/plain', 'Cache-Control': 'no-store'}
+    if draining.is_set():
+        return 'draining', 503, headers
+    try:
+        pooled = mysql.pool.acquire(timeout=1)
+    except Exception:
+        return 'database unavailable', 503, headers
+    discard = False
+    try:
+        cur = pooled.raw.cursor()
+        cur.execute("SELECT 1")
+        cur.fetchall()
+        cur.close()
+    except Exception:
+        discard = True
+        return 'database unavailable', 503, headers
+    finally:
+        mysql.pool.release(pooled, discard=discard)
+    return 'ready', 200, headers
+
+# ---------- Startup ----------
+def warm_up():
+    """Touch everything a first request would pay for: load every template
+    (from compiled bytecode when precompiled) and make a round trip on each
+    prewarmed pool connection."""
+    try:
+        precompile_templates(app.jinja_env)
+    except Exception as e:
+        print("Template warmup failed:", e)
+    startup.mark('templates')
+    for pool in [mysql.pool] + mysql.replicas:
+        borrowed = []
+        try:
+            while len(borrowed) < pool.min_size:
+                borrowed.append(pool.acquire())
+                cur = borrowed[-1].raw.cursor()
+                cur.execute("SELECT 1")
+                cur.fetchall()
+                cur.close()
+        except Exception as e:
+            print("Database warmup failed:", e)
+        finally:
+            for pooled in borrowed:
+                pool.release(pooled)
+    startup.mark('db_warmup')
+    app.logger.info(startup.report())
+
+startup.mark('routes')
+if app.config['WARM_STARTUP']:
+    warm_up()
+metrics.gauge('petselling_startup_seconds', 'Time this process took to import and warm the app.',
+              lambda: startup.total)
+
 if __name__ == '__main__':
+    # Development server only; production runs under serve.py
     app.run(debug=True)
\ No newline at end of file
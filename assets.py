@@ -0,0 +1,148 @@
+# assets.py
+# Fingerprinted, precompressed CSS/JS. Sources live in templates/static/css
+# and templates/static/js; the build writes each one to templates/static/dist
+# as name.<hash>.ext, plus .gz (and .br when the brotli package is installed)
+# variants and a manifest.json mapping logical names to built files:
+#
+#   python assets.py            build (run at deploy time, before workers start)
+#
+# Templates link assets with asset_url('css/index.css'). Built files never
+# change once written, so they are served with a one-year immutable cache;
+# without a build, asset_url() points at the source file instead.
+import gzip
+import hashlib
+import json
+import os
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip covers every browser
+    brotli = None
+
+SOURCE_DIRS = ('css', 'js')
+DIST_DIR = 'dist'
+MANIFEST = 'manifest.json'
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))    # preferred first
+
+
+def _compress(data, encoding):
+    if encoding == 'gzip':
+        return gzip.compress(data, 9, mtime=0)
+    if encoding == 'br' and brotli is not None:
+        return brotli.compress(data, quality=11)
+    return None
+
+
+def build(static_root):
+    """Fingerprint and compress every source asset under `static_root`.
+
+    Files from the previous build are kept (pages rendered by workers still
+    on the old release link them); anything older is removed. Returns the
+    new manifest.
+    """
+    out_dir = os.path.join(static_root, DIST_DIR)
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_path = os.path.join(out_dir, MANIFEST)
+    previous = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            previous = json.load(f)
+
+    manifest = {}
+    for folder in SOURCE_DIRS:
+        src_dir = os.path.join(static_root, folder)
+        if not os.path.isdir(src_dir):
+            continue
+        for filename in sorted(os.listdir(src_dir)):
+            stem, ext = os.path.splitext(filename)
+            if ext not in ('.css', '.js'):
+                continue
+            with open(os.path.join(src_dir, filename), 'rb') as f:
+                data = f.read()
+            digest = hashlib.sha256(data).hexdigest()[:12]
+            built = f'{folder}/{stem}.{digest}{ext}'
+            os.makedirs(os.path.join(out_dir, folder), exist_ok=True)
+            _write(os.path.join(out_dir, built), data)
+            for encoding, suffix in ENCODINGS:
+                compressed = _compress(data, encoding)
+                if compressed is not None and len(compressed) < len(data):
+                    _write(os.path.join(out_dir, built + suffix), compressed)
+            manifest[f'{folder}/{filename}'] = built
+
+    keep = set(manifest.values()) | set(previous.values())
+    for folder in SOURCE_DIRS:
+        built_dir = os.path.join(out_dir, folder)
+        if not os.path.isdir(built_dir):
+            continue
+        for filename in os.listdir(built_dir):
+            base = filename
+            for _, suffix in ENCODINGS:
+                if base.endswith(suffix):
+                    base = base[:-len(suffix)]
+            if f'{folder}/{base}' not in keep:
+                os.remove(os.path.join(built_dir, filename))
+
+    _write(manifest_path, json.dumps(manifest, indent=2, sort_keys=True).encode())
+    return manifest
+
+
+def _write(path, data):
+    # Write-then-rename: a worker never serves a half-written file
+    tmp = f'{path}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+class AssetManifest:
+    """Maps logical asset names to their built, fingerprinted files."""
+
+    def __init__(self, static_root, url_prefix='/static'):
+        self.static_root = static_root
+        self.url_prefix = url_prefix.rstrip('/')
+        self.dist_dir = os.path.join(static_root, DIST_DIR)
+        self._built = {}
+        self._files = set()
+        self.digest = ''
+        self.load()
+
+    def load(self):
+        try:
+            with open(os.path.join(self.dist_dir, MANIFEST)) as f:
+                self._built = json.load(f)
+        except (OSError, ValueError):
+            self._built = {}
+        self._files = set(self._built.values())
+        # Changes whenever any fingerprint does (part of page ETags)
+        self.digest = hashlib.sha256(json.dumps(self._built, sort_keys=True).encode()).hexdigest()[:12]
+
+    def __len__(self):
+        return len(self._built)
+
+    def url(self, name):
+        built = self._built.get(name)
+        if built is None:
+            return f'{self.url_prefix}/{name}'
+        return f'{self.url_prefix}/{DIST_DIR}/{built}'
+
+    def resolve(self, filename, accepts):
+        """Pick the file to send for a built asset.
+
+        `accepts(encoding)` says whether the client takes that encoding.
+        Returns (path, encoding or None), or (None, None) for names that
+        aren't in the manifest.
+        """
+        if filename not in self._files:
+            return None, None
+        path = os.path.join(self.dist_dir, filename)
+        for encoding, suffix in ENCODINGS:
+            if accepts(encoding) and os.path.exists(path + suffix):
+                return path + suffix, encoding
+        return path, None
+
+
+if __name__ == '__main__':
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates', 'static')
+    built = build(root)
+    print(f"Built {len(built)} assets into {os.path.join(root, DIST_DIR)}"
+          f"{'' if brotli else ' (brotli not installed: gzip only)'}")
@@ -0,0 +1,355 @@
+# benchmark.py
+# Seed a synthetic dataset and load-test the main routes in-process.
+#
+#   python benchmark.py seed --standin bench.sqlite3 --pets 100000 --requests 1000000
+#   python benchmark.py run  --standin bench.sqlite3 --users 20 --duration 30
+#   python benchmark.py compare benchmarks/base.json benchmarks/new.json
+#
+# Without --standin both commands use the MySQL database from .env. Results
+# are written as JSON (per-endpoint throughput and p50/p95/p99 latency) so
+# two commits can be compared with `compare`.
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+TYPES = {
+    'Dog': ['Labrador', 'Beagle', 'Poodle', 'Bulldog', 'Husky', 'Indie', 'German Shepherd'],
+    'Cat': ['Persian', 'Siamese', 'Maine Coon', 'Bengal', 'Indie'],
+    'Bird': ['Parrot', 'Cockatiel', 'Budgie', 'Finch'],
+    'Rabbit': ['Lop', 'Rex', 'Dutch'],
+    'Fish': ['Goldfish', 'Betta', 'Guppy'],
+}
+NAMES = ['Max', 'Bella', 'Charlie', 'Luna', 'Rocky', 'Milo', 'Coco', 'Bruno', 'Daisy', 'Simba',
+         'Oreo', 'Tiger', 'Snowy', 'Ginger', 'Leo', 'Mango', 'Pepper', 'Shadow', 'Zara', 'Kiwi']
+SEARCH_TERMS = ['lab', 'dog', 'cat', 'persian', 'max', 'bella', 'indie', 'parrot', 'husky', 'rex', 'go']
+BATCH = 5000
+
+# endpoint -> relative weight in the request mix
+DEFAULT_MIX = {
+    'index': 30,
+    'search': 20,
+    'pet_detail': 25,
+    'user_dashboard': 10,
+    'owner_requests': 5,
+    'adopt': 5,
+    'user_payment': 5,
+}
+
+
+def _connect(standin):
+    """DB-API connection returning dict rows, on either backend."""
+    if standin:
+        import sqlite_standin
+        return sqlite_standin.connect(standin, dict_rows=True)
+    import MySQLdb.cursors
+    from migrate import connect
+    return connect(cursorclass=MySQLdb.cursors.DictCursor)
+
+
+def _insert(conn, sql, rows):
+    cur = conn.cursor()
+    for i in range(0, len(rows), BATCH):
+        cur.executemany(sql, rows[i:i + BATCH])
+        conn.commit()
+    cur.close()
+
+
+# ---------- seed ----------
+def seed(args):
+    from werkzeug.security import generate_password_hash
+
+    rnd = random.Random(args.seed)
+    conn = _connect(args.standin)
+    password = generate_password_hash('benchmark')
+    now = datetime.now().replace(microsecond=0)
+
+    def when(max_days=730):
+        return now - timedelta(seconds=rnd.randrange(max_days * 86400))
+
+    t0 = time.perf_counter()
+    _insert(conn, "INSERT INTO Owners (Name, Email, Contact, Address, Password) VALUES (%s,%s,%s,%s,%s)",
+            [(f"Owner {i}", f"bench.owner{i}@example.com", '9000000000', 'Bench Street', password)
+             for i in range(args.owners)])
+    _insert(conn, "INSERT INTO Users (Name, Email, Phone, Address, Password) VALUES (%s,%s,%s,%s,%s)",
+            [(f"User {i}", f"bench.user{i}@example.com", '9100000000', 'Bench Road', password)
+             for i in range(args.users)])
+
+    cur = conn.cursor()
+    cur.execute("SELECT MIN(OwnerID) AS lo, MAX(OwnerID) AS hi FROM Owners WHERE Email LIKE 'bench.owner%%'")
+    row = cur.fetchone()
+    owner_lo, owner_hi = row['lo'], row['hi']
+    cur.execute("SELECT MIN(UserID) AS lo, MAX(UserID) AS hi FROM Users WHERE Email LIKE 'bench.user%%'")
+    row = cur.fetchone()
+    user_lo, user_hi = row['lo'], row['hi']
+    cur.close()
+
+    pets = []
+    for i in range(args.pets):
+        pet_type = rnd.choice(list(TYPES))
+        status = 'available' if rnd.random() < 0.9 else 'adopted'
+        pets.append((rnd.randint(owner_lo, owner_hi), f"{rnd.choice(NAMES)} {i}", pet_type,
+                     rnd.choice(TYPES[pet_type]), rnd.randint(0, 15), rnd.choice(['Male', 'Female']),
+                     f"Friendly {pet_type.lower()} looking for a home.", round(rnd.uniform(0, 900), 2),
+                     status, when()))
+    _insert(conn, """INSERT INTO Pets (OwnerID, Name, Type, Breed, Age, Gender, Description, Price, Status, CreatedAt)
+                     VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)""", pets)
+
+    cur = conn.cursor()
+    cur.execute("SELECT MIN(PetID) AS lo, MAX(PetID) AS hi FROM Pets")
+    row = cur.fetchone()
+    pet_lo, pet_hi = row['lo'], row['hi']
+    cur.close()
+
+    seen = set()
+    requests = []
+    while len(requests) < args.requests:
+        user_id, pet_id = rnd.randint(user_lo, user_hi), rnd.randint(pet_lo, pet_hi)
+        if (user_id, pet_id) in seen:
+            continue
+        seen.add((user_id, pet_id))
+        status = rnd.choices(['Pending', 'Approved', 'Rejected'], weights=[70, 10, 20])[0]
+        requests.append((user_id, pet_id, 'Seeded request', status, when()))
+    _insert(conn, "INSERT INTO AdoptionRequests (UserID, PetID, Message, Status, CreatedAt) VALUES (%s,%s,%s,%s,%s)",
+            requests)
+    del seen, requests
+
+    _insert(conn, "INSERT INTO AdoptionHistory (UserID, PetID, OwnerID, Date) VALUES (%s,%s,%s,%s)",
+            [(rnd.randint(user_lo, user_hi), rnd.randint(pet_lo, pet_hi), rnd.randint(owner_lo, owner_hi), when())
+             for _ in range(args.history)])
+    conn.close()
+    print(f"Seeded {args.owners} owners, {args.users} users, {args.pets} pets, {args.requests} requests, "
+          f"{args.history} history rows in {time.perf_counter() - t0:.1f}s")
+
+
+# ---------- run ----------
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    k = max(0, min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[k]
+
+
+class Workload:
+    """Ids sampled from the database that the simulated users act on."""
+
+    def __init__(self, conn, rnd, sample=5000):
+        cur = conn.cursor()
+        cur.execute("SELECT PetID FROM Pets WHERE Status='available' ORDER BY PetID DESC LIMIT %s", (sample,))
+        self.pet_ids = [r['PetID'] for r in cur.fetchall()]
+        cur.execute("SELECT UserID FROM Users ORDER BY UserID LIMIT %s", (sample,))
+        self.user_ids = [r['UserID'] for r in cur.fetchall()]
+        cur.execute("SELECT OwnerID FROM Owners ORDER BY OwnerID LIMIT %s", (sample,))
+        self.owner_ids = [r['OwnerID'] for r in cur.fetchall()]
+        cur.execute("""SELECT ReqID, UserID FROM AdoptionRequests WHERE Status IN ('Approved','approved')
+                       ORDER BY ReqID LIMIT %s""", (sample,))
+        self.approved = [(r['ReqID'], r['UserID']) for r in cur.fetchall()]
+        cur.close()
+        if not (self.pet_ids and self.user_ids and self.owner_ids):
+            sys.exit("Dataset is empty; run `benchmark.py seed` first")
+        self.rnd = rnd
+
+
+def _login(client, user_type, user_id):
+    with client.session_transaction() as sess:
+        sess.clear()
+        sess['user_type'] = user_type
+        sess['user_id'] = user_id
+        sess['owner_id'] = user_id if user_type == 'owner' else None
+
+
+def _request(client, endpoint, work, rnd, pay):
+    if endpoint == 'index':
+        return client.get('/')
+    if endpoint == 'search':
+        return client.get('/search', query_string={'q': rnd.choice(SEARCH_TERMS)})
+    if endpoint == 'pet_detail':
+        return client.get(f"/pet/{rnd.choice(work.pet_ids)}")
+    if endpoint == 'user_dashboard':
+        _login(client, 'user', rnd.choice(work.user_ids))
+        return client.get('/user/dashboard')
+    if endpoint == 'owner_requests':
+        _login(client, 'owner', rnd.choice(work.owner_ids))
+        return client.get('/owner/requests')
+    if endpoint == 'adopt':
+        _login(client, 'user', rnd.choice(work.user_ids))
+        return client.post(f"/adopt/{rnd.choice(work.pet_ids)}", data={'message': 'benchmark'})
+    if endpoint == 'user_payment':
+        if not work.approved:
+            return None
+        req_id, user_id = rnd.choice(work.approved)
+        _login(client, 'user', user_id)
+        # Completing a payment adopts the pet, so only a fraction of hits POST
+        if pay and rnd.random() < pay:
+            return client.post(f"/user/payment/{req_id}")
+        return client.get(f"/user/payment/{req_id}")
+    raise ValueError(endpoint)
+
+
+def run(args):
+    if args.standin:
+        os.environ['MYSQL_STANDIN'] = os.path.abspath(args.standin)
+    os.environ.setdefault('MYSQL_POOL_SIZE', str(max(10, args.users * 2)))
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from app import app
+
+    mix = dict(DEFAULT_MIX)
+    for item in args.mix or []:
+        name, _, weight = item.partition('=')
+        mix[name] = int(weight)
+    endpoints = [e for e, w in mix.items() if w > 0]
+    weights = [mix[e] for e in endpoints]
+
+    conn = _connect(args.standin)
+    work = Workload(conn, random.Random(args.seed))
+    conn.close()
+
+    samples = {e: [] for e in endpoints}
+    errors = {e: 0 for e in endpoints}
+    lock = threading.Lock()
+    deadline = [None]
+    warm_until = [None]
+
+    def worker(n):
+        rnd = random.Random(args.seed + n)
+        client = app.test_client()
+        local = {e: [] for e in endpoints}
+        local_err = {e: 0 for e in endpoints}
+        while time.perf_counter() < deadline[0]:
+            endpoint = rnd.choices(endpoints, weights)[0]
+            start = time.perf_counter()
+            try:
+                resp = _request(client, endpoint, work, rnd, args.pay)
+                if resp is not None:
+                    # Streamed pages only render while the body is read
+                    resp.get_data()
+                    resp.close()
+                failed = resp is not None and resp.status_code >= 500
+            except Exception:
+                failed = True
+                resp = True
+            elapsed = time.perf_counter() - start
+            if resp is None or start < warm_until[0]:
+                continue
+            local[endpoint].append(elapsed)
+            if failed:
+                local_err[endpoint] += 1
+        with lock:
+            for e in endpoints:
+                samples[e].extend(local[e])
+                errors[e] += local_err[e]
+
+    now = time.perf_counter()
+    warm_until[0] = now + args.warmup
+    deadline[0] = now + args.warmup + args.duration
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.users)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    report = {
+        'commit': _git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'backend': 'sqlite-standin' if args.standin else 'mysql',
+        'users': args.users,
+        'duration_s': args.duration,
+        'endpoints': {},
+    }
+    print(f"{'endpoint':<16}{'reqs':>8}{'err':>6}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for e in endpoints:
+        values = sorted(samples[e])
+        stats = {
+            'requests': len(values),
+            'errors': errors[e],
+            'rps': round(len(values) / args.duration, 2),
+            'p50_ms': _ms(percentile(values, 50)),
+            'p95_ms': _ms(percentile(values, 95)),
+            'p99_ms': _ms(percentile(values, 99)),
+            'max_ms': _ms(values[-1] if values else None),
+        }
+        report['endpoints'][e] = stats
+        print(f"{e:<16}{stats['requests']:>8}{stats['errors']:>6}{stats['rps']:>9}"
+              f"{_fmt(stats['p50_ms']):>9}{_fmt(stats['p95_ms']):>9}{_fmt(stats['p99_ms']):>9}")
+
+    out = args.out or os.path.join('benchmarks', f"{report['commit'] or 'run'}.json")
+    os.makedirs(os.path.dirname(out) or '.', exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"Wrote {out}")
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 2)
+
+
+def _fmt(value):
+    return '-' if value is None else f"{value:.1f}"
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ---------- compare ----------
+def compare(args):
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    print(f"{base.get('commit')} -> {new.get('commit')}")
+    print(f"{'endpoint':<16}{'metric':<8}{'base':>10}{'new':>10}{'change':>10}")
+    for e in sorted(set(base['endpoints']) | set(new['endpoints'])):
+        b, n = base['endpoints'].get(e, {}), new['endpoints'].get(e, {})
+        for metric in ('rps', 'p50_ms', 'p95_ms', 'p99_ms'):
+            bv, nv = b.get(metric), n.get(metric)
+            change = f"{(nv - bv) / bv * 100:+.1f}%" if bv and nv is not None else '-'
+            print(f"{e:<16}{metric:<8}{_fmt(bv):>10}{_fmt(nv):>10}{change:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Seed and load-test the pet adoption app.')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('seed', help='insert a synthetic dataset')
+    p.add_argument('--standin', help='SQLite stand-in file instead of MySQL')
+    p.add_argument('--owners', type=int, default=1000)
+    p.add_argument('--users', type=int, default=10000)
+    p.add_argument('--pets', type=int, default=100000)
+    p.add_argument('--requests', type=int, default=1000000)
+    p.add_argument('--history', type=int, default=20000)
+    p.add_argument('--seed', type=int, default=42)
+    p.set_defaults(func=seed)
+
+    p = sub.add_parser('run', help='drive the routes with concurrent simulated users')
+    p.add_argument('--standin', help='SQLite stand-in file instead of MySQL')
+    p.add_argument('--users', type=int, default=16, help='concurrent simulated users')
+    p.add_argument('--duration', type=float, default=30, help='measured seconds')
+    p.add_argument('--warmup', type=float, default=5, help='unmeasured seconds before measuring')
+    p.add_argument('--mix', nargs='*', metavar='ENDPOINT=WEIGHT', help='override request mix weights')
+    p.add_argument('--pay', type=float, default=0.0,
+                   help='fraction of user_payment hits that POST (completes the adoption)')
+    p.add_argument('--seed', type=int, default=42)
+    p.add_argument('--out', help='result file (default benchmarks/<commit>.json)')
+    p.set_defaults(func=run)
+
+    p = sub.add_parser('compare', help='diff two result files')
+    p.add_argument('base')
+    p.add_argument('new')
+    p.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+# cache.py
+# Version counters + an LRU cache keyed on them. Writes bump a counter
+# (e.g. "catalogue"); cached entries built under an older version are never
+# served again, so invalidation is a single increment.
+#
+# A counter can also keep a change log (bump_logged): which items each
+# version touched, so another process can catch up on just those items
+# instead of rebuilding everything derived from the counter.
+import os
+import secrets
+import sqlite3
+import threading
+from collections import OrderedDict
+
+# Versions of change log kept per counter; a reader further behind than this
+# sees a gap (changes() returns None)
+CHANGE_LOG_VERSIONS = 1000
+
+
+class LocalVersionStore:
+    """Per-process counters. Only correct with a single worker process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {}
+        self._log = {}                     # name -> OrderedDict(version -> items or None)
+        # Distinguishes counters from a previous run that started again at 0
+        self.epoch = secrets.token_hex(4)
+
+    def get(self, name):
+        return self._values.get(name, 0)
+
+    def bump(self, name):
+        with self._lock:
+            self._values[name] = self._values.get(name, 0) + 1
+            return self._values[name]
+
+    def bump_logged(self, name, items=None):
+        """Bump and record the items this version changed (None: unknown, all)."""
+        with self._lock:
+            value = self._values[name] = self._values.get(name, 0) + 1
+            log = self._log.setdefault(name, OrderedDict())
+            log[value] = list(items) if items else None
+            while len(log) > CHANGE_LOG_VERSIONS:
+                log.popitem(last=False)
+            return value
+
+    def changes(self, name, since, upto):
+        """Items changed by versions since < v <= upto, or None when the log
+        doesn't cover that range or a version changed everything."""
+        with self._lock:
+            log = self._log.get(name, {})
+            items = set()
+            for version in range(since + 1, upto + 1):
+                changed = log.get(version)
+                if changed is None:
+                    return None
+                items.update(changed)
+            return sorted(items)
+
+
+class SQLiteVersionStore:
+    """Counters in a local SQLite file, shared by every worker on the box."""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        # One row per (version, item); item NULL means the version changed everything
+        conn.execute("CREATE TABLE IF NOT EXISTS changes (name TEXT NOT NULL, version INTEGER NOT NULL, item INTEGER)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_changes_name_version ON changes (name, version)")
+        conn.execute("INSERT OR IGNORE INTO counters (name, value) VALUES ('epoch', ?)",
+                     (secrets.randbits(31),))
+        self.epoch = format(self.get('epoch'), 'x')
+
+    def _conn(self):
+        # One connection per thread and per process (never reuse across fork).
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, name):
+        row = self._conn().execute("SELECT value FROM counters WHERE name=?", (name,)).fetchone()
+        return row[0] if row else 0
+
+    def bump(self, name):
+        conn = self._conn()
+        conn.execute("INSERT INTO counters (name, value) VALUES (?, 1) "
+                     "ON CONFLICT(name) DO UPDATE SET value = value + 1", (name,))
+        return self.get(name)
+
+    def bump_logged(self, name, items=None):
+        """Bump and record the items this version changed (None: unknown, all)."""
+        conn = self._conn()
+        # One transaction: a reader never sees the new value without its log
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("INSERT INTO counters (name, value) VALUES (?, 1) "
+                         "ON CONFLICT(name) DO UPDATE SET value = value + 1", (name,))
+            value = self.get(name)
+            rows = [(name, value, item) for item in items] if items else [(name, value, None)]
+            conn.executemany("INSERT INTO changes (name, version, item) VALUES (?, ?, ?)", rows)
+            if value % 100 == 0:
+                conn.execute("DELETE FROM changes WHERE name=? AND version <= ?",
+                             (name, value - CHANGE_LOG_VERSIONS))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return value
+
+    def changes(self, name, since, upto):
+        """Items changed by versions since < v <= upto, or None when the log
+        doesn't cover that range or a version changed everything."""
+        rows = self._conn().execute("SELECT version, item FROM changes WHERE name=? AND version > ? AND version <= ?",
+                                    (name, since, upto)).fetchall()
+        if len({version for version, _ in rows}) != upto - since or any(item is None for _, item in rows):
+            return None
+        return sorted({item for _, item in rows})
+
+
+def make_version_store(backend, path=None):
+    if backend == 'local':
+        return LocalVersionStore()
+    if backend == 'sqlite':
+        return SQLiteVersionStore(path)
+    raise ValueError(f"unknown cache backend: {backend}")
+
+
+class VersionedLRUCache:
+    """LRU cache whose entries are tagged with the version they were built at."""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, version, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, version, key, value):
+        with self._lock:
+            self._entries[key] = (version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,470 @@
+# db_pool.py
+# Bounded MySQL connection pool used in place of flask_mysqldb.MySQL.
+# Routes keep calling `mysql.connection.cursor()`; the connection is borrowed
+# from the pool on first use in an app context and handed back on teardown.
+#
+# Read replicas (MYSQL_REPLICAS) are optional: read-only statements then go
+# to a replica and writes to the primary. To try it locally, run a second
+# mysqld replicating from the first (e.g. ports 3306 and 3307) and set
+# MYSQL_REPLICAS=127.0.0.1:3307.
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+
+import MySQLdb
+import MySQLdb.cursors
+from flask import g, has_request_context, request
+
+log = logging.getLogger(__name__)
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be borrowed within the wait timeout."""
+
+
+class _PooledConnection:
+    __slots__ = ('raw', 'created_at', 'last_used')
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+
+class ConnectionPool:
+    def __init__(self, connect_kwargs, max_size=10, min_size=2, recycle=3600,
+                 timeout=5.0, ping_interval=30, connect=MySQLdb.connect):
+        self.connect_kwargs = connect_kwargs
+        self.connect = connect
+        self.max_size = max_size
+        self.min_size = min(min_size, max_size)
+        self.recycle = recycle
+        self.timeout = timeout
+        self.ping_interval = ping_interval
+
+        self._cond = threading.Condition(threading.Lock())
+        self._reset_state()
+
+    def _reset_state(self):
+        # Called at construction and again in a forked child: sockets inherited
+        # from the parent must never be used (or closed) by the child.
+        self._pid = os.getpid()
+        self._idle = deque()
+        self._in_use = 0
+        self._created = 0
+        self._recycled = 0
+        self._wait_count = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._timeouts = 0
+
+    def _check_pid(self):
+        if self._pid != os.getpid():
+            with self._cond:
+                if self._pid != os.getpid():
+                    self._reset_state()
+
+    def _open(self):
+        conn = _PooledConnection(self.connect(**self.connect_kwargs))
+        self._created += 1
+        return conn
+
+    def _close(self, conn):
+        try:
+            conn.raw.close()
+        except Exception:
+            pass
+
+    def _is_stale(self, conn):
+        return self.recycle and time.monotonic() - conn.created_at > self.recycle
+
+    def _healthy(self, conn):
+        if time.monotonic() - conn.last_used < self.ping_interval:
+            return True
+        try:
+            conn.raw.ping()
+            return True
+        except Exception:
+            return False
+
+    def prewarm(self, count=None):
+        """Open connections up front so the first requests skip the handshake."""
+        self._check_pid()
+        count = self.min_size if count is None else min(count, self.max_size)
+        opened = []
+        with self._cond:
+            while self.size() + len(opened) < count:
+                opened.append(self._open())
+            self._idle.extend(opened)
+            self._cond.notify_all()
+        return len(opened)
+
+    def size(self):
+        return len(self._idle) + self._in_use
+
+    def acquire(self, timeout=None):
+        """Borrow a connection, waiting up to `timeout` (default: pool timeout)."""
+        self._check_pid()
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+        conn = None
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn = self._idle.pop()
+                    self._in_use += 1
+                    break
+                if self.size() < self.max_size:
+                    # Reserve the slot, then connect outside the lock.
+                    self._in_use += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout('no MySQL connection available after %.1fs' % timeout)
+                self._cond.wait(remaining)
+
+            waited = time.monotonic() - start
+            self._wait_count += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+
+        try:
+            if conn is not None and (self._is_stale(conn) or not self._healthy(conn)):
+                self._close(conn)
+                self._recycled += 1
+                conn = None
+            if conn is None:
+                conn = self._open()
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        return conn
+
+    def release(self, conn, discard=False):
+        if self._pid != os.getpid():
+            return
+        if not discard:
+            try:
+                # Never hand an open transaction to the next borrower.
+                conn.raw.rollback()
+            except Exception:
+                discard = True
+        if not discard and self._is_stale(conn):
+            self._recycled += 1
+            discard = True
+        if discard:
+            self._close(conn)
+        else:
+            conn.last_used = time.monotonic()
+        with self._cond:
+            self._in_use -= 1
+            if not discard:
+                self._idle.append(conn)
+            self._cond.notify()
+
+    def close_all(self):
+        with self._cond:
+            while self._idle:
+                self._close(self._idle.pop())
+
+    def stats(self):
+        with self._cond:
+            return {
+                'size': self.size(),
+                'idle': len(self._idle),
+                'in_use': self._in_use,
+                'max_size': self.max_size,
+                'created': self._created,
+                'recycled': self._recycled,
+                'timeouts': self._timeouts,
+                'acquired': self._wait_count,
+                'wait_seconds_total': self._wait_total,
+                'wait_seconds_max': self._wait_max,
+            }
+
+
+_READ_VERBS = ('SELECT', 'SHOW', 'EXPLAIN', 'DESCRIBE')
+_LOCKING_READ = re.compile(r'\bFOR\s+UPDATE\b|\bLOCK\s+IN\s+SHARE\s+MODE\b|\bFOR\s+SHARE\b', re.I)
+
+
+def is_read_only(sql):
+    """True for statements a replica can answer: plain, non-locking reads."""
+    words = sql.lstrip().lstrip('(').split(None, 1)
+    return bool(words) and words[0].upper() in _READ_VERBS and not _LOCKING_READ.search(sql)
+
+
+class RoutingConnection:
+    """Connection facade that sends read-only statements to a replica and
+    everything else to the primary.
+
+    Both connections are borrowed on first use. After the first write or
+    locking read the rest of the request stays on the primary, so it reads
+    its own writes and keeps its locks meaningful.
+    """
+
+    def __init__(self, primary, replica):
+        self._primary = primary      # () -> connection
+        self._replica = replica      # () -> connection, or None: use the primary
+        self._conns = {}
+        self.wrote = False
+
+    def _get(self, which):
+        conn = self._conns.get(which)
+        if conn is None:
+            conn = self._replica() if which == 'replica' else None
+            if conn is None:
+                which, conn = 'primary', self._conns.get('primary') or self._primary()
+            self._conns[which] = conn
+        return which, conn
+
+    def _route(self, sql):
+        if self.wrote or not is_read_only(sql):
+            self.wrote = True
+            return self._get('primary')
+        return self._get('replica')
+
+    def cursor(self, *args, **kwargs):
+        return RoutingCursor(self, args, kwargs)
+
+    def commit(self):
+        if 'primary' in self._conns:
+            self._conns['primary'].commit()
+
+    def rollback(self):
+        for conn in self._conns.values():
+            conn.rollback()
+
+    def __getattr__(self, name):
+        return getattr(self._get('primary')[1], name)
+
+
+class RoutingCursor:
+    """Cursor whose statements each run on the connection RoutingConnection
+    picks; fetches and attributes come from the last one used."""
+
+    def __init__(self, conn, args, kwargs):
+        self._conn = conn
+        self._args = args
+        self._kwargs = kwargs
+        self._cursors = {}
+        self._active = None
+
+    def _for(self, sql):
+        which, conn = self._conn._route(sql)
+        cur = self._cursors.get(which)
+        if cur is None:
+            cur = self._cursors[which] = conn.cursor(*self._args, **self._kwargs)
+        self._active = cur
+        return cur
+
+    def execute(self, sql, args=None):
+        return self._for(sql).execute(sql, args)
+
+    def executemany(self, sql, args):
+        return self._for(sql).executemany(sql, args)
+
+    def __iter__(self):
+        return iter(self._active)
+
+    def close(self):
+        for cur in self._cursors.values():
+            cur.close()
+
+    def __getattr__(self, name):
+        if self._active is None:
+            self._for('SELECT')
+        return getattr(self._active, name)
+
+
+class PooledMySQL:
+    """Drop-in replacement for flask_mysqldb.MySQL backed by ConnectionPool.
+
+    With replicas configured, `connection` is a RoutingConnection: reads go
+    to one replica per request (when `replica_check` allows it) and writes
+    to the primary.
+    """
+
+    def __init__(self, app=None):
+        self.pool = None
+        self.replicas = []
+        # Optional callable(raw_conn) -> conn, e.g. to instrument queries
+        self.wrap = None
+        # Optional callable(raw replica conn) -> bool: may this request read
+        # from that replica? (read-your-writes, see app.py)
+        self.replica_check = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        cfg = app.config
+        cfg.setdefault('MYSQL_HOST', 'localhost')
+        cfg.setdefault('MYSQL_USER', None)
+        cfg.setdefault('MYSQL_PASSWORD', None)
+        cfg.setdefault('MYSQL_DB', None)
+        cfg.setdefault('MYSQL_PORT', 3306)
+        cfg.setdefault('MYSQL_CHARSET', 'utf8mb4')
+        cfg.setdefault('MYSQL_CONNECT_TIMEOUT', 10)
+        cfg.setdefault('MYSQL_CURSORCLASS', None)
+        cfg.setdefault('MYSQL_POOL_SIZE', 10)
+        cfg.setdefault('MYSQL_POOL_MIN', 2)
+        cfg.setdefault('MYSQL_POOL_RECYCLE', 3600)
+        cfg.setdefault('MYSQL_POOL_TIMEOUT', 5.0)
+        cfg.setdefault('MYSQL_POOL_PREWARM', True)
+        # Path of a SQLite file to use instead of the MySQL server (benchmarks)
+        cfg.setdefault('MYSQL_STANDIN', None)
+        # Read replicas: "host[:port],..." (same user, password and database);
+        # with MYSQL_STANDIN, SQLite file paths instead
+        cfg.setdefault('MYSQL_REPLICAS', '')
+
+        kwargs = {
+            'host': cfg['MYSQL_HOST'],
+            'port': int(cfg['MYSQL_PORT']),
+            'charset': cfg['MYSQL_CHARSET'],
+            'connect_timeout': int(cfg['MYSQL_CONNECT_TIMEOUT']),
+        }
+        if cfg['MYSQL_USER']:
+            kwargs['user'] = cfg['MYSQL_USER']
+        if cfg['MYSQL_PASSWORD']:
+            kwargs['passwd'] = cfg['MYSQL_PASSWORD']
+        if cfg['MYSQL_DB']:
+            kwargs['db'] = cfg['MYSQL_DB']
+        if cfg['MYSQL_CURSORCLASS']:
+            kwargs['cursorclass'] = getattr(MySQLdb.cursors, cfg['MYSQL_CURSORCLASS'])
+
+        connect = MySQLdb.connect
+        if cfg['MYSQL_STANDIN']:
+            import sqlite_standin
+            connect = sqlite_standin.connect
+            kwargs['path'] = cfg['MYSQL_STANDIN']
+
+        def make_pool(connect_kwargs):
+            return ConnectionPool(
+                connect_kwargs,
+                max_size=int(cfg['MYSQL_POOL_SIZE']),
+                min_size=int(cfg['MYSQL_POOL_MIN']),
+                recycle=int(cfg['MYSQL_POOL_RECYCLE']),
+                timeout=float(cfg['MYSQL_POOL_TIMEOUT']),
+                connect=connect,
+            )
+
+        self.pool = make_pool(kwargs)
+        for entry in filter(None, (e.strip() for e in cfg['MYSQL_REPLICAS'].split(','))):
+            if cfg['MYSQL_STANDIN']:
+                self.replicas.append(make_pool(dict(kwargs, path=entry)))
+            else:
+                host, _, port = entry.partition(':')
+                self.replicas.append(make_pool(dict(kwargs, host=host, port=int(port or 3306))))
+        app.extensions['mysql'] = self
+        app.teardown_appcontext(self.teardown)
+
+        if cfg['MYSQL_POOL_PREWARM']:
+            for pool in [self.pool] + self.replicas:
+                try:
+                    pool.prewarm()
+                except Exception as e:
+                    # The app can still start; connections are opened lazily.
+                    log.warning("MySQL pool prewarm failed: %s", e)
+
+    def _borrow(self, pool):
+        pooled = pool.acquire()
+        g.setdefault('_mysql_borrowed', []).append((pool, pooled))
+        return pooled.raw
+
+    @property
+    def primary(self):
+        """The request's primary connection, for reads that must be current."""
+        conn = g.get('_mysql_primary')
+        if conn is None:
+            raw = self._borrow(self.pool)
+            conn = g._mysql_primary = self.wrap(raw) if self.wrap else raw
+        return conn
+
+    def _replica(self):
+        """The request's replica connection, or None to read from the primary.
+
+        One replica per request, picked at random. Only GET/HEAD requests
+        use one: a POST reads what it is about to change from the primary,
+        and outside a request (startup, jobs) reads stay there too.
+        """
+        if '_mysql_replica' not in g:
+            g._mysql_replica = None
+            if self.replicas and has_request_context() and request.method in ('GET', 'HEAD'):
+                pool = random.choice(self.replicas)
+                try:
+                    raw = self._borrow(pool)
+                except Exception as e:
+                    log.warning("Replica unavailable, reading from the primary: %s", e)
+                    return None
+                if self.replica_check is None or self.replica_check(raw):
+                    g._mysql_replica = self.wrap(raw) if self.wrap else raw
+                    g._mysql_replica_pool = pool
+                else:
+                    # Not used this request: hand it straight back rather
+                    # than holding it until teardown.
+                    for entry in reversed(g._mysql_borrowed):
+                        if entry[1].raw is raw:
+                            g._mysql_borrowed.remove(entry)
+                            pool.release(entry[1])
+                            break
+        return g._mysql_replica
+
+    @property
+    def connection(self):
+        conn = g.get('_mysql_conn')
+        if conn is None:
+            if self.replicas:
+                conn = RoutingConnection(lambda: self.primary, self._replica)
+            else:
+                conn = self.primary
+            g._mysql_conn = conn
+        return conn
+
+    def read_pool(self):
+        """Pool for extra read-only connections (exports, QueryBatch): the
+        request's replica when it may use one, else the primary."""
+        if self.replicas and self._replica() is not None:
+            return g._mysql_replica_pool
+        return self.pool
+
+    @property
+    def wrote(self):
+        """Whether this request sent a write (or locking read) to the primary."""
+        conn = g.get('_mysql_conn')
+        return isinstance(conn, RoutingConnection) and conn.wrote
+
+    def write_position(self):
+        """The primary's executed GTID set, or None (stand-in, GTIDs off)."""
+        if self.pool.connect is not MySQLdb.connect:
+            return None
+        cur = self.primary.cursor(MySQLdb.cursors.Cursor)
+        try:
+            cur.execute("SELECT @@GLOBAL.gtid_executed")
+            row = cur.fetchone()
+        finally:
+            cur.close()
+        return row[0] if row and row[0] else None
+
+    @staticmethod
+    def wait_for_position(raw_conn, position, timeout):
+        """Wait up to `timeout` seconds for a replica to apply `position`."""
+        cur = raw_conn.cursor(MySQLdb.cursors.Cursor)
+        try:
+            cur.execute("SELECT WAIT_FOR_EXECUTED_GTID_SET(%s, %s)", (position, timeout))
+            row = cur.fetchone()
+        finally:
+            cur.close()
+        return bool(row) and row[0] == 0
+
+    def teardown(self, exception):
+        for key in ('_mysql_conn', '_mysql_primary', '_mysql_replica', '_mysql_replica_pool'):
+            g.pop(key, None)
+        for pool, pooled in g.pop('_mysql_borrowed', ()):
+            pool.release(pooled, discard=isinstance(exception, MySQLdb.OperationalError))
@@ -0,0 +1,230 @@
+# events.py
+# Small pub/sub for live pages (the owner's request inbox). Publishers append
+# an event to a broker; each web process runs one listener thread that reads
+# new events and fans them out to its subscribers' queues, so an open inbox
+# costs a queue entry per change instead of re-running the inbox query.
+#
+# Brokers: 'sqlite' is an append-only table in a local file shared by every
+# worker on the box (a stand-in for Redis pub/sub, same idea as the version
+# store in cache.py); 'local' only reaches subscribers in the same process.
+# Event ids increase monotonically, so a client that reconnects with the last
+# id it saw (SSE Last-Event-ID) is replayed what it missed.
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import defaultdict, deque, namedtuple
+
+Event = namedtuple('Event', 'id channel type data')
+
+
+class LocalBroker:
+    """Recent events in memory. Only correct with a single worker process."""
+
+    def __init__(self, keep=1000):
+        self._cond = threading.Condition()
+        self._events = deque(maxlen=keep)
+        self._last_id = 0
+
+    def append(self, channel, type_, data):
+        with self._cond:
+            self._last_id += 1
+            self._events.append(Event(self._last_id, channel, type_, data))
+            self._cond.notify_all()
+            return self._last_id
+
+    def last_id(self):
+        return self._last_id
+
+    def since(self, last_id, channel=None, limit=500):
+        with self._cond:
+            return [e for e in self._events
+                    if e.id > last_id and (channel is None or e.channel == channel)][:limit]
+
+    def wait(self, last_id, timeout):
+        with self._cond:
+            self._cond.wait_for(lambda: self._last_id > last_id, timeout)
+
+    def purge(self, max_age):
+        pass                     # bounded by `keep`
+
+
+class SQLiteBroker:
+    """Events in a local SQLite file, shared by every worker on the box."""
+
+    def __init__(self, path, poll_interval=0.5):
+        self.path = path
+        self.poll_interval = poll_interval
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        # AUTOINCREMENT: ids are never reused after a purge, so resume ids stay valid
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                channel TEXT NOT NULL,
+                type TEXT NOT NULL,
+                data TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_events_channel ON events (channel, id)")
+
+    def _conn(self):
+        # One connection per thread and per process (never reuse across fork).
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def append(self, channel, type_, data):
+        cur = self._conn().execute(
+            "INSERT INTO events (channel, type, data, created_at) VALUES (?, ?, ?, ?)",
+            (channel, type_, data, time.time()))
+        return cur.lastrowid
+
+    def last_id(self):
+        row = self._conn().execute("SELECT seq FROM sqlite_sequence WHERE name='events'").fetchone()
+        return row[0] if row else 0
+
+    def since(self, last_id, channel=None, limit=500):
+        if channel is None:
+            rows = self._conn().execute(
+                "SELECT id, channel, type, data FROM events WHERE id > ? ORDER BY id LIMIT ?",
+                (last_id, limit)).fetchall()
+        else:
+            rows = self._conn().execute(
+                "SELECT id, channel, type, data FROM events WHERE channel = ? AND id > ? ORDER BY id LIMIT ?",
+                (channel, last_id, limit)).fetchall()
+        return [Event(*row) for row in rows]
+
+    def wait(self, last_id, timeout):
+        # Other processes can't wake us; polling the primary key is cheap
+        time.sleep(min(timeout, self.poll_interval))
+
+    def purge(self, max_age):
+        self._conn().execute("DELETE FROM events WHERE created_at < ?", (time.time() - max_age,))
+
+
+def make_broker(backend, path=None):
+    if backend == 'local':
+        return LocalBroker()
+    if backend == 'sqlite':
+        return SQLiteBroker(path)
+    raise ValueError(f"unknown events backend: {backend}")
+
+
+class Subscription:
+    """A subscriber's queue. Once it overflows it stops taking events; the
+    stream should end so the client reconnects and is replayed from its
+    last id instead of silently missing changes."""
+
+    def __init__(self, hub, channel, max_queue):
+        self.hub = hub
+        self.channel = channel
+        self.last_id = 0
+        self.overflowed = False
+        self._queue = queue.Queue(max_queue)
+
+    def _put(self, event):
+        # Called with the hub lock held, in id order
+        if self.overflowed or event.id <= self.last_id:
+            return
+        try:
+            self._queue.put_nowait(event)
+            self.last_id = event.id
+        except queue.Full:
+            self.overflowed = True
+            self.hub.dropped += 1
+
+    def get(self, timeout):
+        """Next event, or None after `timeout` seconds without one."""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.hub._unsubscribe(self)
+
+
+class EventHub:
+    def __init__(self, broker, max_queue=100, retention=3600):
+        self.broker = broker
+        self.max_queue = max_queue
+        self.retention = retention
+        self._lock = threading.Lock()
+        self._subs = defaultdict(set)
+        self._cursor = 0
+        self._pid = None
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    @property
+    def subscribers(self):
+        return sum(len(s) for s in self._subs.values())
+
+    def publish(self, channel, type_, data):
+        """Append an event; `data` must be JSON-serialisable (str() otherwise)."""
+        event_id = self.broker.append(channel, type_, json.dumps(data, default=str))
+        self.published += 1
+        return event_id
+
+    def subscribe(self, channel, last_id=None):
+        """Subscribe to `channel`. With `last_id`, events after it that are
+        still in the broker are queued first."""
+        sub = Subscription(self, channel, self.max_queue)
+        with self._lock:
+            self._ensure_listener()
+            if last_id is None:
+                sub.last_id = self.broker.last_id()
+            else:
+                # Under the lock the listener can't fan out meanwhile; anything
+                # it delivers afterwards is newer or skipped by id
+                for event in self.broker.since(last_id, channel, limit=self.max_queue):
+                    sub._put(event)
+                sub.last_id = max(sub.last_id, min(last_id, self.broker.last_id()))
+            self._subs[channel].add(sub)
+        return sub
+
+    def _unsubscribe(self, sub):
+        with self._lock:
+            subs = self._subs.get(sub.channel)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._subs[sub.channel]
+
+    def _ensure_listener(self):
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._cursor = self.broker.last_id()
+        threading.Thread(target=self._listen, name='event-listener', daemon=True).start()
+
+    def _listen(self):
+        last_purge = time.monotonic()
+        while True:
+            try:
+                events = self.broker.since(self._cursor)
+                if not events:
+                    self.broker.wait(self._cursor, 15)
+                    if time.monotonic() - last_purge > 60:
+                        self.broker.purge(self.retention)
+                        last_purge = time.monotonic()
+                    continue
+                with self._lock:
+                    for event in events:
+                        self._cursor = event.id
+                        for sub in self._subs.get(event.channel, ()):
+                            sub._put(event)
+                            self.delivered += 1
+            except sqlite3.Error as e:
+                print("Event listener error:", e)
+                time.sleep(1)
@@ -0,0 +1,202 @@
+# facets.py
+# In-memory columnar snapshot of available pets for faceted browsing on the
+# home page. Each pet occupies a slot in parallel column lists; per-value
+# slot sets and facet counts are updated incrementally on every pet write,
+# so unfiltered counts cost nothing and filtered ones are a pass over the
+# candidate slots instead of a GROUP BY per facet per request.
+import threading
+import time
+from bisect import bisect_right
+from collections import Counter, defaultdict
+
+CATEGORICAL = ('Type', 'Breed', 'Gender')
+
+# Range facets: (low inclusive, high exclusive or None, label)
+RANGES = {
+    'Age': ((0, 1, 'Under 1 year'), (1, 3, '1-2 years'), (3, 7, '3-6 years'), (7, None, '7+ years')),
+    'Price': ((0, 100, 'Under $100'), (100, 500, '$100-499'), (500, 1000, '$500-999'), (1000, None, '$1000+')),
+}
+
+FACETS = CATEGORICAL + tuple(RANGES)
+
+
+def _key(value):
+    return str(value).strip().lower() if value not in (None, '') else None
+
+
+def bucket_of(field, value):
+    if value is None:
+        return None
+    value = float(value)
+    for i, (low, high, _) in enumerate(RANGES[field]):
+        if value >= low and (high is None or value < high):
+            return i
+    return None
+
+
+class FacetIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.built_at = None
+        self._reset()
+
+    def _reset(self):
+        self._slots = {}                                          # pet_id -> slot
+        self._free = []
+        self._ids = []                                            # slot -> pet_id (None when free)
+        self._order = []                                          # slot -> (-created_ts, -pet_id)
+        self._cols = {f: [] for f in FACETS}                      # slot -> key / bucket
+        self._postings = {f: defaultdict(set) for f in CATEGORICAL}
+        self._labels = {f: {} for f in CATEGORICAL}               # key -> display value
+        self._counts = {f: Counter() for f in FACETS}
+
+    def __len__(self):
+        return len(self._slots)
+
+    def upsert(self, row):
+        """Add or refresh a pet; pets that are not available are dropped.
+
+        `row` needs PetID, Status, CreatedAt and the facet columns.
+        """
+        pet_id = row['PetID']
+        with self._lock:
+            self._remove_locked(pet_id)
+            if (row.get('Status') or 'available').lower() != 'available':
+                return
+            if self._free:
+                slot = self._free.pop()
+            else:
+                slot = len(self._ids)
+                self._ids.append(None)
+                self._order.append(None)
+                for col in self._cols.values():
+                    col.append(None)
+            self._slots[pet_id] = slot
+            self._ids[slot] = pet_id
+            created = row.get('CreatedAt')
+            self._order[slot] = (-(created.timestamp() if created else 0.0), -pet_id)
+            for f in CATEGORICAL:
+                key = _key(row.get(f))
+                self._cols[f][slot] = key
+                if key is not None:
+                    self._postings[f][key].add(slot)
+                    self._labels[f].setdefault(key, str(row[f]).strip())
+                    self._counts[f][key] += 1
+            for f in RANGES:
+                bucket = bucket_of(f, row.get(f))
+                self._cols[f][slot] = bucket
+                if bucket is not None:
+                    self._counts[f][bucket] += 1
+
+    def remove(self, pet_id):
+        with self._lock:
+            self._remove_locked(pet_id)
+
+    def _remove_locked(self, pet_id):
+        slot = self._slots.pop(pet_id, None)
+        if slot is None:
+            return
+        for f in FACETS:
+            value = self._cols[f][slot]
+            if value is None:
+                continue
+            self._counts[f][value] -= 1
+            if not self._counts[f][value]:
+                del self._counts[f][value]
+            if f in self._postings:
+                posting = self._postings[f][value]
+                posting.discard(slot)
+                if not posting:
+                    del self._postings[f][value]
+                    self._labels[f].pop(value, None)
+            self._cols[f][slot] = None
+        self._ids[slot] = None
+        self._order[slot] = None
+        self._free.append(slot)
+
+    def rebuild(self, rows):
+        with self._lock:
+            self._reset()
+            for row in rows:
+                self.upsert(row)
+            self.built_at = time.time()
+
+    def query(self, filters):
+        """Match `filters` ({facet: key or bucket index}).
+
+        Returns (result, counts): `result` is a FacetResult over the matching
+        pets, newest first; `counts` maps each facet to [(value, label, n)]
+        where n counts pets matching every *other* active filter, i.e. what
+        the listing would show after picking that value.
+        """
+        filters = {f: v for f, v in filters.items() if f in FACETS and v is not None}
+        with self._lock:
+            if not filters:
+                live = list(self._slots.values())
+                counts = {f: dict(self._counts[f]) for f in FACETS}
+            else:
+                live, counts = self._scan(filters)
+            keys = sorted(self._order[s] for s in live)
+            labels = {f: dict(self._labels[f]) for f in CATEGORICAL}
+        return FacetResult(keys), self._present(counts, labels)
+
+    def _scan(self, filters):
+        cat = [(f, v) for f, v in filters.items() if f in self._postings]
+        postings = [self._postings[f].get(v, set()) for f, v in cat]
+        if len(postings) <= 1:
+            candidates = self._slots.values()
+        else:
+            # A slot that misses two or more categorical filters counts nowhere
+            candidates = set()
+            for i in range(len(postings)):
+                candidates |= set.intersection(*(p for j, p in enumerate(postings) if j != i))
+        counts = {f: Counter() for f in FACETS}
+        matched = []
+        active = list(filters.items())
+        for slot in candidates:
+            missed = None
+            for f, v in active:
+                if self._cols[f][slot] != v:
+                    if missed is not None:
+                        break
+                    missed = f
+            else:
+                for f in FACETS:
+                    if missed is None or f == missed:
+                        value = self._cols[f][slot]
+                        if value is not None:
+                            counts[f][value] += 1
+                if missed is None:
+                    matched.append(slot)
+        return matched, counts
+
+    @staticmethod
+    def _present(counts, labels):
+        out = {}
+        for f in CATEGORICAL:
+            out[f] = sorted(((k, labels[f].get(k, k), n) for k, n in counts[f].items()),
+                            key=lambda t: (-t[2], t[1]))
+        for f, buckets in RANGES.items():
+            out[f] = [(i, label, counts[f].get(i, 0)) for i, (_, _, label) in enumerate(buckets)]
+        return out
+
+
+class FacetResult:
+    """Matching pets in listing order, pageable with the keyset cursors."""
+
+    def __init__(self, keys):
+        self._keys = keys            # ascending (-created_ts, -pet_id) == newest first
+
+    def __len__(self):
+        return len(self._keys)
+
+    def page(self, cursor, page_size):
+        """Return (pet_ids, has_more) for the page after `cursor`."""
+        start = 0
+        if cursor is not None:
+            created_at, row_id = cursor
+            start = bisect_right(self._keys, (-created_at.timestamp(), -row_id))
+        chunk = self._keys[start:start + page_size + 1]
+        ids = [-k[1] for k in chunk[:page_size]]
+        has_more = len(chunk) > page_size
+        return ids, has_more
@@ -0,0 +1,89 @@
+# hashing.py
+# Password hashing off the request threads. scrypt is deliberately slow and
+# CPU-bound, so it runs in a small process pool; a semaphore caps how many
+# hashes may be queued and anything beyond that is rejected straight away.
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+DEFAULT_METHOD = 'scrypt:32768:8:1'
+
+
+class HashPoolBusy(Exception):
+    """Raised when the hashing queue is full; callers should answer 503."""
+
+
+def method_of(pwhash):
+    """'scrypt:32768:8:1$salt$hash' -> 'scrypt:32768:8:1'"""
+    return (pwhash or '').split('$', 1)[0]
+
+
+def _verify(pwhash, password, method):
+    if not check_password_hash(pwhash, password):
+        return False, None
+    if method_of(pwhash) != method:
+        # Cost parameters changed since this hash was made: upgrade it now
+        # while we have the plaintext.
+        return True, generate_password_hash(password, method=method)
+    return True, None
+
+
+class PasswordHasher:
+    def __init__(self, workers=2, max_queue=16, method=DEFAULT_METHOD, timeout=10.0):
+        self.workers = workers
+        self.method = method
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self.rejected = 0
+
+    def _pool(self):
+        # Created lazily and per process, so forked workers get their own.
+        # Hash processes come from a forkserver rather than forking this
+        # (threaded, connection-holding) process. Like spawn, that re-imports
+        # the __main__ module in each child, so entry points keep their work
+        # under `if __name__ == '__main__'` (serve.py does).
+        if self._executor is None or self._pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._pid != os.getpid():
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers, mp_context=multiprocessing.get_context('forkserver'))
+                    self._pid = os.getpid()
+        return self._executor
+
+    def _run(self, fn, *args):
+        if self.workers <= 0:
+            return fn(*args)
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise HashPoolBusy()
+        try:
+            future = self._pool().submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        # The slot is held until the job itself finishes, not just until we
+        # stop waiting for it, so timed-out hashes still count against the cap.
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            future.cancel()
+            self.rejected += 1
+            raise HashPoolBusy()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        """Return (matches, new_hash). new_hash is set when a rehash is due."""
+        return self._run(_verify, pwhash, password, self.method)
+
+    def shutdown(self):
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=False, cancel_futures=True)
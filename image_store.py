@@ -0,0 +1,193 @@
+# image_store.py
+# Content-addressed storage for pet photos. Uploads are named after the
+# SHA-256 of their bytes, so identical files are stored once and a URL never
+# changes meaning (safe to cache forever). A thumbnail and WebP/JPEG width
+# variants are generated for srcset (app.py does it in a background job);
+# listing cards then load a few KB instead of the multi-MB original.
+#
+# Variants need Pillow. Without it uploads still work and the templates fall
+# back to the original file.
+#
+# Because files are shared, deletion goes through release(): under a
+# per-digest file lock (held by save() too, across processes) it skips files
+# saved again within RELEASE_GRACE_SECONDS, whose new row may not be
+# committed yet, and files a row still references.
+import fcntl
+import hashlib
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional
+    Image = None
+
+VARIANT_WIDTHS = (320, 640)
+THUMB_SIZE = (400, 300)
+# Longer than any upload takes to commit its row
+RELEASE_GRACE_SECONDS = 3600
+
+
+class ImageStore:
+    def __init__(self, folder, url_prefix):
+        self.folder = folder
+        self.url_prefix = url_prefix.rstrip('/')
+        self._variants = {}
+        self._lock = threading.Lock()
+
+    # ----- naming -----
+    def _digest_of(self, url):
+        """'<prefix>/<sha>.<ext>' -> (sha, ext), or None for legacy names."""
+        if not url or not url.startswith(self.url_prefix + '/'):
+            return None
+        name = url[len(self.url_prefix) + 1:]
+        digest, _, ext = name.partition('.')
+        if len(digest) != 64 or not ext or any(c not in '0123456789abcdef' for c in digest):
+            return None
+        return digest, ext
+
+    def _path(self, name):
+        return os.path.join(self.folder, name)
+
+    @contextmanager
+    def _digest_lock(self, digest):
+        # Sharded by prefix: 256 lock files at most, shared by every process
+        lock_dir = os.path.join(self.folder, '.locks')
+        os.makedirs(lock_dir, exist_ok=True)
+        with open(os.path.join(lock_dir, digest[:2]), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _variant_names(self, digest):
+        names = [f"{digest}_thumb.jpg"]
+        for width in VARIANT_WIDTHS:
+            names += [f"{digest}_{width}w.webp", f"{digest}_{width}w.jpg"]
+        return names
+
+    # ----- write -----
+    def save(self, file_storage, ext, variants=True):
+        """Store an upload; return its URL. Identical content is written once.
+
+        With variants=False the caller is responsible for calling
+        make_variants() later (e.g. from a job).
+        """
+        data = file_storage.read()
+        digest = hashlib.sha256(data).hexdigest()
+        ext = ext.lower().replace('jpeg', 'jpg')
+        name = f"{digest}.{ext}"
+        path = self._path(name)
+        with self._digest_lock(digest):
+            if os.path.exists(path):
+                # Reused: the fresh mtime keeps release() off it until our row commits
+                os.utime(path)
+            else:
+                tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp, path)
+        if variants:
+            self.make_variants(name)
+        return f"{self.url_prefix}/{name}"
+
+    def make_variants(self, name):
+        """Generate the thumbnail and width variants for a stored original.
+
+        Returns False without Pillow. Failures (unreadable original, disk
+        full, ...) raise, so the job running this is retried.
+        """
+        if Image is None:
+            return False
+        digest = name.partition('.')[0]
+        if all(os.path.exists(self._path(n)) for n in self._variant_names(digest)):
+            return True
+        with Image.open(self._path(name)) as original:
+            img = ImageOps.exif_transpose(original)
+            if img.mode not in ('RGB', 'L'):
+                img = img.convert('RGB')
+            thumb = ImageOps.fit(img, THUMB_SIZE, Image.LANCZOS)
+            self._write(thumb, f"{digest}_thumb.jpg", 'JPEG', quality=80, optimize=True, progressive=True)
+            for width in VARIANT_WIDTHS:
+                # Never upscale: small originals are just re-encoded
+                w = min(width, img.width)
+                resized = img.resize((w, max(1, round(img.height * w / img.width))), Image.LANCZOS)
+                self._write(resized, f"{digest}_{width}w.webp", 'WEBP', quality=78, method=4)
+                self._write(resized, f"{digest}_{width}w.jpg", 'JPEG', quality=80, optimize=True, progressive=True)
+        with self._lock:
+            self._variants.pop(digest, None)
+        return True
+
+    def _write(self, img, name, fmt, **options):
+        path = self._path(name)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        img.save(tmp, fmt, **options)
+        os.replace(tmp, path)
+
+    def release(self, url, in_use, grace=RELEASE_GRACE_SECONDS):
+        """Delete a stored image unless `in_use(url)` is true or it was saved
+        within `grace` seconds. Returns False when it should be retried later."""
+        parsed = self._digest_of(url)
+        if not parsed:
+            if not in_use(url):
+                self.delete(url)
+            return True
+        digest, ext = parsed
+        with self._digest_lock(digest):
+            try:
+                age = time.time() - os.path.getmtime(self._path(f"{digest}.{ext}"))
+            except FileNotFoundError:
+                age = None
+            if age is not None and age < grace:
+                return False
+            if not in_use(url):
+                self.delete(url)
+        return True
+
+    def delete(self, url):
+        """Remove a stored image and its variants (callers check it is unused;
+        shared uploads go through release())."""
+        parsed = self._digest_of(url)
+        names = []
+        if parsed:
+            digest, ext = parsed
+            names = [f"{digest}.{ext}"] + self._variant_names(digest)
+            with self._lock:
+                self._variants.pop(digest, None)
+        elif url and url.startswith(self.url_prefix + '/'):
+            # Legacy (pre content-addressing) upload
+            names = [os.path.basename(url)]
+        for name in names:
+            try:
+                os.remove(self._path(name))
+            except FileNotFoundError:
+                pass
+
+    # ----- read -----
+    def variants(self, url):
+        """Responsive sources for a stored image, or None when there are none.
+
+        Returns {'thumb': url, 'webp': srcset, 'jpeg': srcset}.
+        """
+        parsed = self._digest_of(url)
+        if not parsed:
+            return None
+        digest = parsed[0]
+        with self._lock:
+            if digest in self._variants:
+                return self._variants[digest]
+        found = None
+        if all(os.path.exists(self._path(n)) for n in self._variant_names(digest)):
+            prefix = self.url_prefix
+            found = {
+                'thumb': f"{prefix}/{digest}_thumb.jpg",
+                'webp': ', '.join(f"{prefix}/{digest}_{w}w.webp {w}w" for w in VARIANT_WIDTHS),
+                'jpeg': ', '.join(f"{prefix}/{digest}_{w}w.jpg {w}w" for w in VARIANT_WIDTHS),
+            }
+            # Only positive results are cached; missing variants may appear later
+            with self._lock:
+                self._variants[digest] = found
+        return found
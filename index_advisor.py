@@ -0,0 +1,247 @@
+# index_advisor.py
+# Pulls every SQL statement out of app.py, runs EXPLAIN for each against the
+# configured database and flags full table scans, filesorts and temporary
+# tables. With --write-migration it also writes the suggested indexes as the
+# next file in migrations/.
+#
+#   python index_advisor.py [--source app.py] [--min-rows 1000] [--write-migration]
+import argparse
+import ast
+import os
+import re
+from collections import OrderedDict
+
+import MySQLdb.cursors
+
+from migrate import MIGRATIONS_DIR, connect, load_migrations
+
+# Values substituted for f-string fields when rebuilding a statement.
+FSTRING_DEFAULTS = {
+    'after': '1=1',
+    'placeholders': '%s',
+    'table': 'Users',
+    'id_col': 'UserID',
+}
+
+_SQL_START_RE = re.compile(r'^\s*(SELECT|UPDATE|DELETE|INSERT)\b', re.I)
+_TABLE_RE = re.compile(r'\b(?:FROM|JOIN|UPDATE)\s+(\w+)(?:\s+(?:AS\s+)?(?!ON\b|WHERE\b|JOIN\b|LEFT\b|SET\b)(\w+))?', re.I)
+_EQ_RE = re.compile(r'\b(?:(\w+)\.)?(\w+)\s*(?:=\s*(?:%s|\'[^\']*\')|IN\s*\()', re.I)
+_ORDER_RE = re.compile(r'\bORDER BY\s+(.+?)(?:\bLIMIT\b|$)', re.I | re.S)
+_SQL_KEYWORDS = {'and', 'or', 'where', 'on', 'not', 'set'}
+# Placeholders MySQL needs as numbers: LIMIT/OFFSET (a quoted '1' is a syntax
+# error there) and comparisons with id/numeric columns
+_LIMIT_RE = re.compile(r'\b(LIMIT|OFFSET)\s+%s(\s*,\s*%s)?', re.I)
+_NUMERIC_CMP_RE = re.compile(r'\b((?:\w+\.)?(?:\w*ID|Age|Price|Amount))\s*(=|<>|!=|<=|>=|<|>)\s*%s')
+_NUMERIC_IN_RE = re.compile(r'\b((?:\w+\.)?\w*ID)\s+IN\s*\(((?:\s*%s\s*,?)+)\)', re.I)
+
+
+def _literal_sql(node, constants=None):
+    """Return the SQL text of a str / f-string AST node, or None."""
+    constants = constants or {}
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    if isinstance(node, ast.JoinedStr):
+        parts = []
+        for value in node.values:
+            if isinstance(value, ast.Constant):
+                parts.append(value.value)
+            elif isinstance(value, ast.FormattedValue) and isinstance(value.value, ast.Name) \
+                    and value.value.id in FSTRING_DEFAULTS:
+                parts.append(FSTRING_DEFAULTS[value.value.id])
+            elif isinstance(value, ast.FormattedValue) and isinstance(value.value, ast.Name) \
+                    and value.value.id in constants:
+                parts.append(constants[value.value.id])
+            else:
+                return None
+        return ''.join(parts)
+    return None
+
+
+def _module_constants(tree):
+    """Module-level NAME = 'string' assignments (column lists and the like)."""
+    constants = {}
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name) \
+                and isinstance(node.value, ast.Constant) and isinstance(node.value.value, str):
+            constants[node.targets[0].id] = node.value.value
+    return constants
+
+
+def extract_statements(path):
+    """Return (OrderedDict {normalized sql: [(function, line)]}, [(function, line)]
+    of calls whose SQL is built at run time and can't be recovered)."""
+    with open(path) as f:
+        tree = ast.parse(f.read(), path)
+    constants = _module_constants(tree)
+    found = OrderedDict()
+    skipped = []
+    for func in ast.walk(tree):
+        if not isinstance(func, (ast.FunctionDef, ast.Module)):
+            continue
+        name = getattr(func, 'name', '<module>')
+        for node in ast.walk(func):
+            if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+                    and node.func.attr in ('execute', 'executemany', 'add')):
+                continue
+            for arg in node.args[:2]:
+                sql = _literal_sql(arg, constants)
+                if sql and _SQL_START_RE.match(sql):
+                    key = ' '.join(sql.split())
+                    found.setdefault(key, [])
+                    if (name, node.lineno) not in found[key]:
+                        found[key].append((name, node.lineno))
+                    break
+            else:
+                # An f-string we can't fill in, or SQL passed in a variable
+                first = node.args[0] if node.args else None
+                sql_arg = node.args[1] if node.func.attr == 'add' and len(node.args) > 1 else first
+                if isinstance(sql_arg, ast.JoinedStr) and _literal_sql(sql_arg, constants) is None \
+                        and (name, node.lineno) not in skipped:
+                    skipped.append((name, node.lineno))
+    # Anything attributed to <module> that a function also claims is a duplicate.
+    for key, sites in found.items():
+        named = [s for s in sites if s[0] != '<module>']
+        found[key] = named or sites
+    named = {line for _, line in skipped if _ != '<module>'}
+    skipped = [(fn, line) for fn, line in skipped if fn != '<module>' or line not in named]
+    return found, skipped
+
+
+def explainable(sql):
+    """EXPLAIN-able form of a statement: placeholders become literals."""
+    sql = _LIMIT_RE.sub(lambda m: m.group(1) + ' 1' + (', 1' if m.group(2) else ''), sql)
+    sql = _NUMERIC_CMP_RE.sub(r'\1 \2 1', sql)
+    sql = _NUMERIC_IN_RE.sub(lambda m: m.group(1) + ' IN (' + ', '.join('1' for _ in m.group(2).split(',')) + ')', sql)
+    return sql.replace('%s', "'1'")
+
+
+def suggest_index(sql, alias):
+    """Equality columns first, then ORDER BY columns, for the given table alias."""
+    aliases = {}
+    for table, al in _TABLE_RE.findall(sql):
+        aliases[al or table] = table
+        aliases.setdefault(table, table)
+    table = aliases.get(alias, alias)
+    single_table = len(set(aliases.values())) == 1
+
+    cols = []
+    for qual, col in _EQ_RE.findall(sql):
+        if col.lower() in _SQL_KEYWORDS:
+            continue
+        if (qual and aliases.get(qual) == table) or (not qual and single_table):
+            if col not in cols:
+                cols.append(col)
+    m = _ORDER_RE.search(sql)
+    if m:
+        for part in m.group(1).split(','):
+            term = part.strip().split()[0] if part.strip() else ''
+            qual, _, col = term.rpartition('.')
+            if col and ((qual and aliases.get(qual) == table) or (not qual and single_table)) and col not in cols:
+                cols.append(col)
+    return table, cols
+
+
+def analyse(conn, statements, min_rows=1000):
+    """EXPLAIN each statement; return a list of findings."""
+    findings = []
+    cur = conn.cursor(MySQLdb.cursors.DictCursor)
+    for sql, sites in statements.items():
+        if sql.upper().startswith('INSERT'):
+            continue
+        try:
+            cur.execute('EXPLAIN ' + explainable(sql))
+            plan = cur.fetchall()
+        except MySQLdb.Error as e:
+            findings.append({'sql': sql, 'sites': sites, 'error': str(e)})
+            continue
+        for row in plan:
+            problems = []
+            extra = row.get('Extra') or ''
+            if row.get('type') == 'ALL' and (row.get('rows') or 0) >= min_rows:
+                problems.append('full scan')
+            if 'Using filesort' in extra:
+                problems.append('filesort')
+            if 'Using temporary' in extra:
+                problems.append('temporary')
+            if problems:
+                table, cols = suggest_index(sql, row.get('table'))
+                findings.append({'sql': sql, 'sites': sites, 'table': table, 'rows': row.get('rows'),
+                                 'problems': problems, 'suggested': cols})
+    cur.close()
+    return findings
+
+
+def existing_index_columns(conn, table):
+    cur = conn.cursor(MySQLdb.cursors.DictCursor)
+    cur.execute(f"SHOW INDEX FROM `{table}`")
+    indexes = OrderedDict()
+    for row in cur.fetchall():
+        indexes.setdefault(row['Key_name'], []).append(row['Column_name'])
+    cur.close()
+    return list(indexes.values())
+
+
+def migration_sql(conn, findings):
+    """CREATE INDEX statements for suggestions not already covered by an index prefix."""
+    statements = []
+    seen = set()
+    for f in findings:
+        cols = f.get('suggested')
+        if not cols or (f['table'], tuple(cols)) in seen:
+            continue
+        seen.add((f['table'], tuple(cols)))
+        if any(idx[:len(cols)] == cols for idx in existing_index_columns(conn, f['table'])):
+            continue
+        name = f"idx_{f['table'].lower()}_{'_'.join(c.lower() for c in cols)}"[:64]
+        statements.append(f"-- {', '.join(f['problems'])}: {f['sites'][0][0]}()\n"
+                          f"CREATE INDEX {name} ON {f['table']} ({', '.join(cols)});")
+    return statements
+
+
+def main():
+    parser = argparse.ArgumentParser(description='EXPLAIN the SQL in app.py and suggest indexes.')
+    parser.add_argument('--source', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py'))
+    parser.add_argument('--min-rows', type=int, default=1000,
+                        help='only flag full scans estimated at this many rows or more')
+    parser.add_argument('--write-migration', action='store_true',
+                        help='write the suggested indexes as the next migration file')
+    args = parser.parse_args()
+
+    statements, skipped = extract_statements(args.source)
+    conn = connect()
+    try:
+        findings = analyse(conn, statements, args.min_rows)
+        for f in findings:
+            where = ', '.join(f"{fn}:{line}" for fn, line in f['sites'])
+            if 'error' in f:
+                print(f"[error] {where}\n    {f['error']}\n    {f['sql'][:160]}")
+                continue
+            print(f"[{'/'.join(f['problems'])}] {f['table']} (~{f['rows']} rows) in {where}")
+            print(f"    {f['sql'][:160]}")
+            if f['suggested']:
+                print(f"    suggest: ({', '.join(f['suggested'])})")
+        errors = [f for f in findings if 'error' in f]
+        print(f"{len(statements)} statements checked, {len(findings) - len(errors)} finding(s)")
+        if errors:
+            print(f"{len(errors)} statement(s) could not be EXPLAINed (see [error] above)")
+        if skipped:
+            print(f"{len(skipped)} statement(s) built at run time were not checked: "
+                  + ', '.join(f"{fn}:{line}" for fn, line in skipped))
+
+        if args.write_migration:
+            sql = migration_sql(conn, findings)
+            if not sql:
+                print("No new indexes to write")
+                return
+            last = max([int(v) for v, _, _ in load_migrations()] or [0])
+            path = os.path.join(MIGRATIONS_DIR, f"{last + 1:04d}_advisor_indexes.sql")
+            with open(path, 'w') as out:
+                out.write("-- Generated by index_advisor.py; review before applying.\n\n")
+                out.write('\n\n'.join(sql) + '\n')
+            print(f"Wrote {path}")
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
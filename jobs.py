@@ -0,0 +1,194 @@
+# jobs.py
+# Durable local job queue backed by SQLite. Request handlers enqueue slow side
+# effects (file deletes, image processing, ...) and return immediately;
+# worker threads/processes claim jobs, run them, and retry failures with
+# exponential backoff. No external services needed.
+import json
+import os
+import random
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+
+
+class JobQueue:
+    def __init__(self, path, max_attempts=5, backoff_base=2.0, backoff_max=300.0, visibility_timeout=300.0):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        # A job 'running' for longer than this is assumed orphaned by a dead worker
+        self.visibility_timeout = visibility_timeout
+        self._handlers = {}
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'queued',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                run_at REAL NOT NULL,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                locked_by TEXT,
+                last_error TEXT
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_run_at ON jobs (status, run_at)")
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    # ----- producers -----
+    def task(self, name):
+        """Decorator registering the handler for jobs called `name`."""
+        def decorator(fn):
+            self._handlers[name] = fn
+            return fn
+        return decorator
+
+    def enqueue(self, name, delay=0, **payload):
+        now = time.time()
+        cur = self._conn().execute(
+            "INSERT INTO jobs (name, payload, run_at, created_at) VALUES (?, ?, ?, ?)",
+            (name, json.dumps(payload), now + delay, now))
+        return cur.lastrowid
+
+    def enqueue_unique(self, name, delay=0, **payload):
+        """Enqueue unless the same job is already queued (periodic jobs that
+        every worker process schedules at startup). Returns the new id or None."""
+        conn = self._conn()
+        now = time.time()
+        payload = json.dumps(payload)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("SELECT 1 FROM jobs WHERE name=? AND payload=? AND status='queued' LIMIT 1",
+                            (name, payload)).fetchone():
+                conn.execute("COMMIT")
+                return None
+            cur = conn.execute(
+                "INSERT INTO jobs (name, payload, run_at, created_at) VALUES (?, ?, ?, ?)",
+                (name, payload, now + delay, now))
+            conn.execute("COMMIT")
+            return cur.lastrowid
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    # ----- consumers -----
+    def claim(self, worker_id):
+        """Atomically take the next due job; return (id, name, payload, attempts) or None."""
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Requeue jobs whose worker died mid-run
+            conn.execute("UPDATE jobs SET status='queued', locked_by=NULL "
+                         "WHERE status='running' AND started_at < ?", (now - self.visibility_timeout,))
+            row = conn.execute("SELECT id, name, payload, attempts FROM jobs "
+                               "WHERE status='queued' AND run_at <= ? ORDER BY run_at, id LIMIT 1",
+                               (now,)).fetchone()
+            if row:
+                conn.execute("UPDATE jobs SET status='running', started_at=?, locked_by=? WHERE id=?",
+                             (now, worker_id, row[0]))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if not row:
+            return None
+        return row[0], row[1], json.loads(row[2]), row[3]
+
+    def _finish(self, job_id, attempts, error=None):
+        conn = self._conn()
+        now = time.time()
+        if error is None:
+            conn.execute("UPDATE jobs SET status='done', attempts=?, finished_at=?, last_error=NULL WHERE id=?",
+                         (attempts, now, job_id))
+        elif attempts >= self.max_attempts:
+            conn.execute("UPDATE jobs SET status='failed', attempts=?, finished_at=?, last_error=? WHERE id=?",
+                         (attempts, now, error, job_id))
+        else:
+            delay = min(self.backoff_max, self.backoff_base ** attempts) * random.uniform(0.8, 1.2)
+            conn.execute("UPDATE jobs SET status='queued', attempts=?, run_at=?, locked_by=NULL, last_error=? "
+                         "WHERE id=?", (attempts, now + delay, error, job_id))
+
+    def run_one(self, worker_id):
+        """Run the next due job. Returns False when there was nothing to do."""
+        job = self.claim(worker_id)
+        if job is None:
+            return False
+        job_id, name, payload, attempts = job
+        handler = self._handlers.get(name)
+        try:
+            if handler is None:
+                raise LookupError(f"no handler registered for job {name!r}")
+            handler(**payload)
+        except Exception:
+            self._finish(job_id, attempts + 1, traceback.format_exc(limit=5))
+        else:
+            self._finish(job_id, attempts + 1)
+        return True
+
+    def work(self, stop_event=None, poll_interval=0.5, worker_id=None, purge_interval=3600):
+        """Worker loop: run jobs until `stop_event` is set."""
+        worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+        stop_event = stop_event or threading.Event()
+        next_purge = time.time() + purge_interval * random.random()
+        while not stop_event.is_set():
+            try:
+                if time.time() >= next_purge:
+                    self.purge()
+                    next_purge = time.time() + purge_interval
+                busy = self.run_one(worker_id)
+            except sqlite3.OperationalError as e:
+                print("Job queue error:", e)
+                busy = False
+            if not busy:
+                stop_event.wait(poll_interval)
+
+    def start_threads(self, count, poll_interval=0.5):
+        """Run `count` daemon worker threads in this process."""
+        stop_event = threading.Event()
+        for i in range(count):
+            threading.Thread(target=self.work, args=(stop_event, poll_interval),
+                             name=f"job-worker-{i}", daemon=True).start()
+        return stop_event
+
+    def purge(self, older_than=7 * 86400):
+        """Drop finished jobs older than `older_than` seconds."""
+        self._conn().execute("DELETE FROM jobs WHERE status='done' AND finished_at < ?", (time.time() - older_than,))
+
+    # ----- monitoring -----
+    def stats(self, window=300):
+        """Queue depth by status, plus wait/run latency over the last `window` seconds."""
+        conn = self._conn()
+        out = {'queued': 0, 'running': 0, 'done': 0, 'failed': 0}
+        for status, n in conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"):
+            out[status] = n
+        since = time.time() - window
+        wait_avg, wait_max, run_avg, run_max = conn.execute(
+            "SELECT AVG(started_at - created_at), MAX(started_at - created_at), "
+            "AVG(finished_at - started_at), MAX(finished_at - started_at) "
+            "FROM jobs WHERE status='done' AND finished_at >= ?", (since,)).fetchone()
+        out.update({
+            'wait_seconds_avg': wait_avg or 0.0,
+            'wait_seconds_max': wait_max or 0.0,
+            'run_seconds_avg': run_avg or 0.0,
+            'run_seconds_max': run_max or 0.0,
+        })
+        oldest = conn.execute("SELECT MIN(created_at) FROM jobs WHERE status='queued'").fetchone()[0]
+        out['oldest_queued_age_seconds'] = time.time() - oldest if oldest else 0.0
+        return out
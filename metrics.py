@@ -0,0 +1,232 @@
+# metrics.py
+# Per-endpoint request latency and per-statement SQL counters, exported in
+# the Prometheus text format. Numbers are per worker process.
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from flask import g, has_request_context, request
+
+log = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55)
+
+_WS_RE = re.compile(r'\s+')
+_STR_RE = re.compile(r"'(?:[^'\\]|\\.)*'")
+_NUM_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_RE = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', re.I)
+
+
+def normalize_sql(sql):
+    """Collapse a statement to its shape: literals and placeholders become '?'."""
+    sql = _WS_RE.sub(' ', sql).strip()
+    sql = _STR_RE.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = _NUM_RE.sub('?', sql)
+    return _IN_RE.sub('IN (...)', sql)
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'total', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+class _StatementStats:
+    __slots__ = ('calls', 'seconds', 'rows')
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.rows = 0
+
+
+class InstrumentedCursor:
+    def __init__(self, cursor, metrics, endpoint):
+        self._cursor = cursor
+        self._metrics = metrics
+        self._endpoint = endpoint
+        self._statement = None
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        for row in self._cursor:
+            self._metrics.add_rows(self._endpoint, self._statement, 1)
+            yield row
+
+    def _timed(self, method, sql, args):
+        self._statement = normalize_sql(sql)
+        start = time.perf_counter()
+        try:
+            return method(sql, args)
+        finally:
+            self._metrics.record_query(self._endpoint, self._statement, time.perf_counter() - start)
+
+    def execute(self, sql, args=None):
+        return self._timed(self._cursor.execute, sql, args)
+
+    def executemany(self, sql, args):
+        return self._timed(self._cursor.executemany, sql, args)
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._metrics.add_rows(self._endpoint, self._statement, 1)
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._cursor.fetchmany(size) if size is not None else self._cursor.fetchmany()
+        self._metrics.add_rows(self._endpoint, self._statement, len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._metrics.add_rows(self._endpoint, self._statement, len(rows))
+        return rows
+
+
+class InstrumentedConnection:
+    def __init__(self, conn, metrics, endpoint=None):
+        self._conn = conn
+        self._metrics = metrics
+        self._endpoint = endpoint
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def cursor(self, *args, **kwargs):
+        endpoint = self._endpoint
+        if endpoint is None and has_request_context():
+            endpoint = request.endpoint
+        return InstrumentedCursor(self._conn.cursor(*args, **kwargs), self._metrics, endpoint or '-')
+
+
+class Metrics:
+    def __init__(self, slow_query_seconds=0.5):
+        self.slow_query_seconds = slow_query_seconds
+        self._lock = threading.Lock()
+        self._statements = defaultdict(_StatementStats)       # (endpoint, sql) -> stats
+        self._latency = {}                                    # endpoint -> Histogram
+        self._queries_per_request = {}                        # endpoint -> Histogram
+        self._responses = defaultdict(int)                    # (endpoint, status) -> count
+        self._gauges = {}                                     # name -> (help, callable)
+
+    # ----- SQL -----
+    def wrap(self, conn, endpoint=None):
+        return InstrumentedConnection(conn, self, endpoint)
+
+    def record_query(self, endpoint, statement, seconds):
+        with self._lock:
+            stats = self._statements[(endpoint, statement)]
+            stats.calls += 1
+            stats.seconds += seconds
+        if has_request_context():
+            g._sql_queries = g.get('_sql_queries', 0) + 1
+        if seconds >= self.slow_query_seconds:
+            log.warning("slow query %.3fs [%s] %s", seconds, endpoint, statement)
+
+    def add_rows(self, endpoint, statement, count):
+        if statement is None or not count:
+            return
+        with self._lock:
+            self._statements[(endpoint, statement)].rows += count
+
+    # ----- requests -----
+    def init_app(self, app):
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def _before_request(self):
+        g._request_started = time.perf_counter()
+
+    def _after_request(self, response):
+        started = g.get('_request_started')
+        if started is None:
+            return response
+        endpoint = request.endpoint or '-'
+        status = response.status_code
+        # Streamed pages run their queries while the body is sent, after this
+        # hook; the request is observed once the response is closed.
+        request_g = g._get_current_object()
+
+        def observe():
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                if endpoint not in self._latency:
+                    self._latency[endpoint] = Histogram(LATENCY_BUCKETS)
+                    self._queries_per_request[endpoint] = Histogram(QUERY_COUNT_BUCKETS)
+                self._latency[endpoint].observe(elapsed)
+                self._queries_per_request[endpoint].observe(request_g.get('_sql_queries', 0))
+                self._responses[(endpoint, status)] += 1
+
+        response.call_on_close(observe)
+        return response
+
+    def gauge(self, name, help_text, fn):
+        """Register a value read at scrape time (pool size, cache hits, ...)."""
+        self._gauges[name] = (help_text, fn)
+
+    # ----- export -----
+    def render(self):
+        out = []
+        with self._lock:
+            out += _histograms('petselling_request_duration_seconds',
+                               'Request latency by endpoint.', self._latency)
+            out += _histograms('petselling_request_sql_queries',
+                               'SQL statements issued per request.', self._queries_per_request)
+            out.append('# HELP petselling_responses_total Responses by endpoint and status.')
+            out.append('# TYPE petselling_responses_total counter')
+            for (endpoint, status), n in sorted(self._responses.items()):
+                out.append(f'petselling_responses_total{{endpoint="{_esc(endpoint)}",status="{status}"}} {n}')
+            for metric, attr, help_text in (
+                ('petselling_sql_queries_total', 'calls', 'Executions per normalized statement.'),
+                ('petselling_sql_query_seconds_total', 'seconds', 'Time spent executing each statement.'),
+                ('petselling_sql_rows_fetched_total', 'rows', 'Rows fetched per statement.'),
+            ):
+                out.append(f'# HELP {metric} {help_text}')
+                out.append(f'# TYPE {metric} counter')
+                for (endpoint, statement), stats in sorted(self._statements.items()):
+                    out.append(f'{metric}{{endpoint="{_esc(endpoint)}",statement="{_esc(statement)}"}} '
+                               f'{getattr(stats, attr)}')
+        for name, (help_text, fn) in sorted(self._gauges.items()):
+            try:
+                value = fn()
+            except Exception:
+                continue
+            out.append(f'# HELP {name} {help_text}')
+            out.append(f'# TYPE {name} gauge')
+            out.append(f'{name} {value}')
+        return '\n'.join(out) + '\n'
+
+
+def _esc(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _histograms(name, help_text, by_endpoint):
+    out = [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+    for endpoint, hist in sorted(by_endpoint.items()):
+        label = f'endpoint="{_esc(endpoint)}"'
+        cumulative = 0
+        for bound, n in zip(hist.buckets, hist.counts):
+            cumulative += n
+            out.append(f'{name}_bucket{{{label},le="{bound}"}} {cumulative}')
+        out.append(f'{name}_bucket{{{label},le="+Inf"}} {hist.count}')
+        out.append(f'{name}_sum{{{label}}} {hist.total}')
+        out.append(f'{name}_count{{{label}}} {hist.count}')
+    return out
@@ -0,0 +1,122 @@
+# migrate.py
+# Versioned schema migrations. Each file in migrations/ named NNNN_name.sql is
+# applied once, in order, and recorded in the schema_migrations table.
+#
+#   python migrate.py            apply pending migrations
+#   python migrate.py --status   list applied / pending migrations
+import argparse
+import os
+import re
+
+import MySQLdb
+from dotenv import load_dotenv
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+_FILE_RE = re.compile(r'^(\d{4})_[\w-]+\.sql$')
+
+# "Already exists" errors mean a statement was applied by hand before the
+# runner existed: 1050 table exists, 1060 duplicate column, 1061 duplicate
+# key name.
+ALREADY_APPLIED_ERRORS = {1050, 1060, 1061}
+
+
+def connect(**kwargs):
+    load_dotenv()
+    return MySQLdb.connect(
+        host=os.getenv('MYSQL_HOST', 'localhost'),
+        user=os.getenv('MYSQL_USER', 'root'),
+        passwd=os.getenv('MYSQL_PASSWORD', ''),
+        db=os.getenv('MYSQL_DB', 'hero'),
+        port=int(os.getenv('MYSQL_PORT', 3306)),
+        charset='utf8mb4',
+        **kwargs
+    )
+
+
+def load_migrations(directory=MIGRATIONS_DIR):
+    """Return [(version, filename, [statements])] sorted by version."""
+    migrations = []
+    for filename in sorted(os.listdir(directory)):
+        m = _FILE_RE.match(filename)
+        if not m:
+            continue
+        with open(os.path.join(directory, filename)) as f:
+            migrations.append((m.group(1), filename, split_statements(f.read())))
+    return migrations
+
+
+def split_statements(sql):
+    lines = [line for line in sql.splitlines() if not line.strip().startswith('--')]
+    return [stmt.strip() for stmt in '\n'.join(lines).split(';') if stmt.strip()]
+
+
+def ensure_table(conn):
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            Version VARCHAR(16) PRIMARY KEY,
+            Name VARCHAR(255) NOT NULL,
+            AppliedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cur.close()
+
+
+def applied_versions(conn):
+    cur = conn.cursor()
+    cur.execute("SELECT Version FROM schema_migrations")
+    versions = {row[0] for row in cur.fetchall()}
+    cur.close()
+    return versions
+
+
+def apply(conn, version, filename, statements):
+    cur = conn.cursor()
+    try:
+        for stmt in statements:
+            try:
+                cur.execute(stmt)
+            except MySQLdb.OperationalError as e:
+                if e.args[0] not in ALREADY_APPLIED_ERRORS:
+                    raise
+                print(f"  {filename}: skipped, already applied ({e.args[1]})")
+        cur.execute("INSERT INTO schema_migrations (Version, Name) VALUES (%s, %s)", (version, filename))
+        conn.commit()
+    finally:
+        cur.close()
+
+
+def migrate(conn, directory=MIGRATIONS_DIR):
+    ensure_table(conn)
+    done = applied_versions(conn)
+    applied = []
+    for version, filename, statements in load_migrations(directory):
+        if version in done:
+            continue
+        print(f"Applying {filename}")
+        apply(conn, version, filename, statements)
+        applied.append(filename)
+    return applied
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Apply schema migrations.')
+    parser.add_argument('--status', action='store_true', help='show applied and pending migrations')
+    args = parser.parse_args()
+
+    conn = connect()
+    try:
+        if args.status:
+            ensure_table(conn)
+            done = applied_versions(conn)
+            for version, filename, _ in load_migrations():
+                print(f"{'applied' if version in done else 'pending'}  {filename}")
+        else:
+            applied = migrate(conn)
+            print(f"{len(applied)} migration(s) applied")
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
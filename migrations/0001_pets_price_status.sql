@@ -0,0 +1,5 @@
+-- Columns app.py reads and writes but hero.sql never created.
+-- Databases that already added them by hand are fine: the runner treats
+-- "duplicate column" as already applied.
+ALTER TABLE Pets ADD COLUMN Price DECIMAL(10,2) DEFAULT 0.00;
+ALTER TABLE Pets ADD COLUMN Status VARCHAR(20) NOT NULL DEFAULT 'available';
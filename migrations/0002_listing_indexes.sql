@@ -0,0 +1,14 @@
+-- Indexes for the filters and sort orders of the hot routes.
+
+-- index(), user_dashboard(), /search: Status='available' ORDER BY CreatedAt DESC, PetID DESC
+-- (keyset pagination seeks on the trailing columns)
+CREATE INDEX idx_pets_status_created ON Pets (Status, CreatedAt, PetID);
+
+-- owner_dashboard(): OwnerID = ? AND Status = 'available'
+CREATE INDEX idx_pets_owner_status ON Pets (OwnerID, Status);
+
+-- user_dashboard(), user_payments(), adopt(): UserID = ? AND Status IN (...) ORDER BY CreatedAt DESC
+CREATE INDEX idx_requests_user_status_created ON AdoptionRequests (UserID, Status, CreatedAt);
+
+-- user_dashboard() history: UserID = ? ORDER BY Date DESC
+CREATE INDEX idx_history_user_date ON AdoptionHistory (UserID, Date);
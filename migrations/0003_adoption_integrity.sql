@@ -0,0 +1,32 @@
+-- Constraints backing the transactional adopt()/user_payment() flow.
+
+-- One pending request per (user, pet). MySQL has no partial indexes, so the
+-- unique key covers a generated column that is NULL for every other status
+-- (NULLs never collide). Older duplicates are closed first, keeping the oldest.
+UPDATE AdoptionRequests ar
+JOIN (
+    SELECT UserID, PetID, MIN(ReqID) AS KeepID
+    FROM AdoptionRequests
+    WHERE Status = 'Pending'
+    GROUP BY UserID, PetID
+    HAVING COUNT(*) > 1
+) dup ON dup.UserID = ar.UserID AND dup.PetID = ar.PetID
+SET ar.Status = 'Rejected'
+WHERE ar.Status = 'Pending' AND ar.ReqID <> dup.KeepID;
+
+ALTER TABLE AdoptionRequests
+    ADD COLUMN PendingFlag TINYINT AS (IF(Status = 'Pending', 1, NULL)) VIRTUAL;
+
+CREATE UNIQUE INDEX uq_requests_pending ON AdoptionRequests (UserID, PetID, PendingFlag);
+
+-- Idempotency keys for state-changing POSTs (payment). The key is inserted in
+-- the same transaction as the work, so a retried or double-submitted form
+-- hits the primary key instead of completing twice.
+CREATE TABLE IF NOT EXISTS IdempotencyKeys (
+    IdemKey VARCHAR(64) PRIMARY KEY,
+    UserID INT NOT NULL,
+    Scope VARCHAR(50) NOT NULL,
+    ResultID INT,
+    CreatedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_idempotency_created (CreatedAt)
+);
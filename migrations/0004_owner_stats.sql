@@ -0,0 +1,30 @@
+-- Per-owner dashboard counters, maintained in the same transaction as the
+-- rows they summarise (see bump_owner_stats() in app.py) and rebuilt from the
+-- base tables by the reconcile_owner_stats job, so owner_dashboard() reads
+-- one row however long an owner's history is.
+CREATE TABLE IF NOT EXISTS OwnerStats (
+    OwnerID INT PRIMARY KEY,
+    AvailablePets INT NOT NULL DEFAULT 0,
+    PendingRequests INT NOT NULL DEFAULT 0,
+    SoldPets INT NOT NULL DEFAULT 0,
+    Revenue DECIMAL(14,2) NOT NULL DEFAULT 0.00,
+    -- Sum of listing-to-adoption times; average = AdoptionSeconds / SoldPets
+    AdoptionSeconds BIGINT NOT NULL DEFAULT 0,
+    UpdatedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Backfill (same derivation as OWNER_STATS_SELECT in app.py)
+REPLACE INTO OwnerStats (OwnerID, AvailablePets, PendingRequests, SoldPets, Revenue, AdoptionSeconds)
+SELECT o.OwnerID,
+    (SELECT COUNT(*) FROM Pets p WHERE p.OwnerID = o.OwnerID AND p.Status = 'available'),
+    (SELECT COUNT(*) FROM AdoptionRequests ar JOIN Pets p ON p.PetID = ar.PetID
+      WHERE p.OwnerID = o.OwnerID AND ar.Status = 'Pending'),
+    (SELECT COUNT(*) FROM AdoptionHistory ah JOIN Pets p ON p.PetID = ah.PetID WHERE p.OwnerID = o.OwnerID),
+    (SELECT COALESCE(SUM(p.Price), 0) FROM AdoptionHistory ah JOIN Pets p ON p.PetID = ah.PetID
+      WHERE p.OwnerID = o.OwnerID),
+    (SELECT COALESCE(SUM(TIMESTAMPDIFF(SECOND, p.CreatedAt, ah.Date)), 0)
+      FROM AdoptionHistory ah JOIN Pets p ON p.PetID = ah.PetID WHERE p.OwnerID = o.OwnerID)
+FROM Owners o;
+
+-- owner_dashboard(): recent sales, OwnerID = ? ORDER BY Date DESC
+CREATE INDEX idx_history_owner_date ON AdoptionHistory (OwnerID, Date);
@@ -0,0 +1,53 @@
+# pagination.py
+# Keyset (cursor) pagination helpers. Listings are ordered newest first on
+# (CreatedAt, id); the cursor carries the last row's key so the next page is
+# a plain range seek on that ordering instead of an OFFSET scan.
+import base64
+from datetime import datetime
+
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(created_at, row_id):
+    raw = f"{created_at.isoformat()}|{int(row_id)}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Return (created_at, row_id) or None for a missing/garbled cursor."""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        created, row_id = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        return datetime.fromisoformat(created), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def page_size_arg(value, default=DEFAULT_PAGE_SIZE):
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def keyset_where(created_col, id_col, cursor):
+    """SQL fragment + params selecting rows strictly after `cursor` (DESC order)."""
+    if cursor is None:
+        return '1=1', ()
+    created_at, row_id = cursor
+    return (f"({created_col} < %s OR ({created_col} = %s AND {id_col} < %s))",
+            (created_at, created_at, row_id))
+
+
+def split_page(rows, page_size, created_key='CreatedAt', id_key='PetID'):
+    """Trim the extra look-ahead row; return (rows, next_cursor or None)."""
+    rows = list(rows)
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    last = rows[-1]
+    return rows, encode_cursor(last[created_key], last[id_key])
@@ -0,0 +1,142 @@
+# pet_import.py
+# Bulk pet import from a CSV (plus an optional zip of images), for shelters
+# listing hundreds of animals at once. Rows are validated in one streaming
+# pass; valid rows are inserted by the caller with executemany in batches,
+# and images go through ImageStore on a small thread pool.
+#
+# CSV header (case-insensitive, any order):
+#   name, type, breed, age, gender, price, description, image
+# `image` names a file inside the zip.
+import csv
+import io
+import os
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+COLUMNS = ('name', 'type', 'breed', 'age', 'gender', 'price', 'description', 'image')
+REQUIRED = ('name', 'type')
+GENDERS = {'male': 'Male', 'female': 'Female', 'unknown': 'Unknown', '': 'Unknown'}
+IMAGE_WORKERS = 4
+
+
+class ImportRejected(Exception):
+    """The upload as a whole is unusable (bad header, too many rows, ...)."""
+
+
+def parse_rows(stream, max_rows):
+    """Validate CSV rows from a binary stream.
+
+    Returns (rows, errors): rows are dicts ready to insert, tagged with their
+    line number; errors are (line, message) pairs for rows that were skipped.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    reader = csv.reader(text)
+    try:
+        header = [h.strip().lower() for h in next(reader)]
+    except StopIteration:
+        raise ImportRejected('The CSV file is empty')
+    except UnicodeDecodeError:
+        raise ImportRejected('The CSV file must be UTF-8 encoded')
+    missing = [c for c in REQUIRED if c not in header]
+    if missing:
+        raise ImportRejected(f"Missing column(s): {', '.join(missing)}")
+    index = {c: header.index(c) for c in COLUMNS if c in header}
+
+    rows, errors = [], []
+    try:
+        for values in reader:
+            line = reader.line_num
+            if not any(v.strip() for v in values):
+                continue
+            if len(rows) + len(errors) >= max_rows:
+                raise ImportRejected(f'Too many rows (limit is {max_rows})')
+            raw = {c: (values[i].strip() if i < len(values) else '') for c, i in index.items()}
+            row, problems = _validate(raw)
+            if problems:
+                errors.append((line, '; '.join(problems)))
+            else:
+                row['line'] = line
+                rows.append(row)
+    except UnicodeDecodeError:
+        raise ImportRejected('The CSV file must be UTF-8 encoded')
+    except csv.Error as e:
+        raise ImportRejected(f'Malformed CSV near line {reader.line_num}: {e}')
+    return rows, errors
+
+
+def _validate(raw):
+    problems = []
+    for c in REQUIRED:
+        if not raw.get(c):
+            problems.append(f'{c} is required')
+    try:
+        age = int(raw.get('age') or 0)
+        if not 0 <= age <= 50:
+            problems.append('age must be between 0 and 50')
+    except ValueError:
+        age = 0
+        problems.append('age must be a whole number')
+    try:
+        price = float(raw.get('price') or 0)
+        if price < 0:
+            problems.append('price cannot be negative')
+    except ValueError:
+        price = 0.0
+        problems.append('price must be a number')
+    gender = GENDERS.get(raw.get('gender', '').lower())
+    if gender is None:
+        problems.append('gender must be Male, Female or Unknown')
+    return {
+        'name': raw.get('name', '')[:100],
+        'type': raw.get('type', '')[:50],
+        'breed': raw.get('breed', '')[:100] or None,
+        'age': age,
+        'gender': gender,
+        'price': price,
+        'description': raw.get('description') or None,
+        'image': raw.get('image', ''),
+    }, problems
+
+
+def store_images(archive, names, image_store, allowed_extensions, max_size):
+    """Store the named zip members in parallel.
+
+    Returns ({name: url}, {name: error message}).
+    """
+    try:
+        zf = zipfile.ZipFile(archive)
+    except zipfile.BadZipFile:
+        raise ImportRejected('The images file is not a valid zip archive')
+    # Match on the bare file name so folders inside the zip don't matter
+    members = {}
+    for info in zf.infolist():
+        if not info.is_dir():
+            members.setdefault(os.path.basename(info.filename), info)
+
+    def store(name):
+        info = members.get(os.path.basename(name))
+        if info is None:
+            raise ValueError(f'image {name} not found in the zip')
+        ext = name.rsplit('.', 1)[-1].lower() if '.' in name else ''
+        if ext not in allowed_extensions:
+            raise ValueError(f'image {name} has an unsupported format')
+        # Checked before decompressing: the header size can't be trusted blindly,
+        # so the read is capped as well
+        if info.file_size > max_size:
+            raise ValueError(f'image {name} is larger than {max_size // (1024 * 1024)}MB')
+        with zf.open(info) as f:
+            data = f.read(max_size + 1)
+        if len(data) > max_size:
+            raise ValueError(f'image {name} is larger than {max_size // (1024 * 1024)}MB')
+        return image_store.save(io.BytesIO(data), ext, variants=False)
+
+    urls, failures = {}, {}
+    with zf, ThreadPoolExecutor(max_workers=IMAGE_WORKERS) as pool:
+        futures = {name: pool.submit(store, name) for name in names}
+        for name, future in futures.items():
+            try:
+                urls[name] = future.result()
+            except (ValueError, OSError, EOFError, zipfile.BadZipFile, zlib.error) as e:
+                failures[name] = str(e)
+    return urls, failures
@@ -0,0 +1,88 @@
+# query_batch.py
+# Run independent read queries side by side, each on its own pooled
+# connection, so a page that needs N reads waits for the slowest one instead
+# of the sum of all of them.
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from db_pool import PoolTimeout
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+BATCH_WORKERS = int(os.getenv('QUERY_BATCH_WORKERS', 8))
+
+
+def _get_executor():
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        with _executor_lock:
+            if _executor is None or _executor_pid != os.getpid():
+                _executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix='query-batch')
+                _executor_pid = os.getpid()
+    return _executor
+
+
+def _fetch(conn, sql, params, one):
+    cur = conn.cursor()
+    try:
+        cur.execute(sql, params)
+        return cur.fetchone() if one else cur.fetchall()
+    finally:
+        cur.close()
+
+
+class QueryBatch:
+    """Collect read queries, start them together, then gather the results.
+
+    Each query borrows its own connection from the pool without waiting.
+    If the pool is exhausted the query runs on `fallback_conn` (normally
+    the request's connection) when results are gathered instead, so a busy
+    pool degrades to sequential execution rather than timing out.
+    """
+
+    def __init__(self, pool, fallback_conn=None, wrap=None):
+        self.pool = pool
+        self.fallback_conn = fallback_conn
+        self.wrap = wrap
+        self._queries = []
+        self._futures = {}
+        self._inline = []
+
+    def add(self, name, sql, params=(), one=False):
+        self._queries.append((name, sql, params, one))
+        return self
+
+    def _run_pooled(self, pooled, sql, params, one):
+        try:
+            conn = self.wrap(pooled.raw) if self.wrap else pooled.raw
+            return _fetch(conn, sql, params, one)
+        finally:
+            self.pool.release(pooled)
+
+    def start(self):
+        for name, sql, params, one in self._queries:
+            try:
+                pooled = self.pool.acquire(timeout=0)
+            except PoolTimeout:
+                self._inline.append((name, sql, params, one))
+                continue
+            self._futures[name] = _get_executor().submit(self._run_pooled, pooled, sql, params, one)
+        self._queries = []
+        return self
+
+    def results(self):
+        """Wait for every query; return {name: rows-or-row}. Re-raises query errors."""
+        if self._queries:
+            self.start()
+        out = {}
+        for name, sql, params, one in self._inline:
+            out[name] = _fetch(self.fallback_conn, sql, params, one)
+        for name, future in self._futures.items():
+            out[name] = future.result()
+        return out
+
+    def run(self):
+        return self.start().results()
@@ -0,0 +1,188 @@
+# ratelimit.py
+# Admission control for expensive endpoints: token buckets per client IP and
+# per session (e.g. /login, which runs a password hash, and /search), plus a
+# cap on requests in flight per process. Rejected requests get 429 or 503
+# with Retry-After straight away instead of queueing behind the work.
+#
+# Bucket state lives in a store like the version counters in cache.py:
+# 'local' (one process) or 'sqlite' (a local file shared by every worker on
+# the box, so a client can't multiply its allowance by the worker count).
+#
+# Rules are "endpoint:scope=count/seconds", comma separated, e.g.
+#   login:ip=20/60,login:session=10/60,search:ip=120/60
+# A rule allows bursts of `count` requests and refills at count/seconds.
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+Rule = namedtuple('Rule', 'endpoint scope count seconds')
+SCOPES = ('ip', 'session')
+
+
+def parse_rules(spec):
+    """Parse the RATE_LIMITS string into {endpoint: [Rule]}."""
+    rules = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        try:
+            target, limit = item.split('=')
+            endpoint, scope = target.split(':')
+            count, seconds = limit.split('/')
+            rule = Rule(endpoint.strip(), scope.strip(), int(count), float(seconds))
+        except ValueError:
+            raise ValueError(f"bad rate limit rule: {item!r} (expected endpoint:scope=count/seconds)")
+        if rule.scope not in SCOPES:
+            raise ValueError(f"bad rate limit scope in {item!r} (use {' or '.join(SCOPES)})")
+        rules.setdefault(rule.endpoint, []).append(rule)
+    return rules
+
+
+def _refill(tokens, updated, rule, now):
+    if tokens is None:
+        return float(rule.count)
+    return min(float(rule.count), tokens + (now - updated) * rule.count / rule.seconds)
+
+
+def _retry_after(tokens, rule):
+    return (1 - tokens) * rule.seconds / rule.count
+
+
+class LocalBucketStore:
+    """Buckets in process memory. Only correct with a single worker process."""
+
+    def __init__(self, max_keys=100000):
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self.max_keys = max_keys
+
+    def take(self, key, rule):
+        """Take a token; returns (allowed, seconds until one is available)."""
+        now = time.time()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (None, None))
+            tokens = _refill(tokens, updated, rule, now)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._purge(now)
+        return allowed, 0.0 if allowed else _retry_after(tokens, rule)
+
+    def _purge(self, now, idle=3600):
+        for key in [k for k, (_, updated) in self._buckets.items() if now - updated > idle]:
+            del self._buckets[key]
+
+
+class SQLiteBucketStore:
+    """Buckets in a local SQLite file, shared by every worker on the box."""
+
+    def __init__(self, path, purge_every=1000):
+        self.path = path
+        self.purge_every = purge_every
+        self._takes = 0
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS buckets (
+                key TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated REAL NOT NULL
+            )
+        """)
+
+    def _conn(self):
+        # One connection per thread and per process (never reuse across fork).
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=1, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def take(self, key, rule):
+        """Take a token; returns (allowed, seconds until one is available)."""
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE key=?", (key,)).fetchone()
+            tokens = _refill(*(row or (None, None)), rule, now)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            conn.execute("INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                         (key, tokens, now))
+            self._takes += 1
+            if self._takes % self.purge_every == 0:
+                # Idle buckets are full again; dropping them changes nothing
+                conn.execute("DELETE FROM buckets WHERE updated < ?", (now - 3600,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return allowed, 0.0 if allowed else _retry_after(tokens, rule)
+
+
+def make_bucket_store(backend, path=None):
+    if backend == 'local':
+        return LocalBucketStore()
+    if backend == 'sqlite':
+        return SQLiteBucketStore(path)
+    raise ValueError(f"unknown rate limit backend: {backend}")
+
+
+class RateLimiter:
+    def __init__(self, store, rules):
+        self.store = store
+        self.rules = rules
+        self.rejected = 0
+
+    def check(self, endpoint, idents):
+        """Charge one request against every rule for `endpoint`.
+
+        `idents` maps scope -> client identifier. Returns 0 when allowed,
+        else the seconds to wait. A store failure lets the request through:
+        the limiter must not take the site down with it.
+        """
+        wait = 0.0
+        for rule in self.rules.get(endpoint, ()):
+            ident = idents.get(rule.scope)
+            if ident is None:
+                continue
+            try:
+                allowed, retry_after = self.store.take(f'{endpoint}:{rule.scope}:{ident}', rule)
+            except sqlite3.Error as e:
+                print("Rate limiter store error:", e)
+                continue
+            if not allowed:
+                wait = max(wait, retry_after)
+        if wait:
+            self.rejected += 1
+        return wait
+
+
+class ConcurrencyGate:
+    """Caps requests in flight in this process; over the cap, fail fast."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.rejected = 0
+
+    def enter(self):
+        with self._lock:
+            if self.limit and self.in_flight >= self.limit:
+                self.rejected += 1
+                return False
+            self.in_flight += 1
+            return True
+
+    def leave(self):
+        with self._lock:
+            self.in_flight -= 1
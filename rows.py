@@ -0,0 +1,49 @@
+# rows.py
+# Compact row records for large listings. A DictCursor row is a full dict
+# per row (hash table + key references); these are namedtuples, one class
+# per column list, so a row costs little more than a tuple. They still read
+# like dicts where existing code expects it: row['Name'], row.get('Name'),
+# and pet.Name in templates.
+from collections import namedtuple
+
+import MySQLdb.cursors
+
+_record_types = {}
+
+
+def record_type(columns):
+    """The record class for a tuple of column names (cached)."""
+    cls = _record_types.get(columns)
+    if cls is None:
+        base = namedtuple('Record', columns, rename=True)
+
+        class Record(base):
+            __slots__ = ()
+
+            def __getitem__(self, key):
+                if isinstance(key, str):
+                    try:
+                        return getattr(self, key)
+                    except AttributeError:
+                        raise KeyError(key) from None
+                return tuple.__getitem__(self, key)
+
+            def get(self, key, default=None):
+                return getattr(self, key, default)
+
+            def keys(self):
+                return self._fields
+
+        cls = _record_types[columns] = Record
+    return cls
+
+
+def tuple_cursor(conn):
+    """A plain (tuple) cursor, skipping the per-row dict DictCursor builds."""
+    return conn.cursor(MySQLdb.cursors.Cursor)
+
+
+def fetch_records(cur):
+    """fetchall() from a tuple cursor as records."""
+    cls = record_type(tuple(d[0] for d in cur.description))
+    return [cls._make(row) for row in cur.fetchall()]
@@ -0,0 +1,118 @@
+# search_index.py
+# In-process inverted index over the searchable text of available pets.
+# Replaces the leading-wildcard LIKE scan in /search: queries are answered
+# from memory and only the matching PetIDs are fetched from MySQL.
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+# Matches on short, structured fields count for more than description text.
+FIELD_WEIGHTS = {'Name': 4.0, 'Type': 3.0, 'Breed': 3.0, 'Description': 1.0}
+EXACT_BONUS = 1.5
+
+
+def tokenize(text):
+    if not text:
+        return []
+    return _TOKEN_RE.findall(str(text).lower())
+
+
+class SearchIndex:
+    def __init__(self, fields=FIELD_WEIGHTS):
+        self.fields = dict(fields)
+        self._lock = threading.RLock()
+        self._postings = defaultdict(dict)   # token -> {pet_id: weight}
+        self._docs = {}                       # pet_id -> {token: weight}
+        self._vocab = []
+        self._vocab_dirty = False
+        self.built_at = None
+
+    def __len__(self):
+        return len(self._docs)
+
+    def _weights(self, row):
+        weights = defaultdict(float)
+        for field, weight in self.fields.items():
+            for token in tokenize(row.get(field)):
+                weights[token] += weight
+        return weights
+
+    def upsert(self, row):
+        """Index a pet row; pets that are not available are dropped instead."""
+        pet_id = row['PetID']
+        status = (row.get('Status') or 'available').lower()
+        with self._lock:
+            self._remove_locked(pet_id)
+            if status != 'available':
+                return
+            weights = self._weights(row)
+            for token, weight in weights.items():
+                if token not in self._postings:
+                    self._vocab_dirty = True
+                self._postings[token][pet_id] = weight
+            self._docs[pet_id] = weights
+
+    def remove(self, pet_id):
+        with self._lock:
+            self._remove_locked(pet_id)
+
+    def _remove_locked(self, pet_id):
+        weights = self._docs.pop(pet_id, None)
+        if not weights:
+            return
+        for token in weights:
+            posting = self._postings.get(token)
+            if posting is None:
+                continue
+            posting.pop(pet_id, None)
+            if not posting:
+                del self._postings[token]
+                self._vocab_dirty = True
+
+    def rebuild(self, rows):
+        with self._lock:
+            self._postings = defaultdict(dict)
+            self._docs = {}
+            self._vocab_dirty = True
+            for row in rows:
+                self.upsert(row)
+            self.built_at = time.time()
+
+    def _expand(self, token):
+        """Yield (indexed_token, is_exact) for every token starting with `token`."""
+        if self._vocab_dirty:
+            self._vocab = sorted(self._postings)
+            self._vocab_dirty = False
+        i = bisect_left(self._vocab, token)
+        while i < len(self._vocab) and self._vocab[i].startswith(token):
+            yield self._vocab[i], self._vocab[i] == token
+            i += 1
+
+    def search(self, query, limit=None):
+        """Return PetIDs matching every query term (prefix match), best first."""
+        terms = tokenize(query)
+        if not terms:
+            return []
+        with self._lock:
+            scores = None
+            for term in dict.fromkeys(terms):
+                term_scores = defaultdict(float)
+                for token, exact in self._expand(term):
+                    boost = EXACT_BONUS if exact else 1.0
+                    for pet_id, weight in self._postings[token].items():
+                        term_scores[pet_id] = max(term_scores[pet_id], weight * boost)
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {pid: s + term_scores[pid] for pid, s in scores.items() if pid in term_scores}
+                if not scores:
+                    return []
+        # Newer pets (higher PetID) win ties.
+        ranked = sorted(scores.items(), key=lambda kv: (-kv[1], -kv[0]))
+        if limit is not None:
+            ranked = ranked[:limit]
+        return [pet_id for pet_id, _ in ranked]
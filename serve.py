@@ -0,0 +1,297 @@
+# serve.py
+# Production entry point: a prefork server on top of Werkzeug's WSGI server.
+# The master binds the listen socket and forks workers; each worker imports
+# and warms the app (pool, templates, see startup.py) and only then starts
+# accepting on the shared socket, with a bounded pool of request threads.
+#
+#   python serve.py --bind 0.0.0.0:8000 --workers 4 --threads 8
+#
+# Signals to the master:
+#   HUP        graceful reload: start a new set of workers (fresh code), and
+#              once they are ready, drain and stop the old ones
+#   TERM/INT   graceful shutdown
+# Workers are recycled after --max-requests requests (0 = never) to bound
+# memory growth. `python app.py` is still the single-process dev server.
+#
+# Each worker runs --threads requests at a time (the app's MAX_IN_FLIGHT)
+# but accepts up to --overflow connections beyond that, so that over the cap
+# the app answers 503 straight away instead of the connection waiting in the
+# listen backlog.
+import argparse
+import errno
+import logging
+import os
+import random
+import select
+import signal
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+
+class RequestHandler(WSGIRequestHandler):
+    # One request per connection: an idle keep-alive connection would hold
+    # one of the worker's few threads
+    protocol_version = 'HTTP/1.0'
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """WSGI server on an inherited socket, handling requests on a fixed
+    thread pool. The accept loop waits for a free thread, so a worker with
+    every thread taken leaves new connections to its siblings."""
+
+    multithread = True
+    multiprocess = True
+
+    def __init__(self, app, fd, threads, max_requests=0):
+        super().__init__('', 0, app, handler=RequestHandler, fd=fd)
+        self._pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='http')
+        self._slots = threading.Semaphore(threads)
+        self.max_requests = max_requests
+        self.handled = 0
+        self.stopping = threading.Event()
+
+    def process_request(self, request, client_address):
+        self._slots.acquire()
+        self.handled += 1
+        self._pool.submit(self._handle, request, client_address)
+        if self.max_requests and self.handled >= self.max_requests:
+            self.stop()
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._slots.release()
+
+    def stop(self):
+        """Stop accepting (callable from any thread, idempotent)."""
+        if not self.stopping.is_set():
+            self.stopping.set()
+            # shutdown() waits for serve_forever to return; never block in it
+            threading.Thread(target=self.shutdown, daemon=True).start()
+
+    def drain(self):
+        """Wait for requests in progress to finish."""
+        self._pool.shutdown(wait=True)
+
+
+def run_worker(fd, ready_fd, args):
+    # Requests past --threads are shed by the app's in-flight cap; the extra
+    # threads only carry those 503s
+    os.environ.setdefault('MAX_IN_FLIGHT', str(args.threads))
+    from app import app, draining          # imports and warms the app
+
+    max_requests = args.max_requests
+    if max_requests and args.max_requests_jitter:
+        # Spread recycling out so workers don't all restart together
+        max_requests += random.randint(0, args.max_requests_jitter)
+    server = PooledWSGIServer(app, fd, args.threads + args.overflow, max_requests)
+
+    def on_term(*_):
+        draining.set()
+        server.stop()
+
+    signal.signal(signal.SIGTERM, on_term)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)   # the master handles ^C
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+
+    os.write(ready_fd, b'1')
+    os.close(ready_fd)
+    server.serve_forever(poll_interval=0.5)
+    draining.set()
+    server.drain()
+
+
+class Worker:
+    __slots__ = ('pid', 'generation', 'ready_fd', 'ready', 'stopping_since')
+
+    def __init__(self, pid, generation, ready_fd):
+        self.pid = pid
+        self.generation = generation
+        self.ready_fd = ready_fd
+        self.ready = False
+        self.stopping_since = None
+
+
+class Master:
+    def __init__(self, args):
+        self.args = args
+        self.workers = {}                  # pid -> Worker
+        self.generation = 0
+        self.reload_requested = False
+        self.stop_requested = False
+        self.fast_exits = 0
+        self.sock = bind(args.bind, args.backlog)
+        # Self-pipe: signal handlers only wake the main loop
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_w, False)
+
+    def _signal(self, signum, _frame):
+        if signum == signal.SIGHUP:
+            self.reload_requested = True
+        elif signum in (signal.SIGTERM, signal.SIGINT):
+            self.stop_requested = True
+        try:
+            os.write(self._wake_w, b'.')
+        except OSError:
+            pass
+
+    def spawn(self):
+        ready_r, ready_w = os.pipe()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                os.close(ready_r)
+                os.close(self._wake_r)
+                os.close(self._wake_w)
+                for signum in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT, signal.SIGCHLD):
+                    signal.signal(signum, signal.SIG_DFL)
+                run_worker(self.sock.fileno(), ready_w, self.args)
+            except BaseException as e:
+                print(f"Worker {os.getpid()} failed:", e, file=sys.stderr)
+                code = 1
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(code)
+        os.close(ready_w)
+        self.workers[pid] = Worker(pid, self.generation, ready_r)
+        return pid
+
+    def current(self):
+        return [w for w in self.workers.values() if w.generation == self.generation]
+
+    def stop_worker(self, worker):
+        if worker.stopping_since is None:
+            worker.stopping_since = time.monotonic()
+            _kill(worker.pid, signal.SIGTERM)
+
+    def reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            worker = self.workers.pop(pid, None)
+            if worker is None:
+                continue
+            os.close(worker.ready_fd)
+            if worker.stopping_since is None and not worker.ready:
+                # Died during startup (import error, no database, ...)
+                self.fast_exits += 1
+                print(f"Worker {pid} exited before it was ready (status {status})", file=sys.stderr)
+
+    def run(self):
+        for signum in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT, signal.SIGCHLD):
+            signal.signal(signum, self._signal)
+        print(f"Listening on {self.args.bind}: {self.args.workers} workers x {self.args.threads} threads "
+              f"(+{self.args.overflow} overflow) (pid {os.getpid()})")
+        while True:
+            self.reap()
+            if self.stop_requested:
+                return self.shutdown()
+            if self.reload_requested:
+                self.reload_requested = False
+                self.generation += 1
+                print(f"Reloading: starting worker generation {self.generation}")
+
+            # Keep the current generation at full strength (recycled, crashed)
+            if self.fast_exits >= self.args.workers:
+                time.sleep(1)              # don't fork-bomb on a broken release
+                self.fast_exits = 0
+            while len(self.current()) < self.args.workers:
+                self.spawn()
+
+            # Old generation drains once the whole new one is ready
+            if all(w.ready for w in self.current()):
+                for w in list(self.workers.values()):
+                    if w.generation != self.generation:
+                        self.stop_worker(w)
+            self.kill_overdue()
+            self.wait_events()
+
+    def wait_events(self):
+        pending = {w.ready_fd: w for w in self.workers.values() if not w.ready}
+        try:
+            readable, _, _ = select.select([self._wake_r] + list(pending), [], [], 1.0)
+        except InterruptedError:
+            return
+        for fd in readable:
+            if fd == self._wake_r:
+                os.read(self._wake_r, 512)
+                continue
+            worker = pending[fd]
+            if os.read(fd, 1):
+                worker.ready = True
+                self.fast_exits = 0
+
+    def kill_overdue(self):
+        now = time.monotonic()
+        for w in self.workers.values():
+            if w.stopping_since is not None and now - w.stopping_since > self.args.graceful_timeout:
+                _kill(w.pid, signal.SIGKILL)
+
+    def shutdown(self):
+        print("Shutting down: draining workers")
+        for w in list(self.workers.values()):
+            self.stop_worker(w)
+        while self.workers:
+            self.reap()
+            self.kill_overdue()
+            time.sleep(0.1)
+        self.sock.close()
+
+
+def _kill(pid, signum):
+    try:
+        os.kill(pid, signum)
+    except OSError as e:
+        if e.errno != errno.ESRCH:
+            raise
+
+
+def bind(address, backlog):
+    host, _, port = address.rpartition(':')
+    sock = socket.socket(socket.AF_INET6 if ':' in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host.strip('[]') or '0.0.0.0', int(port)))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the app with preforked workers.')
+    parser.add_argument('--bind', default=os.getenv('BIND', '0.0.0.0:8000'))
+    parser.add_argument('--workers', type=int, default=int(os.getenv('WEB_WORKERS', os.cpu_count() or 1)))
+    parser.add_argument('--threads', type=int, default=int(os.getenv('WEB_THREADS', 8)))
+    parser.add_argument('--overflow', type=int, default=None,
+                        help='connections accepted past --threads, to be answered 503 (default: --threads)')
+    parser.add_argument('--max-requests', type=int, default=int(os.getenv('MAX_REQUESTS', 0)))
+    parser.add_argument('--max-requests-jitter', type=int, default=int(os.getenv('MAX_REQUESTS_JITTER', 0)))
+    parser.add_argument('--graceful-timeout', type=float, default=float(os.getenv('GRACEFUL_TIMEOUT', 30)))
+    parser.add_argument('--backlog', type=int, default=2048)
+    args = parser.parse_args()
+    if args.overflow is None:
+        args.overflow = int(os.getenv('WEB_OVERFLOW', args.threads))
+    # Workers inherit this; it's where the app's startup report and warnings go
+    logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO'),
+                        format='%(asctime)s %(process)d %(levelname)s %(name)s: %(message)s')
+    Master(args).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,248 @@
+# sqlite_standin.py
+# Embedded stand-in for the MySQL server, for benchmarks and local runs
+# without a database. It speaks the MySQLdb connection/cursor interface that
+# app.py uses (DictCursor rows, %s placeholders, lastrowid, ping, ...) and
+# translates the few MySQL-only bits of our SQL to SQLite.
+#
+# Enable with MYSQL_STANDIN=/path/to/file.sqlite3; the schema is created on
+# first connect.
+import re
+import sqlite3
+import threading
+from datetime import datetime
+from decimal import Decimal
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS Users (
+    UserID INTEGER PRIMARY KEY AUTOINCREMENT,
+    Name TEXT NOT NULL,
+    Email TEXT NOT NULL UNIQUE COLLATE NOCASE,
+    Phone TEXT,
+    Address TEXT,
+    Password TEXT NOT NULL,
+    CreatedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS Owners (
+    OwnerID INTEGER PRIMARY KEY AUTOINCREMENT,
+    Name TEXT NOT NULL,
+    Email TEXT NOT NULL UNIQUE COLLATE NOCASE,
+    Contact TEXT,
+    Address TEXT,
+    Password TEXT NOT NULL,
+    CreatedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS Pets (
+    PetID INTEGER PRIMARY KEY AUTOINCREMENT,
+    OwnerID INTEGER NOT NULL REFERENCES Owners(OwnerID) ON DELETE CASCADE,
+    Name TEXT COLLATE NOCASE,
+    Breed TEXT COLLATE NOCASE,
+    Type TEXT COLLATE NOCASE,
+    Age INTEGER,
+    Gender TEXT DEFAULT 'Unknown',
+    Color TEXT,
+    Size TEXT,
+    ForSale INTEGER DEFAULT 0,
+    ForGrooming INTEGER DEFAULT 0,
+    Description TEXT,
+    ImageURL TEXT,
+    Price REAL DEFAULT 0,
+    Status TEXT NOT NULL DEFAULT 'available' COLLATE NOCASE,
+    CreatedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS AdoptionRequests (
+    ReqID INTEGER PRIMARY KEY AUTOINCREMENT,
+    UserID INTEGER NOT NULL REFERENCES Users(UserID) ON DELETE CASCADE,
+    PetID INTEGER NOT NULL REFERENCES Pets(PetID) ON DELETE CASCADE,
+    Message TEXT,
+    Status TEXT DEFAULT 'Pending' COLLATE NOCASE,
+    CreatedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS Payments (
+    PaymentID INTEGER PRIMARY KEY AUTOINCREMENT,
+    ReqID INTEGER NOT NULL,
+    UserID INTEGER NOT NULL,
+    OwnerID INTEGER NOT NULL,
+    Mode TEXT NOT NULL,
+    Amount REAL DEFAULT 0,
+    Date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS AdoptionHistory (
+    AdoptionID INTEGER PRIMARY KEY AUTOINCREMENT,
+    UserID INTEGER NOT NULL REFERENCES Users(UserID) ON DELETE CASCADE,
+    PetID INTEGER NOT NULL REFERENCES Pets(PetID) ON DELETE CASCADE,
+    OwnerID INTEGER NOT NULL REFERENCES Owners(OwnerID) ON DELETE CASCADE,
+    PaymentID INTEGER,
+    Date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_pets_status_created ON Pets (Status, CreatedAt, PetID);
+CREATE INDEX IF NOT EXISTS idx_pets_owner_status ON Pets (OwnerID, Status);
+CREATE INDEX IF NOT EXISTS idx_requests_user_status_created ON AdoptionRequests (UserID, Status, CreatedAt);
+CREATE INDEX IF NOT EXISTS idx_requests_pet ON AdoptionRequests (PetID);
+CREATE INDEX IF NOT EXISTS idx_history_user_date ON AdoptionHistory (UserID, Date);
+CREATE INDEX IF NOT EXISTS idx_history_pet ON AdoptionHistory (PetID);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_requests_pending ON AdoptionRequests (UserID, PetID) WHERE Status = 'Pending';
+CREATE TABLE IF NOT EXISTS IdempotencyKeys (
+    IdemKey TEXT PRIMARY KEY,
+    UserID INTEGER NOT NULL,
+    Scope TEXT NOT NULL,
+    ResultID INTEGER,
+    CreatedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS OwnerStats (
+    OwnerID INTEGER PRIMARY KEY,
+    AvailablePets INTEGER NOT NULL DEFAULT 0,
+    PendingRequests INTEGER NOT NULL DEFAULT 0,
+    SoldPets INTEGER NOT NULL DEFAULT 0,
+    Revenue REAL NOT NULL DEFAULT 0,
+    AdoptionSeconds INTEGER NOT NULL DEFAULT 0,
+    UpdatedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_history_owner_date ON AdoptionHistory (OwnerID, Date);
+"""
+
+_REWRITES = [
+    (re.compile(r'\bNOW\(\)', re.I), 'CURRENT_TIMESTAMP'),
+    (re.compile(r'\bINSERT\s+IGNORE\b', re.I), 'INSERT OR IGNORE'),
+    (re.compile(r'\s+FOR\s+UPDATE\b', re.I), ''),
+    (re.compile(r'\s+LOCK\s+IN\s+SHARE\s+MODE\b', re.I), ''),
+    (re.compile(r'\bON\s+DUPLICATE\s+KEY\s+UPDATE\b', re.I), 'ON CONFLICT DO UPDATE SET'),
+    (re.compile(r'\bVALUES\((\w+)\)', re.I), r'excluded.\1'),
+    # Only the SECOND unit; see _timestampdiff
+    (re.compile(r'\bTIMESTAMPDIFF\(\s*SECOND\s*,', re.I), "TIMESTAMPDIFF('SECOND',"),
+]
+
+# Same text form as CURRENT_TIMESTAMP (no '.000000'), so keyset comparisons
+# against stored values order correctly
+sqlite3.register_adapter(datetime, lambda d: d.isoformat(' '))
+sqlite3.register_adapter(Decimal, float)
+sqlite3.register_converter('TIMESTAMP', lambda b: datetime.fromisoformat(b.decode()))
+
+_schema_lock = threading.Lock()
+_schema_ready = set()
+
+
+class OperationalError(Exception):
+    pass
+
+
+class IntegrityError(Exception):
+    pass
+
+
+def _integrity_error(e):
+    # MySQL's codes, so is_duplicate_key() (1062) only sees real duplicates
+    message = str(e)
+    if message.startswith('UNIQUE constraint failed') or 'PRIMARY KEY' in message:
+        code = 1062      # ER_DUP_ENTRY
+    elif message.startswith('NOT NULL constraint failed'):
+        code = 1048      # ER_BAD_NULL_ERROR
+    elif message.startswith('CHECK constraint failed'):
+        code = 3819      # ER_CHECK_CONSTRAINT_VIOLATED
+    else:
+        code = 1452      # ER_NO_REFERENCED_ROW_2 (FOREIGN KEY constraint failed)
+    return IntegrityError(code, message)
+
+
+def _timestampdiff(unit, start, end):
+    if start is None or end is None:
+        return None
+    return int((datetime.fromisoformat(end) - datetime.fromisoformat(start)).total_seconds())
+
+
+def translate(sql):
+    for pattern, replacement in _REWRITES:
+        sql = pattern.sub(replacement, sql)
+    return sql.replace('%s', '?')
+
+
+class Cursor:
+    def __init__(self, conn, as_dict=True):
+        self._conn = conn
+        self._cur = conn._db.cursor()
+        self._as_dict = as_dict
+        self.description = None
+        self.rowcount = -1
+        self.lastrowid = None
+
+    def _convert(self, row):
+        if row is None or not self._as_dict:
+            return row
+        return {d[0]: v for d, v in zip(self._cur.description, row)}
+
+    def execute(self, sql, args=None):
+        try:
+            self._cur.execute(translate(sql), tuple(args or ()))
+        except sqlite3.IntegrityError as e:
+            raise _integrity_error(e)
+        except sqlite3.OperationalError as e:
+            raise OperationalError(2013, str(e))
+        self.description = self._cur.description
+        self.rowcount = self._cur.rowcount
+        self.lastrowid = self._cur.lastrowid
+        return self.rowcount
+
+    def executemany(self, sql, seq):
+        try:
+            self._cur.executemany(translate(sql), [tuple(a) for a in seq])
+        except sqlite3.IntegrityError as e:
+            raise _integrity_error(e)
+        except sqlite3.OperationalError as e:
+            raise OperationalError(2013, str(e))
+        self.rowcount = self._cur.rowcount
+        return self.rowcount
+
+    def fetchone(self):
+        return self._convert(self._cur.fetchone())
+
+    def fetchmany(self, size=100):
+        return [self._convert(r) for r in self._cur.fetchmany(size)]
+
+    def fetchall(self):
+        return tuple(self._convert(r) for r in self._cur.fetchall())
+
+    def __iter__(self):
+        for row in self._cur:
+            yield self._convert(row)
+
+    def close(self):
+        self._cur.close()
+
+
+class Connection:
+    def __init__(self, path, as_dict=True):
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False,
+                                   detect_types=sqlite3.PARSE_DECLTYPES, isolation_level='DEFERRED')
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('PRAGMA foreign_keys=ON')
+        self._db.create_function('TIMESTAMPDIFF', 3, _timestampdiff, deterministic=True)
+        self._as_dict = as_dict
+        with _schema_lock:
+            if path not in _schema_ready:
+                self._db.executescript(SCHEMA)
+                _schema_ready.add(path)
+
+    def cursor(self, cursorclass=None):
+        as_dict = self._as_dict if cursorclass is None else 'Dict' in getattr(cursorclass, '__name__', '')
+        return Cursor(self, as_dict)
+
+    def commit(self):
+        self._db.commit()
+
+    def rollback(self):
+        self._db.rollback()
+
+    def autocommit(self, on):
+        self._db.isolation_level = None if on else 'DEFERRED'
+
+    def ping(self, *args):
+        self._db.execute('SELECT 1')
+
+    def close(self):
+        self._db.close()
+
+
+def connect(path, cursorclass=None, dict_rows=False, **ignored):
+    """MySQLdb.connect()-compatible factory; server connection arguments are ignored."""
+    as_dict = dict_rows or (cursorclass is not None and 'Dict' in getattr(cursorclass, '__name__', ''))
+    return Connection(path, as_dict=as_dict)
@@ -0,0 +1,80 @@
+# startup.py
+# Cold-start support for web workers: a phase timer for app import, a Jinja
+# bytecode cache so workers load compiled templates instead of parsing them,
+# and a warmup pass that runs before a worker takes traffic.
+#
+#   python startup.py --precompile   at build/deploy time: compile every
+#                                    template into TEMPLATE_CACHE_DIR
+#   python startup.py                import + warm the app once and print
+#                                    the startup timing breakdown
+#
+# Kept to the standard library at import time: app.py imports this first
+# so the timer covers its own imports.
+import os
+import time
+
+
+class StartupTimer:
+    """Wall-clock time spent in each named phase of process startup."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._last = self.started
+        self.phases = []                  # [(name, seconds)] in order
+
+    def mark(self, name):
+        """Close the phase that ran since the previous mark."""
+        now = time.perf_counter()
+        self.phases.append((name, now - self._last))
+        self._last = now
+
+    @property
+    def total(self):
+        return sum(seconds for _, seconds in self.phases)
+
+    def report(self):
+        parts = ', '.join(f'{name} {seconds * 1000:.0f}ms' for name, seconds in self.phases)
+        return f'Startup {self.total * 1000:.0f}ms (pid {os.getpid()}): {parts}'
+
+
+def bytecode_cache(directory):
+    from jinja2 import FileSystemBytecodeCache
+    os.makedirs(directory, exist_ok=True)
+    return FileSystemBytecodeCache(directory, pattern='%s.jinja.cache')
+
+
+def precompile_templates(env):
+    """Load every template once. Fills the environment's in-memory cache and,
+    when one is configured, its bytecode cache. Returns the count."""
+    count = 0
+    for name in env.list_templates(extensions=('html', 'txt', 'xml')):
+        env.get_template(name)
+        count += 1
+    return count
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Precompile templates / measure worker startup.')
+    parser.add_argument('--precompile', action='store_true',
+                        help='only compile templates into the bytecode cache')
+    args = parser.parse_args()
+
+    # Measuring startup, not running jobs
+    os.environ['JOB_WORKER_THREADS'] = '0'
+    if args.precompile:
+        # Build machines usually have no database to warm
+        os.environ['WARM_STARTUP'] = '0'
+        os.environ['MYSQL_POOL_PREWARM'] = '0'
+    from app import app, startup as timer
+
+    if args.precompile:
+        count = precompile_templates(app.jinja_env)
+        print(f"Compiled {count} templates into {app.config['TEMPLATE_CACHE_DIR']}")
+    else:
+        print(timer.report())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,20 @@
+// Mobile menu toggle
+document.getElementById('nav-toggle')?.addEventListener('click', function () {
+    const menu = document.getElementById('nav-menu');
+    menu.classList.toggle('open');
+});
+
+// Close menu when link clicked
+document.querySelectorAll('.nav-link').forEach(link => {
+    link.addEventListener('click', () => {
+        document.getElementById('nav-menu')?.classList.remove('open');
+    });
+});
+
+// Close menu on outside click
+document.addEventListener('click', function (e) {
+    const nav = document.querySelector('.nav-container');
+    if (!nav?.contains(e.target)) {
+        document.getElementById('nav-menu')?.classList.remove('open');
+    }
+});
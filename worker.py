@@ -0,0 +1,48 @@
+# worker.py
+# Runs background jobs (see jobs.py) in dedicated processes, so image
+# processing never competes with web workers for CPU. Start it next to the
+# web server and set JOB_WORKER_THREADS=0 for the web processes:
+#
+#   python worker.py --processes 2
+import argparse
+import multiprocessing
+import os
+import signal
+import threading
+
+# The web app starts in-process worker threads unless told not to
+os.environ['JOB_WORKER_THREADS'] = '0'
+# Job processes render no templates
+os.environ.setdefault('WARM_STARTUP', '0')
+
+from app import job_queue  # noqa: E402  (must follow the env override)
+
+
+def run(poll_interval):
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    job_queue.work(stop, poll_interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run background jobs.')
+    parser.add_argument('--processes', type=int, default=1)
+    parser.add_argument('--poll-interval', type=float, default=0.5)
+    args = parser.parse_args()
+
+    procs = [multiprocessing.Process(target=run, args=(args.poll_interval,), name=f'job-worker-{i}')
+             for i in range(args.processes)]
+    for p in procs:
+        p.start()
+    try:
+        for p in procs:
+            p.join()
+    except KeyboardInterrupt:
+        for p in procs:
+            p.terminate()
+            p.join()
+
+
+if __name__ == '__main__':
+    main()